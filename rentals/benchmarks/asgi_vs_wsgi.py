@@ -0,0 +1,117 @@
+"""
+Load test the public read views under WSGI (gunicorn, sync views) and ASGI
+(uvicorn, async views) and compare throughput and latency percentiles.
+
+    pip install gunicorn uvicorn
+    python benchmarks/asgi_vs_wsgi.py --concurrency 200 --requests 5000
+
+Run it from the directory containing manage.py against a database that has
+been seeded with listings.  Only the standard library is used as the load
+generator so the numbers aren't skewed by a client library.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+
+SERVERS = {
+    'wsgi': ['gunicorn', 'rentals.wsgi:application', '--workers', '{workers}', '--bind', '127.0.0.1:{port}'],
+    'asgi': ['uvicorn', 'rentals.asgi:application', '--workers', '{workers}', '--port', '{port}', '--log-level', 'warning'],
+}
+
+DEFAULT_PATHS = ['/', '/?property_type=room', '/?max_price=1500&sort=price', '/property/1/', '/favorites/']
+
+
+async def fetch(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+async def load(base_url, paths, total, concurrency):
+    parts = urlsplit(base_url)
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(paths[i % len(paths)])
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            path = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                status = await fetch(parts.hostname, parts.port, path)
+                if status >= 500:
+                    errors += 1
+            except OSError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': errors,
+        'rps': round(total / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1], 2),
+    }
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            asyncio.run(fetch('127.0.0.1', port, '/'))
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--servers', nargs='+', default=list(SERVERS), choices=list(SERVERS))
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='Write results as JSON to this file.')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.servers:
+        command = [part.format(workers=args.workers, port=args.port) for part in SERVERS[name]]
+        server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(args.port)
+            asyncio.run(load(f'http://127.0.0.1:{args.port}', args.paths, min(200, args.requests), 20))  # warm up
+            results[name] = asyncio.run(load(f'http://127.0.0.1:{args.port}', args.paths, args.requests, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{name}: {results[name]}", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rentals.settings')
+# Serve the public read views from rentals_app/async_views.py
+os.environ.setdefault('RENTALS_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,7 +49,11 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'rentals_app.User'
 
 MIDDLEWARE = [
+    'rentals_app.perf.PerfMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'rentals_app.middleware.APICompressionMiddleware',
+    'rentals_app.middleware.RateLimitMiddleware',
+    'rentals_app.db.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -62,10 +67,19 @@ ROOT_URLCONF = 'rentals.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates plus render timing for rentals_app.perf
+        'BACKEND': 'rentals_app.perf.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],  # <-- Important!
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Parse each template once per process.  runserver's autoreloader
+            # resets the cache when a template changes, so this is safe in
+            # development too.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -82,12 +96,71 @@ WSGI_APPLICATION = 'rentals.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# SQLite by default.  For production set DATABASE_ENGINE=postgresql and
+# DATABASE_NAME/USER/PASSWORD/HOST/PORT.  Connections are kept open for
+# DATABASE_CONN_MAX_AGE seconds, or drawn from psycopg's pool with
+# DATABASE_POOL=1.  DATABASE_REPLICA_HOST (PostgreSQL) or DATABASE_REPLICA_NAME
+# (SQLite, e.g. a second local file for testing) adds a "replica" alias that
+# public listing reads go to; see rentals_app/db.py.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite3')
+
+# WAL lets readers carry on while a write commits; it is stored in the
+# database file, so migration 0017_sqlite_wal sets it once rather than every
+# connection.  The pragmas below only last for the connection.  IMMEDIATE
+# transactions take the write lock up front instead of failing with
+# "database is locked" later.
+SQLITE_PRAGMAS = ';'.join([
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=134217728',
+])
+
+
+def database(name, host=''):
+    if DATABASE_ENGINE == 'postgresql':
+        config = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': name,
+            'USER': os.environ.get('DATABASE_USER', ''),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': host,
+            'PORT': os.environ.get('DATABASE_PORT', ''),
+            'CONN_HEALTH_CHECKS': True,
+        }
+        if os.environ.get('DATABASE_POOL') == '1':
+            config['OPTIONS'] = {
+                'pool': {'min_size': 2, 'max_size': int(os.environ.get('DATABASE_POOL_SIZE', '10')), 'timeout': 10},
+            }
+        else:
+            config['CONN_MAX_AGE'] = int(os.environ.get('DATABASE_CONN_MAX_AGE', '60'))
+        return config
+    return {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': name,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20, 'init_command': SQLITE_PRAGMAS},
     }
-}
+
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {'default': database(os.environ.get('DATABASE_NAME', 'rentals'), os.environ.get('DATABASE_HOST', ''))}
+    if os.environ.get('DATABASE_REPLICA_HOST'):
+        DATABASES['replica'] = database(DATABASES['default']['NAME'], os.environ['DATABASE_REPLICA_HOST'])
+else:
+    DATABASES = {'default': database(os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'))}
+    if os.environ.get('DATABASE_REPLICA_NAME'):
+        DATABASES['replica'] = database(os.environ['DATABASE_REPLICA_NAME'])
+
+if 'replica' in DATABASES:
+    # Tests run against the primary only
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['rentals_app.db.ReplicaRouter']
+
+# Pages whose GETs may read from the replica, and how long a client that just
+# wrote something keeps reading from the primary instead
+REPLICA_READ_VIEWS = ['property_list', 'property_detail', 'property_facets', 'favorite_list', 'rent_analytics', 'rent_analytics_json']
+REPLICA_STICKY_SECONDS = 15
 
 
 # Password validation
@@ -125,8 +198,187 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# collectstatic fingerprints and precompresses assets (rentals_app/storage.py).
+# The manifest only exists after collectstatic, so development keeps the
+# plain storage.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'rentals_app.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
+# Media and static delivery (rentals_app/delivery.py): 'django' streams the
+# file (sendfile under gunicorn), 'x-accel-redirect' hands it to nginx at
+# FILE_SERVING_INTERNAL_URL + 'media/' or 'static/', 'x-sendfile' to Apache
+# or lighttpd.  Names without a content hash are cached for FILE_MAX_AGE.
+FILE_SERVING = os.environ.get('RENTALS_FILE_SERVING', 'django')
+FILE_SERVING_INTERNAL_URL = '/_files/'
+FILE_MAX_AGE = 60 * 60
+
+# Listings shown per page on property_list (keyset paginated)
+PROPERTY_LIST_PAGE_SIZE = 20
+
+# Full-text search. Leave unset to use SQLite FTS5 (or the LIKE fallback on
+# other databases); point at any class implementing rentals_app.search's
+# backend interface to plug in something else.
+# RENTALS_SEARCH_BACKEND = 'rentals_app.search.SQLiteFTSSearchBackend'
+
+
+# Caches
+# "listings" holds property_list result pages and rendered cards. LocMemCache
+# is a per-process LRU (MAX_ENTRIES) with a TTL (TIMEOUT).  listing_cache.clear()
+# (bulk imports, seeding) reaches every process on the host through the
+# generation file below, but per-listing signal invalidation only reaches the
+# process that saved; for several workers switch to a shared backend:
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#   'LOCATION': BASE_DIR / 'cache' / 'listings',
+# or
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#   'LOCATION': 'redis://127.0.0.1:6379/1',
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'listings': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'listings',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+LISTING_CACHE_ALIAS = 'listings'
+# Touched by listing_cache.clear(); its mtime versions every listings cache key.
+# Put it on storage every worker can see.
+LISTING_CACHE_GENERATION_PATH = os.environ.get(
+    'RENTALS_LISTING_CACHE_GENERATION_PATH', BASE_DIR / 'listing_cache.generation'
+)
+
+
+# Image pipeline (rentals_app/images.py). Variants are generated in a process
+# pool after the upload commits; set IMAGE_PIPELINE_ASYNC = False to do the
+# work inline, or run `manage.py process_images` to backfill.
+IMAGE_PIPELINE_ENABLED = True
+IMAGE_PIPELINE_ASYNC = True
+IMAGE_PIPELINE_WORKERS = 2
+
+
+# Chunked image uploads (rentals_app/uploads.py)
+UPLOAD_CHUNK_DIR = BASE_DIR / 'upload_chunks'
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+UPLOAD_STALE_AFTER = 24 * 60 * 60
+
+
+# Async public views (rentals_app/async_views.py). rentals/asgi.py turns this
+# on; WSGI deployments keep the sync views.
+ASYNC_PUBLIC_VIEWS = os.environ.get('RENTALS_ASYNC_VIEWS', '0') == '1'
+
+# "Near" searches on property_list default to this radius
+GEO_DEFAULT_RADIUS_KM = 3
+
+# Price band edges for the property_list price facet
+PRICE_FACET_BANDS = [0, 500, 1000, 1500, 2500, 5000]
+
+
+# Read API (rentals_app/api.py), served under /api/v1/
+REST_FRAMEWORK = {
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.URLPathVersioning',
+    'ALLOWED_VERSIONS': ['v1'],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+}
+
+# Listing view tracking (rentals_app/tracking.py).  Views are buffered per
+# process and written after this many hits or seconds, whichever comes first,
+# by a background thread unless VIEW_FLUSH_IN_BACKGROUND is off.
+VIEW_TRACKING_ENABLED = True
+VIEW_FLUSH_IN_BACKGROUND = True
+VIEW_FLUSH_HITS = 200
+VIEW_FLUSH_SECONDS = 60
+VIEW_BUFFER_SIZE = 100_000
+
+# Messages per page in the owner inbox
+INBOX_PAGE_SIZE = 30
+
+# Owner notifications (rentals_app/notifications.py), sent by
+# `manage.py send_notifications`.  For local testing run an SMTP stand-in:
+#   python -m aiosmtpd -n -l localhost:1025
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '1025'))
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'GH Properties <no-reply@localhost>')
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 6 * 60 * 60
+NOTIFY_DIGEST_THRESHOLD = 5
+# Absolute links in emails
+SITE_URL = os.environ.get('RENTALS_SITE_URL', 'http://localhost:8000')
+
+# Saved-search alerts (rentals_app/alerts.py).  Matches wait
+# SAVED_SEARCH_ALERT_DELAY_SECONDS so a burst of new listings (an agency
+# import, say) arrives as one email; each process reloads its search index
+# every SAVED_SEARCH_RELOAD_SECONDS to forget deleted searches.
+SAVED_SEARCH_ALERT_DELAY_SECONDS = 10 * 60
+SAVED_SEARCH_RELOAD_SECONDS = 10 * 60
+SAVED_SEARCHES_PER_EMAIL = 10
+
+# Write-rate limits (rentals_app/middleware.py; the limits themselves are in
+# rentals_app/urls.py).  "shared" keeps buckets in a small SQLite file used by
+# every worker on the host; "memory" keeps them per process.
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_STORE = os.environ.get('RENTALS_RATE_LIMIT_STORE', 'shared')
+RATE_LIMIT_SHARED_PATH = os.environ.get('RENTALS_RATE_LIMIT_PATH', BASE_DIR / 'ratelimit.sqlite3')
+# Only behind a proxy that sets X-Forwarded-For itself
+RATE_LIMIT_TRUST_X_FORWARDED_FOR = False
+
+# Request instrumentation (rentals_app/perf.py): per-view timing, query and
+# response size histograms, served to staff (or to a scraper presenting
+# PERF_METRICS_TOKEN as a bearer token) at /metrics/ and summarised by
+# `manage.py perf_report`.
+PERF_METRICS_ENABLED = os.environ.get('RENTALS_PERF_METRICS', '0') == '1'
+PERF_SAMPLE_RATE = float(os.environ.get('RENTALS_PERF_SAMPLE_RATE', '1.0'))
+PERF_METRICS_DIR = os.environ.get('RENTALS_PERF_METRICS_DIR', BASE_DIR / 'perf')
+PERF_METRICS_TOKEN = os.environ.get('RENTALS_PERF_METRICS_TOKEN', '')
+PERF_DUMP_SECONDS = 30
+PERF_MAX_QUERIES = 500
+
+# Benchmark results (rentals_app/benchmarks.py), one JSON file per run of
+# `manage.py run_benchmarks` or `manage.py load_test`
+BENCHMARK_RESULTS_DIR = os.environ.get('RENTALS_BENCHMARK_RESULTS_DIR', BASE_DIR / 'benchmark_results')
+
+# Admin changelists over large tables (rentals_app/admin.py)
+ADMIN_ESTIMATE_THRESHOLD = 100_000  # rows before counts come from planner statistics
+ADMIN_COUNT_CACHE_SECONDS = 60
+ADMIN_STATS_MAX_AGE = 60 * 60  # SQLite: seconds between sampled ANALYZE runs
+ADMIN_ANALYSIS_LIMIT = 1000  # rows ANALYZE samples per index
+ADMIN_COUNT_LIMIT = 10_000  # filtered changelists count no further than this
+ADMIN_LOCATION_CHOICES = 50
+ADMIN_FILTER_CACHE_SECONDS = 10 * 60
+
+
+# Rent market analytics (rentals_app/analytics.py): months shown, and how
+# many locations the page offers, counted over the rollups and cached
+ANALYTICS_MONTHS = 12
+ANALYTICS_LOCATION_CHOICES = 30
+ANALYTICS_CACHE_SECONDS = 10 * 60
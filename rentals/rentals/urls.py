@@ -21,14 +21,15 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
+
+from rentals_app import delivery
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/', include('rentals_app.api_urls')),
     path('', include('rentals_app.urls')),  # include your app URLs
 ]
 
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Media and collected static files, with caching headers and Range support.
+# Under WSGI, rentals/wsgi.py answers these before the middleware runs.
+urlpatterns += delivery.urlpatterns()
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rentals.settings')
 
 application = get_wsgi_application()
+
+# Answer media and static requests without the middleware stack
+from rentals_app.delivery import FileServingApplication  # noqa: E402
+
+application = FileServingApplication(application)
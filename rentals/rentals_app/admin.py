@@ -2,9 +2,135 @@ from django.contrib import admin
 
 # Register your models here.
 
+from django.conf import settings
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections, router
+from django.db.models import Count, Q
+from django.forms.models import BaseInlineFormSet
+from django.utils.functional import cached_property
 from django.utils.html import format_html
-from .models import User, Property, PropertyImage, Message, Favorite
+from .models import User, Property, PropertyImage, Message, Favorite, OutboxEmail, SavedSearch
+from .search import get_search_backend
+
+
+# ------------------------
+# Large-table helpers
+# ------------------------
+# A stock changelist runs COUNT(*) over the whole table twice per page, and
+# filters or searches that no index can serve.  For the big tables:
+#   * unfiltered counts come from the planner's statistics once a table is
+#     past ADMIN_ESTIMATE_THRESHOLD rows, else from an exact count cached for
+#     ADMIN_COUNT_CACHE_SECONDS.  PostgreSQL's autovacuum keeps its
+#     statistics current; SQLite only has them after an ANALYZE, which
+#     refresh_statistics() runs (sampled) at most every ADMIN_STATS_MAX_AGE;
+#   * filtered counts stop at ADMIN_COUNT_LIMIT -- narrow the filter to page
+#     further;
+#   * rows are ordered by primary key, which every table can walk backwards.
+
+def refresh_statistics(model):
+    """Re-sample the SQLite statistics for ``model``'s table if they are older than ADMIN_STATS_MAX_AGE."""
+    using = router.db_for_write(model)
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor != 'sqlite':
+        return
+    if not cache.add(f'admin-analyze:{using}:{table}', True, settings.ADMIN_STATS_MAX_AGE):
+        return
+    with connection.cursor() as cursor:
+        # Visit a bounded number of rows per index: the row count is
+        # extrapolated, which is all the changelist needs, in well under a
+        # millisecond however big the table is
+        cursor.execute(f'PRAGMA analysis_limit = {int(settings.ADMIN_ANALYSIS_LIMIT)}')
+        cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+
+
+def estimated_count(model, using):
+    """Row count from the planner's statistics, or None if there are none."""
+    refresh_statistics(model)
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                # The first number of any index's stat is the table's row count
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                row = cursor.fetchone()
+                return int(row[0].split()[0]) if row else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return queryset.order_by()[:settings.ADMIN_COUNT_LIMIT].count()
+        estimate = estimated_count(queryset.model, queryset.db)
+        if estimate is not None and estimate >= settings.ADMIN_ESTIMATE_THRESHOLD:
+            return estimate
+        return cache.get_or_set(
+            f'admin-count:{queryset.db}:{queryset.model._meta.db_table}',
+            queryset.count, settings.ADMIN_COUNT_CACHE_SECONDS,
+        )
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-id',)
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Only loads one page of related rows; the page is ?<prefix>-page=N."""
+
+    per_page = 10
+    request = None
+
+    @property
+    def page_param(self):
+        return f'{self.prefix}-page'
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = super().get_queryset()
+            page = Paginator(queryset, self.per_page).get_page(
+                self.request.GET.get(self.page_param) if self.request else None,
+            )
+            self.page = page
+            self._queryset = page.object_list
+        return self._queryset
+
+    def page_url(self, number):
+        query = self.request.GET.copy()
+        query[self.page_param] = number
+        return f'?{query.urlencode()}'
+
+    def page_links(self):
+        """(newer, older) page URLs for the template; either may be None."""
+        self.get_queryset()
+        page = self.page
+        return (
+            self.page_url(page.previous_page_number()) if page.has_previous() else None,
+            self.page_url(page.next_page_number()) if page.has_next() else None,
+        )
+
+
+class PaginatedTabularInline(admin.TabularInline):
+    formset = PaginatedInlineFormSet
+    template = 'admin/rentals_app/paginated_tabular.html'
+    per_page = 10
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        return type(formset.__name__, (formset,), {'request': request, 'per_page': self.per_page})
+
 
 # ------------------------
 # User Admin
@@ -21,10 +147,11 @@ class UserAdmin(admin.ModelAdmin):
 # ------------------------
 # Property Images Inline
 # ------------------------
-class PropertyImageInline(admin.TabularInline):
+class PropertyImageInline(PaginatedTabularInline):
     model = PropertyImage
     extra = 1  # show one empty slot for new images
     readonly_fields = ('image_preview',)
+    ordering = ('-uploaded_at', '-id')
 
     def image_preview(self, obj):
         if obj.image:
@@ -36,14 +163,49 @@ class PropertyImageInline(admin.TabularInline):
 # ------------------------
 # Property Admin
 # ------------------------
+class LocationFilter(admin.SimpleListFilter):
+    """The most common locations, counted over an index and cached, instead of SELECT DISTINCT per page."""
+
+    title = 'location'
+    parameter_name = 'location'
+
+    def lookups(self, request, model_admin):
+        def top_locations():
+            rows = (
+                Property.objects.order_by().values('location').annotate(n=Count('id'))
+                .order_by('-n')[:settings.ADMIN_LOCATION_CHOICES]
+            )
+            return [(row['location'], f"{row['location']} ({row['n']})") for row in rows]
+
+        return cache.get_or_set('admin-property-locations', top_locations, settings.ADMIN_FILTER_CACHE_SECONDS)
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(location=self.value())
+        return queryset
+
+
 @admin.register(Property)
-class PropertyAdmin(admin.ModelAdmin):
+class PropertyAdmin(LargeTableAdmin):
     list_display = ('title', 'owner', 'location', 'price', 'property_type', 'is_available', 'image_preview')
-    list_filter = ('property_type', 'is_available', 'location')
-    search_fields = ('title', 'location', 'owner__username')
+    list_select_related = ('owner',)
+    list_filter = ('property_type', 'is_available', LocationFilter)
+    # Matched through the full-text index, see get_search_results
+    search_fields = ('title', 'location', '=owner__username')
+    autocomplete_fields = ('owner',)
     inlines = [PropertyImageInline]
     readonly_fields = ('created_at', 'updated_at')
 
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        ids = get_search_backend(router.db_for_read(Property)).matching_ids(q=search_term)
+        matches = Q(pk__in=ids) | Q(owner__in=User.objects.filter(username=search_term))
+        if search_term.isdigit():
+            matches |= Q(pk=int(search_term))
+        return queryset.filter(matches), False
+
     def image_preview(self, obj):
         if obj.image:
             return format_html('<img src="{}" style="width:100px; height:auto;"/>', obj.image.url)
@@ -55,10 +217,13 @@ class PropertyAdmin(admin.ModelAdmin):
 # Messages Admin
 # ------------------------
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(LargeTableAdmin):
     list_display = ('property', 'sender_name', 'sender_email', 'sent_at', 'is_read')
+    list_select_related = ('property',)
     list_filter = ('is_read', 'sent_at')
-    search_fields = ('sender_name', 'sender_email', 'property__title')
+    # An exact email is served by message_sender_sent_idx
+    search_fields = ('=sender_email', '^sender_name')
+    autocomplete_fields = ('property',)
     readonly_fields = ('sent_at',)
 
 
@@ -66,8 +231,33 @@ class MessageAdmin(admin.ModelAdmin):
 # Favorites Admin
 # ------------------------
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
-    list_display = ('tenant', 'property', 'saved_at')
+class FavoriteAdmin(LargeTableAdmin):
+    list_display = ('tenant', 'visitor', 'property', 'saved_at')
+    list_select_related = ('tenant', 'property')
     list_filter = ('saved_at',)
-    search_fields = ('tenant__username', 'property__title')
+    search_fields = ('=tenant__username', '=visitor')
+    autocomplete_fields = ('tenant', 'property')
     readonly_fields = ('saved_at',)
+
+
+# ------------------------
+# Email Outbox Admin
+# ------------------------
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient', 'created_at', 'attempts', 'sent_at', 'failed_at')
+    list_filter = ('sent_at', 'failed_at')
+    search_fields = ('recipient', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'failed_at', 'attempts', 'last_error')
+
+
+# ------------------------
+# Saved Searches Admin
+# ------------------------
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'email', 'created_at', 'confirmed_at')
+    list_filter = ('created_at', 'confirmed_at')
+    # An exact email is served by saved_search_email_idx
+    search_fields = ('=email',)
+    readonly_fields = ('token', 'created_at', 'confirmed_at')
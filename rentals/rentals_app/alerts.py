@@ -0,0 +1,275 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+
+from .geo import haversine_km
+from .search import tokenize
+
+
+# -------------------------------
+# Saved-search alerts
+# -------------------------------
+# Visitors save a PropertySearchForm query (SavedSearch) and are emailed when
+# a listing they haven't been told about starts matching it.  Running every
+# saved search whenever a listing is saved would cost a query per search, so
+# the searches themselves are indexed in memory (a "percolator") and each
+# saved listing is looked up against them:
+#
+#   * property type: one price tree per type, plus one for "any type";
+#   * price: the trees are interval trees over [min_price, max_price],
+#     stabbed with the listing's price;
+#   * keywords: each search is filed under its longest location token (else
+#     its longest q token) and found through the prefixes of the listing's
+#     tokens, since the search form matches prefixes ("leg" finds "Legon").
+#
+# The candidates all three agree on are checked in full by matches().  The
+# Property post_save signal records SavedSearchMatch rows; send_notifications
+# batches them into one email per address (see notifications.py).
+#
+# Each process keeps its own index per database: searches saved elsewhere are
+# picked up with an id range query on the next lookup, deletions with a full
+# reload every SAVED_SEARCH_RELOAD_SECONDS (lookups skip deleted ids anyway).
+# Unconfirmed searches are indexed too but never matched: percolate() checks
+# the candidates against the table, which also sees confirmations made by
+# other processes straight away.
+
+ANY_PRICE_LOW = Decimal('-Infinity')
+ANY_PRICE_HIGH = Decimal('Infinity')
+
+
+def compile_criteria(criteria):
+    """What matches() checks, from SavedSearch.criteria (listing_cache.normalize output)."""
+    center = None
+    if criteria.get('lat') is not None:
+        radius = criteria.get('radius_km') or settings.GEO_DEFAULT_RADIUS_KM
+        center = (float(criteria['lat']), float(criteria['lng']), float(radius))
+    return {
+        'property_type': criteria.get('property_type', ''),
+        # As filter_properties: a zero bound is no bound
+        'low': Decimal(criteria['min_price']) if criteria.get('min_price') else ANY_PRICE_LOW,
+        'high': Decimal(criteria['max_price']) if criteria.get('max_price') else ANY_PRICE_HIGH,
+        'location': tokenize(criteria.get('location')),
+        'q': tokenize(criteria.get('q')),
+        'center': center,
+    }
+
+
+def _prefixes(tokens):
+    return {token[:end] for token in tokens for end in range(1, len(token) + 1)}
+
+
+def listing_terms(prop):
+    """Prefixes of the listing's location tokens, and of all its text, for keyword lookups."""
+    location = tokenize(prop.location)
+    text = location + tokenize(prop.title) + tokenize(prop.__dict__.get('description'))
+    return {'location': _prefixes(location), 'q': _prefixes(text)}
+
+
+def matches(compiled, prop, terms=None):
+    """Whether property_list would show ``prop`` for the compiled search (minus typo tolerance)."""
+    terms = terms or listing_terms(prop)
+    if not prop.is_available:
+        return False
+    if compiled['property_type'] and prop.property_type != compiled['property_type']:
+        return False
+    if not compiled['low'] <= Decimal(prop.price) <= compiled['high']:
+        return False
+    if not all(token in terms['location'] for token in compiled['location']):
+        return False
+    if not all(token in terms['q'] for token in compiled['q']):
+        return False
+    if compiled['center']:
+        lat, lng, radius = compiled['center']
+        if prop.latitude is None or haversine_km(lat, lng, prop.latitude, prop.longitude) > radius:
+            return False
+    return True
+
+
+class IntervalTree:
+    """
+    Centered interval tree over closed intervals, for stab(point) queries in
+    O(log n + hits).  Built in one go; intervals added later sit in a short
+    unsorted list until there are enough of them to be worth a rebuild.
+    """
+
+    def __init__(self, intervals=()):
+        self.intervals = {}  # key -> (low, high)
+        self.pending = []
+        self.root = None
+        for key, low, high in intervals:
+            if low <= high:
+                self.intervals[key] = (low, high)
+        self.rebuild()
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def add(self, key, low, high):
+        if low > high:
+            return  # e.g. min_price above max_price: contains nothing
+        self.intervals[key] = (low, high)
+        self.pending.append(key)
+        if len(self.pending) > max(64, len(self.intervals) // 8):
+            self.rebuild()
+
+    def discard(self, key):
+        # Stale keys in the tree are filtered out by stab() until the next rebuild
+        self.intervals.pop(key, None)
+
+    def rebuild(self):
+        self.pending = []
+        self.root = self._build([(low, high, key) for key, (low, high) in self.intervals.items()])
+
+    def _build(self, intervals):
+        if not intervals:
+            return None
+        endpoints = sorted(bound for low, high, key in intervals for bound in (low, high))
+        center = endpoints[len(endpoints) // 2]
+        here, left, right = [], [], []
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        by_low = sorted(here, key=lambda interval: interval[0])
+        by_high = sorted(here, key=lambda interval: interval[1])
+        return (
+            center,
+            [interval[0] for interval in by_low], [interval[2] for interval in by_low],
+            [interval[1] for interval in by_high], [interval[2] for interval in by_high],
+            self._build(left), self._build(right),
+        )
+
+    def stab(self, point):
+        """Keys of the intervals containing ``point``."""
+        hits = []
+        node = self.root
+        while node is not None:
+            center, lows, low_keys, highs, high_keys, left, right = node
+            if point < center:
+                hits.extend(low_keys[:bisect.bisect_right(lows, point)])
+                node = left
+            elif point > center:
+                hits.extend(high_keys[bisect.bisect_left(highs, point):])
+                node = right
+            else:
+                hits.extend(low_keys)
+                break
+        for key in self.pending:
+            low, high = self.intervals.get(key, (None, None))
+            if low is not None and low <= point <= high:
+                hits.append(key)
+        return {key for key in hits if key in self.intervals}
+
+
+class SearchIndex:
+    """Saved searches by type, price interval and keyword; see match()."""
+
+    def __init__(self, searches=()):
+        self.compiled = {}
+        self.prices = defaultdict(IntervalTree)  # property_type ('' for any) -> tree
+        self.keywords = defaultdict(set)  # ('location' or 'q', token) -> search ids
+        self.unkeyed = set()
+        self.last_id = 0
+        self.loaded_at = time.monotonic()
+        for search in searches:
+            self.add(search.pk, search.criteria)
+
+    def __len__(self):
+        return len(self.compiled)
+
+    @staticmethod
+    def keyword(compiled):
+        for field in ('location', 'q'):
+            if compiled[field]:
+                return field, max(compiled[field], key=len)
+        return None
+
+    def add(self, pk, criteria):
+        self.discard(pk)
+        compiled = self.compiled[pk] = compile_criteria(criteria)
+        self.prices[compiled['property_type']].add(pk, compiled['low'], compiled['high'])
+        keyword = self.keyword(compiled)
+        (self.keywords[keyword] if keyword else self.unkeyed).add(pk)
+        self.last_id = max(self.last_id, pk)
+
+    def discard(self, pk):
+        compiled = self.compiled.pop(pk, None)
+        if compiled is None:
+            return
+        self.prices[compiled['property_type']].discard(pk)
+        keyword = self.keyword(compiled)
+        (self.keywords[keyword] if keyword else self.unkeyed).discard(pk)
+
+    def match(self, prop):
+        """Ids of the saved searches ``prop`` matches."""
+        if not prop.is_available or prop.price is None:
+            return set()
+        terms = listing_terms(prop)
+        by_keyword = set(self.unkeyed)
+        for field in ('location', 'q'):
+            for prefix in terms[field]:
+                by_keyword |= self.keywords.get((field, prefix), set())
+        if not by_keyword:
+            return set()
+        by_price = set()
+        for property_type in ('', prop.property_type):
+            if property_type in self.prices:
+                by_price |= self.prices[property_type].stab(Decimal(prop.price))
+        return {pk for pk in by_keyword & by_price if matches(self.compiled[pk], prop, terms)}
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_index(using='default'):
+    """This process's SearchIndex for ``using``, brought up to date with the SavedSearch table."""
+    from .models import SavedSearch
+
+    with _lock:
+        index = _indexes.get(using)
+        if index is None or time.monotonic() - index.loaded_at > settings.SAVED_SEARCH_RELOAD_SECONDS:
+            index = _indexes[using] = SearchIndex(SavedSearch.objects.using(using).only('id', 'criteria').iterator())
+        else:
+            for search in SavedSearch.objects.using(using).filter(pk__gt=index.last_id).only('id', 'criteria'):
+                index.add(search.pk, search.criteria)
+        return index
+
+
+def forget(pk, using='default'):
+    index = _indexes.get(using)
+    if index is not None:
+        with _lock:
+            index.discard(pk)
+
+
+def reset():
+    """Drop every process-local index (tests, or after bulk changes to SavedSearch)."""
+    _indexes.clear()
+
+
+def percolate(properties, using='default'):
+    """Record a SavedSearchMatch for every saved search each listing now matches; returns how many it found."""
+    from .models import SavedSearch, SavedSearchMatch
+
+    index = get_index(using)
+    found = [(search_id, prop.pk) for prop in properties for search_id in index.match(prop)]
+    if not found:
+        return 0
+    # Searches deleted by another process may still be in this index
+    live = set(
+        SavedSearch.objects.using(using)
+        .filter(pk__in={search_id for search_id, _ in found}, confirmed_at__isnull=False)
+        .values_list('pk', flat=True)
+    )
+    # A listing already announced to a search (e.g. saved again) is not announced twice
+    found = [SavedSearchMatch(search_id=search_id, property_id=pk) for search_id, pk in found if search_id in live]
+    SavedSearchMatch.objects.using(using).bulk_create(found, ignore_conflicts=True)
+    return len(found)
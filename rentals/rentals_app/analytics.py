@@ -0,0 +1,271 @@
+import math
+from collections import Counter, defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+try:
+    import numpy
+except ImportError:  # optional: pip install numpy, only speeds up rebuild()
+    numpy = None
+
+
+# -------------------------------
+# Rent market rollups
+# -------------------------------
+# Median and percentile rent per location, property type and month (the month
+# a listing was posted), kept in RentRollup so the analytics page reads at
+# most ANALYTICS_MONTHS rows per question instead of scanning Property.
+#
+# Each listing is counted in four rows: its (location, type), its location
+# over all types, its type over all locations and the grand total, with ''
+# standing for "all".  Rows hold a count, a rent total and a RentSketch:
+#
+#   * save/delete signals move a listing between rows as it changes
+#     (update(), batched per call);
+#   * rebuild() recomputes every row from Property, with NumPy when it is
+#     installed, after bulk writes that skip the signals.
+
+# Quantiles come back within 1% of a true rent.  Stored sketches depend on
+# it: run `manage.py rebuild_rent_rollups` after changing it.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+QUANTILES = {'p25': 0.25, 'median': 0.5, 'p75': 0.75, 'p90': 0.9}
+
+
+class RentSketch:
+    """
+    A log-bucketed histogram (as in DDSketch): bucket i counts rents in
+    (GAMMA ** (i - 1), GAMMA ** i].  Sketches merge by adding counts and,
+    unlike sampling sketches, forget a rent exactly, which is what lets a
+    listing's price change or deletion be taken back out.
+    """
+
+    def __init__(self, buckets=None):
+        self.buckets = Counter({int(index): count for index, count in (buckets or {}).items()})
+
+    @staticmethod
+    def bucket(rent):
+        return max(0, math.ceil(math.log(max(float(rent), 1.0)) / LOG_GAMMA))
+
+    def add(self, rent, count=1):
+        self.buckets[self.bucket(rent)] += count
+
+    def merge(self, other):
+        self.buckets.update(other.buckets)
+        return self
+
+    @property
+    def count(self):
+        return sum(count for count in self.buckets.values() if count > 0)
+
+    def quantile(self, q):
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += max(0, self.buckets[index])
+            if seen > rank:
+                return round(2 * GAMMA ** index / (GAMMA + 1), 2)
+        return None
+
+    def to_json(self):
+        return {str(index): count for index, count in sorted(self.buckets.items()) if count > 0}
+
+
+def month_of(moment):
+    moment = timezone.localtime(moment) if timezone.is_aware(moment) else moment
+    return date(moment.year, moment.month, 1)
+
+
+def entry(fields):
+    """
+    (location, property_type, month, price) the rollups count a listing as,
+    from its field values (a Property's __dict__), or None if one is missing.
+    """
+    values = [fields.get(name) for name in ('location', 'property_type', 'created_at', 'price')]
+    if None in values:
+        return None
+    location, property_type, created_at, price = values
+    return ' '.join(location.split()), property_type, month_of(created_at), Decimal(price)
+
+
+def keys(location, property_type, month):
+    return [
+        (location, property_type, month),
+        (location, '', month),
+        ('', property_type, month),
+        ('', '', month),
+    ]
+
+
+def _tally(changes, entries, sign):
+    for location, property_type, month, price in entries:
+        for key in keys(location, property_type, month):
+            change = changes[key]
+            change['listings'] += sign
+            change['total'] += sign * price
+            change['sketch'].add(price, sign)
+
+
+def _new_change():
+    return {'listings': 0, 'total': Decimal(0), 'sketch': RentSketch()}
+
+
+def update(removed=(), added=()):
+    """Take listings counted as the ``removed`` entries out of the rollups and put the ``added`` ones in."""
+    from .models import RentRollup
+
+    changes = defaultdict(_new_change)
+    _tally(changes, [e for e in removed if e], -1)
+    _tally(changes, [e for e in added if e], 1)
+    # A save that didn't move the listing cancels out; a price change within
+    # one sketch bucket still changes the total
+    changes = {
+        key: change for key, change in changes.items()
+        if change['listings'] or change['total'] or any(change['sketch'].buckets.values())
+    }
+    if not changes:
+        return
+
+    lookup = Q()
+    for location, property_type, month in changes:
+        lookup |= Q(location=location, property_type=property_type, month=month)
+    with transaction.atomic():
+        RentRollup.objects.bulk_create(
+            [RentRollup(location=location, property_type=kind, month=month) for location, kind, month in changes],
+            ignore_conflicts=True,
+        )
+        rows = list(RentRollup.objects.select_for_update().filter(lookup))
+        empty = []
+        for row in rows:
+            change = changes[(row.location, row.property_type, row.month)]
+            row.listings = max(0, row.listings + change['listings'])
+            row.total_rent = max(Decimal(0), row.total_rent + change['total'])
+            row.sketch = RentSketch(row.sketch).merge(change['sketch']).to_json()
+            if not row.listings:
+                empty.append(row.pk)
+        RentRollup.objects.bulk_update(rows, ['listings', 'total_rent', 'sketch'])
+        RentRollup.objects.filter(pk__in=empty).delete()
+
+
+def _rollups_python(rows):
+    changes = defaultdict(_new_change)
+    _tally(changes, rows, 1)
+    return {key: (c['listings'], c['total'], c['sketch'].to_json()) for key, c in changes.items()}
+
+
+def _rollups_numpy(rows):
+    # Group keys are numbered in Python; the per-row maths and the grouping
+    # (bucket, then count per key and bucket) run in NumPy
+    codes, prices, key_ids = [], [], {}
+    for location, property_type, month, price in rows:
+        codes.append([key_ids.setdefault(key, len(key_ids)) for key in keys(location, property_type, month)])
+        prices.append(float(price))
+    if not codes:
+        return {}
+    codes = numpy.array(codes, dtype=numpy.int64).ravel()
+    prices = numpy.repeat(numpy.array(prices), 4)
+    buckets = numpy.maximum(0, numpy.ceil(numpy.log(numpy.maximum(prices, 1.0)) / LOG_GAMMA)).astype(numpy.int64)
+    listings = numpy.bincount(codes, minlength=len(key_ids))
+    totals = numpy.bincount(codes, weights=prices, minlength=len(key_ids))
+    span = int(buckets.max()) + 1
+    pairs, counts = numpy.unique(codes * span + buckets, return_counts=True)
+
+    sketches = defaultdict(dict)
+    for pair, count in zip(pairs.tolist(), counts.tolist()):
+        sketches[pair // span][str(pair % span)] = count
+    return {
+        key: (int(listings[code]), Decimal(f'{totals[code]:.2f}'), sketches[code])
+        for key, code in key_ids.items()
+    }
+
+
+def rebuild(batch_size=2000, use_numpy=None):
+    """Recompute every rollup from Property; returns the number of rows written."""
+    from .models import Property, RentRollup
+
+    use_numpy = numpy is not None if use_numpy is None else use_numpy
+    rows = (
+        (' '.join(location.split()), property_type, month_of(created_at), price)
+        for location, property_type, created_at, price in Property.objects.order_by().values_list(
+            'location', 'property_type', 'created_at', 'price',
+        ).iterator(chunk_size=batch_size)
+    )
+    rollups = (_rollups_numpy if use_numpy else _rollups_python)(rows)
+    with transaction.atomic():
+        RentRollup.objects.all().delete()
+        RentRollup.objects.bulk_create(
+            [
+                RentRollup(location=location, property_type=kind, month=month, listings=n, total_rent=total, sketch=sketch)
+                for (location, kind, month), (n, total, sketch) in rollups.items()
+            ],
+            batch_size=batch_size,
+        )
+    cache.delete('rent-analytics-locations')
+    return len(rollups)
+
+
+# -------------------------------
+# Reading
+# -------------------------------
+def window_start(months):
+    today = month_of(timezone.now())
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _stats(listings, total, sketch):
+    stats = {'listings': listings, 'mean': round(float(total) / listings, 2) if listings else None}
+    stats.update({name: sketch.quantile(q) for name, q in QUANTILES.items()})
+    return stats
+
+
+def summary(location='', property_type='', months=None):
+    """
+    Rent statistics for one location and type ('' for all) over the last
+    ``months`` months: one entry per month with listings, plus the window
+    as a whole.  Reads at most ``months`` rollup rows.
+    """
+    from .models import RentRollup
+
+    months = months or settings.ANALYTICS_MONTHS
+    rows = RentRollup.objects.filter(
+        location=location, property_type=property_type, month__gte=window_start(months),
+    ).order_by('month')
+    overall, listings, total, trend = RentSketch(), 0, Decimal(0), []
+    for row in rows:
+        sketch = RentSketch(row.sketch)
+        trend.append({'month': row.month.strftime('%Y-%m'), **_stats(row.listings, row.total_rent, sketch)})
+        overall.merge(sketch)
+        listings += row.listings
+        total += row.total_rent
+    return {
+        'location': location,
+        'property_type': property_type,
+        'months': months,
+        'overall': _stats(listings, total, overall),
+        'trend': trend,
+    }
+
+
+def top_locations():
+    """[(location, listings)] with the most listings in the window, cached."""
+    from .models import RentRollup
+
+    def load():
+        return list(
+            RentRollup.objects.filter(property_type='', month__gte=window_start(settings.ANALYTICS_MONTHS))
+            .exclude(location='').values('location').annotate(n=Sum('listings'))
+            .order_by('-n').values_list('location', 'n')[:settings.ANALYTICS_LOCATION_CHOICES]
+        )
+
+    return cache.get_or_set('rent-analytics-locations', load, settings.ANALYTICS_CACHE_SECONDS)
@@ -0,0 +1,195 @@
+import hashlib
+
+from django.db.models import prefetch_related_objects
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import permissions, viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from .forms import PropertySearchForm
+from .models import Property, PropertyImage, Message
+from .serializers import PropertySerializer, PropertyImageSerializer, MessageSerializer, requested_fields
+from .views import filter_properties
+
+
+# =====================================================
+# READ API (v1)
+# =====================================================
+# Every response carries an ETag built from the query string and the id and
+# version fields of the rows it returns (for properties Property.updated_at,
+# which image and variant changes bump too).  Clients send it back as
+# If-None-Match and get an empty 304 when nothing changed: a list costs
+# loading the one page, never a query over the whole result set, and no
+# serialization.
+#
+# Filter parameters that don't validate are a 400, not silently ignored.
+
+class NewestFirstCursorPagination(CursorPagination):
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    ordering = ('-created_at', '-id')
+
+
+class ImageCursorPagination(NewestFirstCursorPagination):
+    ordering = ('-uploaded_at', '-id')
+
+
+class MessageCursorPagination(NewestFirstCursorPagination):
+    ordering = ('-sent_at', '-id')
+
+
+def _opaque(etag):
+    # Compare ignoring W/ and the -br / -gzip suffix added by
+    # APICompressionMiddleware, so every encoding revalidates the same way
+    etag = etag.removeprefix('W/')
+    for suffix in ('-br"', '-gzip"'):
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+class ConditionalGetMixin:
+    # Fields that change whenever a row's representation does
+    etag_instance_fields = []
+    cache_control = 'public, max-age=0, must-revalidate'
+
+    def make_etag(self, *parts):
+        raw = '|'.join(str(part) for part in (self.request.version, self.request.GET.urlencode(), *parts))
+        return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+    def not_modified(self, etag):
+        sent = parse_etags(self.request.headers.get('If-None-Match', ''))
+        if '*' in sent or etag in {_opaque(tag) for tag in sent}:
+            return Response(status=304, headers={'ETag': etag, 'Cache-Control': self.cache_control})
+        return None
+
+    def tag(self, response, etag):
+        response['ETag'] = etag
+        response['Cache-Control'] = self.cache_control
+        if self.cache_control.startswith('private'):
+            response['Vary'] = 'Cookie'
+        return response
+
+    def version(self, instance):
+        return (instance.pk, *[getattr(instance, name) for name in self.etag_instance_fields])
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        # Related rows are only loaded once the page turns out to have changed
+        lookups = queryset._prefetch_related_lookups
+        queryset = queryset.prefetch_related(None)
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else list(queryset)
+        # The cursor links cover rows past this page appearing or going away
+        links = (self.paginator.get_next_link(), self.paginator.get_previous_link()) if page is not None else ()
+        etag = self.make_etag(*[self.version(row) for row in rows], *links)
+        response = self.not_modified(etag)
+        if response:
+            return response
+        prefetch_related_objects(rows, *lookups)
+        data = self.get_serializer(rows, many=True).data
+        return self.tag(self.get_paginated_response(data) if page is not None else Response(data), etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.make_etag(*self.version(instance))
+        return self.not_modified(etag) or self.tag(Response(self.get_serializer(instance).data), etag)
+
+
+def query_flag(request, name):
+    """A true/false query parameter as a bool, None if absent; anything else is a 400."""
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return None
+    if value not in ('true', 'false'):
+        raise ValidationError({name: ['Must be "true" or "false".']})
+    return value == 'true'
+
+
+def query_id(request, name):
+    """A numeric id query parameter, None if absent; anything else is a 400."""
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return None
+    if not value.isdigit():
+        raise ValidationError({name: ['Must be a numeric id.']})
+    return int(value)
+
+
+class PropertyViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Available listings, filtered with the same parameters as the HTML search
+    (property_type, min_price, max_price, q, location, near, radius_km, ...).
+    """
+    serializer_class = PropertySerializer
+    pagination_class = NewestFirstCursorPagination
+    permission_classes = [permissions.AllowAny]
+    lookup_value_regex = r'\d+'
+    etag_instance_fields = ['updated_at']
+
+    def get_queryset(self):
+        if self.action == 'list':
+            form = PropertySearchForm(self.request.query_params)
+            if not form.is_valid():
+                raise ValidationError(form.errors)
+            # The cursor pagination always orders newest first
+            if form.cleaned_data['sort'] not in ('', 'newest'):
+                raise ValidationError({'sort': ['Only "newest" is supported here.']})
+            properties, sort, ranking = filter_properties(form)
+            # for_listing() defers description, which PropertySerializer sends
+            properties = properties.defer(None)
+        else:
+            properties = Property.objects.available()
+        if 'images' in requested_fields(self.request, self.serializer_class.Meta.fields):
+            properties = properties.prefetch_related('images')
+        return properties
+
+    def retrieve(self, request, *args, **kwargs):
+        # Answer conditional requests from updated_at alone, before loading the row
+        updated_at = self.get_queryset().filter(pk=kwargs['pk']).values_list('updated_at', flat=True).first()
+        if updated_at is not None:
+            response = self.not_modified(self.make_etag(int(kwargs['pk']), updated_at))
+            if response:
+                return response
+        return super().retrieve(request, *args, **kwargs)
+
+
+class PropertyImageViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """Images of available listings; filter with ?property=<id>."""
+    serializer_class = PropertyImageSerializer
+    permission_classes = [permissions.AllowAny]
+    etag_instance_fields = ['uploaded_at', 'variants']
+
+    pagination_class = ImageCursorPagination
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        images = PropertyImage.objects.filter(property__is_available=True)
+        property_id = query_id(self.request, 'property')
+        if property_id is not None:
+            images = images.filter(property_id=property_id)
+        return images
+
+
+class MessageViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """Inquiries sent to the signed-in owner's listings."""
+    serializer_class = MessageSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    cache_control = 'private, max-age=0, must-revalidate'
+    etag_instance_fields = ['sent_at', 'is_read']
+
+    pagination_class = MessageCursorPagination
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        messages = Message.objects.filter(property__owner=self.request.user)
+        is_read = query_flag(self.request, 'is_read')
+        if is_read is not None:
+            messages = messages.filter(is_read=is_read)
+        return messages
+
+    def make_etag(self, *parts):
+        # Owner-scoped: never let one owner's tag match another's
+        return super().make_etag(self.request.user.pk, *parts)
@@ -0,0 +1,13 @@
+from django.urls import include, re_path
+from rest_framework.routers import DefaultRouter
+
+from . import api
+
+router = DefaultRouter()
+router.register('properties', api.PropertyViewSet, basename='api-property')
+router.register('images', api.PropertyImageViewSet, basename='api-image')
+router.register('messages', api.MessageViewSet, basename='api-message')
+
+urlpatterns = [
+    re_path(r'^(?P<version>v1)/', include(router.urls)),
+]
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class RentalaAppConfig(AppConfig):
     name = 'rentals_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
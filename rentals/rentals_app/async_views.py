@@ -0,0 +1,112 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponseNotAllowed
+from django.shortcuts import render, redirect
+
+from .forms import ContactOwnerForm, PropertySearchForm
+from .models import Property
+from .pagination import akeyset_paginate, aranked_paginate
+from .views import _next_url, filter_properties, search_criteria, search_facets
+from . import favorites, listing_cache, tracking
+
+
+# -------------------------------
+# Async Public Views (ASGI)
+# -------------------------------
+# Same pages as the sync views in views.py, but the ORM work runs through
+# Django's async API so an ASGI worker can keep serving other requests while
+# a query is in flight.  urls.py picks these when ASYNC_PUBLIC_VIEWS is on,
+# which rentals/asgi.py enables by default.
+#
+# Templates must not trigger lazy queries here, so request.user is resolved
+# up front and everything the templates touch is loaded before render().
+
+async def _resolve_user(request):
+    request.user = await request.auser()
+
+
+async def property_list(request):
+    await _resolve_user(request)
+    form = PropertySearchForm(request.GET)
+    cursor = request.GET.get("cursor")
+    criteria = search_criteria(form, cursor)
+
+    properties = None
+    cached = await sync_to_async(listing_cache.get_page)(criteria)
+    if cached is None:
+        properties, sort, ranking = await sync_to_async(filter_properties)(form)
+        if ranking is not None:
+            page = await aranked_paginate(properties, ranking, cursor=cursor, per_page=settings.PROPERTY_LIST_PAGE_SIZE)
+        else:
+            page = await akeyset_paginate(properties, sort=sort, cursor=cursor, per_page=settings.PROPERTY_LIST_PAGE_SIZE)
+        await sync_to_async(listing_cache.store_page)(criteria, page)
+        ids, next_cursor = [prop.pk for prop in page], page.next_cursor
+        loaded = {prop.pk: prop for prop in page}
+
+        def load(missing):
+            return {pk: loaded[pk] for pk in missing}
+    else:
+        ids, next_cursor = cached["ids"], cached["next_cursor"]
+        load = Property.objects.for_listing().in_bulk
+
+    cards = await sync_to_async(listing_cache.get_cards)(ids, load)
+    facets = await sync_to_async(search_facets)(form, criteria, properties)
+    return render(
+        request,
+        "property_list.html",
+        {
+            "cards": cards,
+            "favorited": await favorites.afavorited_ids(request, ids),
+            "next_cursor": next_cursor,
+            "form": form,
+            "facets": facets,
+        },
+    )
+
+
+async def property_detail(request, pk):
+    await _resolve_user(request)
+    try:
+        property = await Property.objects.for_detail().aget(pk=pk)
+    except Property.DoesNotExist:
+        raise Http404("No Property matches the given query.")
+
+    if request.method == "GET" and tracking.track_view(request, property.pk):
+        await sync_to_async(tracking.flush)()
+    if request.method == "POST":
+        form = ContactOwnerForm(request.POST)
+        if form.is_valid():
+            message = form.save(commit=False)
+            message.property = property
+            await message.asave()
+            return redirect("property_detail", pk=property.pk)
+    else:
+        form = ContactOwnerForm()
+
+    return render(request, "property_detail.html", {"property": property, "form": form})
+
+
+# -------------------------------
+# Favorites (Guests and Tenants)
+# -------------------------------
+async def save_favorite(request, property_id):
+    if not await Property.objects.filter(pk=property_id).aexists():
+        raise Http404("No Property matches the given query.")
+    await favorites.aadd(request, property_id)
+    return redirect(_next_url(request, "property_list"))
+
+
+async def remove_favorite(request, property_id):
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    await favorites.aremove(request, property_id)
+    return redirect(_next_url(request, "favorite_list"))
+
+
+async def favorite_list(request):
+    await _resolve_user(request)
+    page = await favorites.apage(request, request.GET.get("cursor"))
+    properties = [favorite.property for favorite in page]
+    for prop, (pk, card) in zip(properties, await sync_to_async(listing_cache.get_cards)(properties)):
+        prop.card = card
+    return render(request, "favourites.html", {"properties": properties, "next_cursor": page.next_cursor})
@@ -0,0 +1,95 @@
+import json
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+
+
+# -------------------------------
+# Benchmark results
+# -------------------------------
+# `manage.py seed_data` builds a realistic database, `run_benchmarks` times
+# the pages in-process and `load_test` drives a running server.  Both write
+# one JSON file per run to BENCHMARK_RESULTS_DIR, named after the commit, so
+# a later run can be compared against it:
+#
+#   {"commit": ..., "created_at": ..., "kind": "micro" | "load",
+#    "dataset": {model: rows}, "results": {scenario: {metric: value}}}
+#
+# Lower is better for every compared metric except req/s.
+
+# metric: (relative slack before it counts as a regression, higher is better)
+COMPARED_METRICS = {
+    'queries': (0, False),
+    'median_ms': (0.2, False),
+    'p95_ms': (0.3, False),
+    'peak_kb': (0.2, False),
+    'error_rate': (0, False),
+    'rps': (0.2, True),
+}
+
+
+def summarize(timings_ms):
+    timings = sorted(timings_ms)
+    if not timings:
+        return {'count': 0}
+    return {
+        'count': len(timings),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[max(0, int(len(timings) * 0.95) - 1)], 3),
+        'p99_ms': round(timings[max(0, int(len(timings) * 0.99) - 1)], 3),
+        'max_ms': round(timings[-1], 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def dataset():
+    from .models import Favorite, Message, Property, PropertyImage, User
+
+    return {model.__name__: model.objects.count() for model in (User, Property, PropertyImage, Message, Favorite)}
+
+
+def save(kind, results, output=None):
+    commit = git_revision()
+    now = datetime.now(timezone.utc)
+    report = {
+        'commit': commit,
+        'created_at': now.isoformat(timespec='seconds'),
+        'kind': kind,
+        'dataset': dataset(),
+        'results': results,
+    }
+    if output is None:
+        output = Path(settings.BENCHMARK_RESULTS_DIR) / f'{kind}-{now:%Y%m%d-%H%M%S}-{commit}.json'
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    Path(output).write_text(json.dumps(report, indent=2) + '\n')
+    return output
+
+
+def compare(baseline, current):
+    """[(scenario, metric, old, new)] for every metric that got worse by more than its slack."""
+    regressions = []
+    for scenario, metrics in current['results'].items():
+        old_metrics = baseline['results'].get(scenario)
+        if not old_metrics:
+            continue
+        for metric, (slack, higher_is_better) in COMPARED_METRICS.items():
+            old, new = old_metrics.get(metric), metrics.get(metric)
+            if old is None or new is None:
+                continue
+            worse = new < old * (1 - slack) if higher_is_better else new > old * (1 + slack)
+            if worse:
+                regressions.append((scenario, metric, old, new))
+    return regressions
@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+
+# -------------------------------
+# Per-listing counters
+# -------------------------------
+# The owner dashboard shows views, unread messages and favorites for every
+# listing.  Rather than counting rows per listing on each page load, the
+# numbers live in PropertyStats and are adjusted as things happen:
+#
+#   * views arrive in batches from the view tracker (tracking.py);
+#   * unread messages and favorites are bumped by signals (see signals.py),
+#     and recount() recomputes them exactly after bulk operations.
+
+
+def _adjust(field, deltas):
+    """Add {property_id: delta} to one PropertyStats column in a single UPDATE."""
+    from .models import PropertyStats
+
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    increment = Case(
+        *[When(property_id=pk, then=Value(delta)) for pk, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    with transaction.atomic():
+        updated = PropertyStats.objects.filter(property_id__in=deltas).update(
+            **{field: Greatest(F(field) + increment, Value(0))}
+        )
+        if updated < len(deltas):
+            # First event for a listing: start its row at the delta.  Only
+            # growing counters get a row, so a decrement for a listing that
+            # is being deleted cannot resurrect its stats.
+            existing = set(PropertyStats.objects.filter(property_id__in=deltas).values_list('property_id', flat=True))
+            PropertyStats.objects.bulk_create(
+                [
+                    PropertyStats(property_id=pk, **{field: delta})
+                    for pk, delta in deltas.items() if delta > 0 and pk not in existing
+                ],
+                ignore_conflicts=True,
+            )
+
+
+def adjust_unread(property_id, delta):
+    _adjust('unread_messages', {property_id: delta})
+
+
+def adjust_favorites(property_id, delta):
+    _adjust('favorite_count', {property_id: delta})
+
+
+def add_views(deltas):
+    _adjust('view_count', deltas)
+
+
+def recount(property_ids=None):
+    """Recompute unread messages and favorites exactly; view counts are kept."""
+    from .models import Property, PropertyStats
+
+    properties = Property.objects.all() if property_ids is None else Property.objects.filter(pk__in=property_ids)
+    rows = properties.order_by().annotate(
+        unread=Count('messages', filter=Q(messages__is_read=False), distinct=True),
+        favorites=Count('favorited_by', distinct=True),
+    ).values_list('pk', 'unread', 'favorites')
+    PropertyStats.objects.bulk_create(
+        [PropertyStats(property_id=pk, unread_messages=unread, favorite_count=favorites) for pk, unread, favorites in rows],
+        update_conflicts=True,
+        unique_fields=['property'],
+        update_fields=['unread_messages', 'favorite_count'],
+        batch_size=500,
+    )
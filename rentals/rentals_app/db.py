@@ -0,0 +1,107 @@
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+
+# -------------------------------
+# Read replica routing
+# -------------------------------
+# When settings.DATABASES has a "replica" alias, the public listing pages
+# named in REPLICA_READ_VIEWS read from it; everything else, and every write,
+# uses "default".  Replicas lag, so a client that has just written anything
+# (an owner saving a listing, a tenant sending an inquiry) carries a short
+# lived cookie that pins its reads to the primary until the replica has
+# caught up.  "Written" means the router handed out the primary for a write
+# during the request, so a GET that saves something (save_favorite) counts.
+
+REPLICA_ALIAS = 'replica'
+STICKY_COOKIE = 'db_primary'
+
+_use_replica = ContextVar('use_replica', default=False)
+# Models written during the current request; None outside one
+_writes = ContextVar('writes', default=None)
+
+
+def replica_configured():
+    if REPLICA_ALIAS not in settings.DATABASES:
+        return False
+    # Under test the replica is a mirror of the primary's test database; a
+    # second connection to it could not see the test case's open transaction
+    replica, primary = connections[REPLICA_ALIAS].settings_dict, connections['default'].settings_dict
+    return (replica['NAME'], replica['HOST']) != (primary['NAME'], primary['HOST'])
+
+
+def reading_replica():
+    """Whether this request's reads go to the replica."""
+    return _use_replica.get() and replica_configured()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return REPLICA_ALIAS if reading_replica() else 'default'
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None:
+            writes.add(model._meta.label)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+
+@sync_and_async_middleware
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token, writes = _use_replica.set(False), set()
+        writes_token = _writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+            _writes.reset(writes_token)
+        return self.pin_writer(request, response, writes)
+
+    async def __acall__(self, request):
+        token, writes = _use_replica.set(False), set()
+        writes_token = _writes.set(writes)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+            _writes.reset(writes_token)
+        return self.pin_writer(request, response, writes)
+
+    def pin_writer(self, request, response, writes):
+        session = getattr(request, 'session', None)
+        wrote = (
+            writes
+            or request.method not in ('GET', 'HEAD', 'OPTIONS')
+            or (session is not None and session.modified)
+        )
+        if wrote and replica_configured():
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        _use_replica.set(
+            request.method in ('GET', 'HEAD')
+            and match is not None
+            and match.url_name in settings.REPLICA_READ_VIEWS
+            and STICKY_COOKIE not in request.COOKIES
+        )
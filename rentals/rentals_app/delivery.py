@@ -0,0 +1,232 @@
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+from .middleware import ACCEPTS_BR, ACCEPTS_GZIP
+
+
+# -------------------------------
+# Media and static delivery
+# -------------------------------
+# Serves MEDIA_ROOT and STATIC_ROOT in production.  Every response carries an
+# ETag and Last-Modified and answers conditional requests with a 304; names
+# that embed a content hash (uploads and image variants, see images.py, and
+# collectstatic's fingerprinted copies, see storage.py) never change, so they
+# are cached for a year as immutable.  Static text assets are answered from
+# their precompressed .br/.gz siblings.
+#
+# FILE_SERVING picks who sends the bytes:
+#   'django'           FileResponse; under gunicorn the WSGI file wrapper
+#                      hands the open file to sendfile(), Range included
+#   'x-accel-redirect' nginx, via an internal location per root:
+#                        location /_files/media/ { internal; alias /srv/rentals/media/; }
+#   'x-sendfile'       Apache mod_xsendfile or lighttpd, with the full path
+# In the last two, Django only checks the path and the validators and the
+# front end does the rest, Range requests included.
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# images.py names uploads and variants after a 32-character content hash;
+# ManifestStaticFilesStorage inserts a 12-character one before the extension
+HASHED_MEDIA_RE = re.compile(r'(^|/)[0-9a-f]{32}[.-][^/]*$')
+HASHED_STATIC_RE = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+class FileRange:
+    """
+    A window on an open file: read() stops at the end of the range, and
+    fileno() lets gunicorn's sendfile() start at the current offset (it sends
+    Content-Length bytes from there).
+    """
+
+    def __init__(self, fh, start, length):
+        fh.seek(start)
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fh.fileno()
+
+    def close(self):
+        self.fh.close()
+
+
+class DeliveryResponse(FileResponse):
+    block_size = BLOCK_SIZE
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single "bytes=" range, None to send the whole file, or ValueError if unsatisfiable."""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None  # malformed or multipart: ignore it and send it all
+    first, last = match.groups()
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def if_range_passes(request, etag, last_modified):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def choose_encoding(request, fullpath):
+    """Path and Content-Encoding of the best precompressed sibling the client accepts."""
+    accept = request.headers.get('Accept-Encoding', '')
+    for suffix, encoding, accepts in (('.br', 'br', ACCEPTS_BR), ('.gz', 'gzip', ACCEPTS_GZIP)):
+        if accepts.search(accept) and os.path.isfile(fullpath + suffix):
+            return fullpath + suffix, encoding
+    return fullpath, None
+
+
+def serve(request, path, document_root, root_name, hashed_re=HASHED_MEDIA_RE, precompressed=False):
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(document_root, path)
+        stat_result = os.stat(fullpath)
+    except (OSError, ValueError, SuspiciousFileOperation):
+        raise Http404('No such file')
+    if not stat.S_ISREG(stat_result.st_mode) or (precompressed and path.endswith(('.gz', '.br'))):
+        raise Http404('No such file')
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    sent, encoding = choose_encoding(request, fullpath) if precompressed else (fullpath, None)
+    if encoding:
+        stat_result = os.stat(sent)
+    last_modified = int(stat_result.st_mtime)
+    etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}{"-" + encoding if encoding else ""}"'
+
+    headers = HttpResponse()
+    headers['ETag'] = etag
+    headers['Last-Modified'] = http_date(last_modified)
+    if hashed_re.search(path):
+        headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        headers['Cache-Control'] = f'public, max-age={settings.FILE_MAX_AGE}'
+    if precompressed and any(os.path.isfile(fullpath + suffix) for suffix in ('.br', '.gz')):
+        patch_vary_headers(headers, ('Accept-Encoding',))
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified, response=headers)
+    if not_modified is not headers:
+        return not_modified
+
+    if settings.FILE_SERVING in ('x-accel-redirect', 'x-sendfile'):
+        response = HttpResponse(content_type=content_type)
+        if settings.FILE_SERVING == 'x-accel-redirect':
+            sent_path = path + sent[len(fullpath):]  # plus .br/.gz
+            response['X-Accel-Redirect'] = f'{settings.FILE_SERVING_INTERNAL_URL}{root_name}/{sent_path}'
+        else:
+            response['X-Sendfile'] = sent
+    else:
+        size = stat_result.st_size
+        try:
+            byte_range = (
+                parse_range(request.META.get('HTTP_RANGE', ''), size)
+                if 'HTTP_RANGE' in request.META and if_range_passes(request, etag, last_modified)
+                else None
+            )
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+            response['Content-Length'] = str(size)
+        elif byte_range:
+            start, end = byte_range
+            response = DeliveryResponse(FileRange(open(sent, 'rb'), start, end - start + 1), content_type=content_type, status=206)
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        else:
+            response = DeliveryResponse(open(sent, 'rb'), content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+
+    for header, value in headers.items():
+        if header != 'Content-Type':
+            response[header] = value
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+def serve_media(request, path):
+    return serve(request, path, settings.MEDIA_ROOT, 'media')
+
+
+def serve_static(request, path):
+    return serve(request, path, settings.STATIC_ROOT, 'static', hashed_re=HASHED_STATIC_RE, precompressed=True)
+
+
+def routes():
+    """(URL prefix, view) for each root this module serves."""
+    found = []
+    for url, root, view in (
+        (settings.MEDIA_URL, settings.MEDIA_ROOT, serve_media),
+        (settings.STATIC_URL, settings.STATIC_ROOT, serve_static),
+    ):
+        if url and root and '://' not in url:
+            found.append(('/' + url.lstrip('/'), view))
+    return found
+
+
+def urlpatterns():
+    return [re_path(rf'^{re.escape(prefix.lstrip("/"))}(?P<path>.+)$', view) for prefix, view in routes()]
+
+
+class FileServingApplication:
+    """
+    WSGI front for rentals/wsgi.py: answers GET and HEAD under MEDIA_URL and
+    STATIC_URL before Django's middleware and URL resolver run, and passes
+    everything else (404s included) to the wrapped application.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.routes = routes()
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if environ.get('REQUEST_METHOD') not in ('GET', 'HEAD'):
+            return self.application(environ, start_response)
+        for prefix, view in self.routes:
+            if path.startswith(prefix):
+                try:
+                    response = view(WSGIRequest(environ), path[len(prefix):])
+                except Http404:
+                    break
+                start_response(f'{response.status_code} {response.reason_phrase}', list(response.items()))
+                if getattr(response, 'file_to_stream', None) is not None and environ.get('wsgi.file_wrapper'):
+                    # As WSGIHandler does: let the server sendfile() it
+                    response.file_to_stream.close = response.close
+                    return environ['wsgi.file_wrapper'](response.file_to_stream, response.block_size)
+                return response
+        return self.application(environ, start_response)
@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Value, When
+
+
+# -------------------------------
+# Search facets
+# -------------------------------
+# Counts per property type, price band and location for the current search,
+# computed in ONE grouped query: rows are grouped by (location, type, price
+# band) and rolled up here, instead of one COUNT per facet value.
+
+TOP_LOCATIONS = 8
+
+
+def price_bands():
+    """[(low, high)] from settings.PRICE_FACET_BANDS; high is None for the last band."""
+    edges = [Decimal(edge) for edge in settings.PRICE_FACET_BANDS]
+    return list(zip(edges, edges[1:] + [None]))
+
+
+def _band_label(low, high):
+    if high is None:
+        return f'{low}+'
+    return f'{low}–{high}'
+
+
+def compute_facets(queryset):
+    from .models import Property
+
+    bands = price_bands()
+    band_expr = Case(
+        *[When(price__lt=high, then=Value(i)) for i, (low, high) in enumerate(bands) if high is not None],
+        default=Value(len(bands) - 1),
+        output_field=IntegerField(),
+    )
+    rows = (
+        queryset.order_by()
+        .annotate(band=band_expr)
+        .values('location', 'property_type', 'band')
+        .annotate(n=Count('id'))
+    )
+
+    types, band_counts, locations, total = {}, [0] * len(bands), {}, 0
+    for row in rows:
+        total += row['n']
+        types[row['property_type']] = types.get(row['property_type'], 0) + row['n']
+        band_counts[row['band']] += row['n']
+        locations[row['location']] = locations.get(row['location'], 0) + row['n']
+
+    top_locations = sorted(locations.items(), key=lambda item: (-item[1], item[0]))[:TOP_LOCATIONS]
+    return {
+        'total': total,
+        'property_types': [
+            {'value': value, 'label': label, 'count': types.get(value, 0)}
+            for value, label in Property.PROPERTY_TYPE_CHOICES
+        ],
+        'price_bands': [
+            {
+                'min_price': str(low),
+                # max_price is inclusive on the form, the band's upper edge isn't
+                'max_price': str(high - Decimal('0.01')) if high is not None else '',
+                'label': _band_label(low, high),
+                'count': count,
+            }
+            for (low, high), count in zip(bands, band_counts)
+        ],
+        'locations': [{'name': name, 'count': count} for name, count in top_locations],
+    }
@@ -0,0 +1,158 @@
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+from .models import Favorite, Property
+from . import counters
+from .pagination import KeysetPage, keyset_paginate, akeyset_paginate
+
+
+# -------------------------------
+# Favorites store
+# -------------------------------
+# Saved listings live in the Favorite table, keyed by the signed-in user or,
+# for anonymous visitors, by a random visitor id that is written to their
+# session once.  Adding a favorite writes one small row instead of rewriting a
+# growing list in the session row, and rows for deleted listings disappear
+# with the listing (ON DELETE CASCADE) instead of lingering as stale ids.
+# Rows of visitors whose session has gone are removed by purge_orphaned()
+# (the purge_visitor_favorites command, run after clearsessions).
+
+VISITOR_KEY = 'visitor_id'
+LEGACY_SESSION_KEY = 'favorites'
+
+
+def _owner(request, create=False):
+    """Filter kwargs selecting this request's favorites, or None if it has none yet."""
+    if request.user.is_authenticated:
+        return {'tenant': request.user}
+    visitor = request.session.get(VISITOR_KEY)
+    if visitor is None and create:
+        visitor = request.session[VISITOR_KEY] = uuid.uuid4().hex
+    return {'visitor': visitor} if visitor else None
+
+
+async def _aowner(request, create=False):
+    user = await request.auser()
+    if user.is_authenticated:
+        return {'tenant': user}
+    visitor = await request.session.aget(VISITOR_KEY)
+    if visitor is None and create:
+        visitor = uuid.uuid4().hex
+        await request.session.aset(VISITOR_KEY, visitor)
+    return {'visitor': visitor} if visitor else None
+
+
+def _import_legacy(request, owner):
+    # Sessions from before this store kept a plain list of ids
+    legacy = request.session.pop(LEGACY_SESSION_KEY, None)
+    if legacy:
+        existing = list(Property.objects.filter(id__in=legacy).values_list('id', flat=True))
+        Favorite.objects.bulk_create([Favorite(property_id=pk, **owner) for pk in existing], ignore_conflicts=True)
+        counters.recount(existing)
+
+
+def add(request, property_id):
+    owner = _owner(request, create=True)
+    _import_legacy(request, owner)
+    Favorite.objects.get_or_create(property_id=property_id, **owner)
+
+
+def remove(request, property_id):
+    owner = _owner(request)
+    if owner:
+        Favorite.objects.filter(property_id=property_id, **owner).delete()
+
+
+def page(request, cursor=None):
+    """One page of saved listings, most recently saved first."""
+    owner = _owner(request)
+    if owner is None and LEGACY_SESSION_KEY in request.session:
+        owner = _owner(request, create=True)
+    if owner is None:
+        return KeysetPage([], None)
+    _import_legacy(request, owner)
+    favorites = Favorite.objects.filter(**owner).select_related('property').defer('property__description')
+    return keyset_paginate(favorites, sort='saved', cursor=cursor, per_page=settings.PROPERTY_LIST_PAGE_SIZE)
+
+
+async def apage(request, cursor=None):
+    owner = await _aowner(request, create=await request.session.ahas_key(LEGACY_SESSION_KEY))
+    if owner is None:
+        return KeysetPage([], None)
+    if await request.session.ahas_key(LEGACY_SESSION_KEY):
+        await sync_to_async(_import_legacy)(request, owner)
+    favorites = Favorite.objects.filter(**owner).select_related('property').defer('property__description')
+    return await akeyset_paginate(favorites, sort='saved', cursor=cursor, per_page=settings.PROPERTY_LIST_PAGE_SIZE)
+
+
+async def aadd(request, property_id):
+    owner = await _aowner(request, create=True)
+    if await request.session.ahas_key(LEGACY_SESSION_KEY):
+        await sync_to_async(_import_legacy)(request, owner)
+    await Favorite.objects.aget_or_create(property_id=property_id, **owner)
+
+
+async def aremove(request, property_id):
+    owner = await _aowner(request)
+    if owner:
+        await Favorite.objects.filter(property_id=property_id, **owner).adelete()
+
+
+def favorited_ids(request, property_ids):
+    """Which of ``property_ids`` this visitor has saved, in one query."""
+    owner = _owner(request)
+    if not owner or not property_ids:
+        return set()
+    return set(
+        Favorite.objects.filter(property_id__in=property_ids, **owner).values_list('property_id', flat=True)
+    )
+
+
+async def afavorited_ids(request, property_ids):
+    owner = await _aowner(request)
+    if not owner or not property_ids:
+        return set()
+    return {
+        pk async for pk in Favorite.objects.filter(property_id__in=property_ids, **owner).values_list('property_id', flat=True)
+    }
+
+
+def merge_visitor_favorites(request, user):
+    """On login, move the visitor's favorites onto their account, keeping saved_at."""
+    visitor = request.session.pop(VISITOR_KEY, None)
+    _import_legacy(request, {'tenant': user})
+    if not visitor:
+        return
+    already_saved = Favorite.objects.filter(tenant=user).values('property_id')
+    Favorite.objects.filter(visitor=visitor, property_id__in=already_saved).delete()
+    Favorite.objects.filter(visitor=visitor).update(tenant=user, visitor=None)
+
+
+def purge_orphaned(grace=timedelta(days=1), batch_size=500):
+    """
+    Delete the favorites of visitors who no longer have a live session (it
+    expired or they cleared their cookies); returns how many rows went.
+    Visitors who saved something within ``grace`` are kept: their session
+    row is only written once the response goes out.
+    """
+    store, live = Session.get_session_store_class()(), set()
+    for data in Session.objects.filter(expire_date__gt=timezone.now()).values_list('session_data', flat=True).iterator():
+        visitor = store.decode(data).get(VISITOR_KEY)
+        if visitor:
+            live.add(visitor)
+    recent = Favorite.objects.filter(visitor__isnull=False, saved_at__gte=timezone.now() - grace).values('visitor')
+    orphaned = [
+        visitor for visitor in
+        Favorite.objects.filter(visitor__isnull=False).exclude(visitor__in=recent).values_list('visitor', flat=True).distinct().iterator()
+        if visitor not in live
+    ]
+    deleted = 0
+    for start in range(0, len(orphaned), batch_size):
+        # post_delete keeps PropertyStats.favorite_count in step
+        deleted += Favorite.objects.filter(visitor__in=orphaned[start:start + batch_size]).delete()[0]
+    return deleted
@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from .models import User, Property, PropertyImage, Message
+from .geo import geocode
 
 
 # =====================================================
@@ -76,6 +77,7 @@ class ContactOwnerForm(forms.ModelForm):
 
 # 7️⃣ Search & Filter Form (For browsing properties)
 class PropertySearchForm(forms.Form):
+    q = forms.CharField(required=False, label='Search')
     location = forms.CharField(required=False)
     min_price = forms.DecimalField(required=False, decimal_places=2)
     max_price = forms.DecimalField(required=False, decimal_places=2)
@@ -87,3 +89,56 @@ class PropertySearchForm(forms.Form):
             ('house', 'Entire House'),
         )
     )
+    near = forms.CharField(required=False, label='Near', help_text='e.g. Legon, Osu, Kumasi')
+    radius_km = forms.DecimalField(
+        required=False, min_value=0.1, max_value=100, decimal_places=1, label='Within (km)'
+    )
+    # Filled in by the browser's "use my location" button
+    lat = forms.FloatField(required=False, min_value=-90, max_value=90, widget=forms.HiddenInput)
+    lng = forms.FloatField(required=False, min_value=-180, max_value=180, widget=forms.HiddenInput)
+    sort = forms.ChoiceField(
+        required=False,
+        choices=(
+            ('relevance', 'Best match'),
+            ('distance', 'Nearest first'),
+            ('newest', 'Newest first'),
+            ('price', 'Price: low to high'),
+            ('-price', 'Price: high to low'),
+        )
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        lat, lng, near = cleaned_data.get('lat'), cleaned_data.get('lng'), cleaned_data.get('near')
+        if (lat is None) != (lng is None):
+            raise forms.ValidationError('Both latitude and longitude are required.')
+        if near and lat is None and geocode(near) is None:
+            self.add_error('near', "We don't know where that is yet. Try a nearby town or neighbourhood.")
+        return cleaned_data
+
+    def center(self):
+        """(latitude, longitude) to search around, or None."""
+        if self.cleaned_data.get('lat') is not None:
+            return self.cleaned_data['lat'], self.cleaned_data['lng']
+        if self.cleaned_data.get('near'):
+            return geocode(self.cleaned_data['near'])
+        return None
+
+
+class RentAnalyticsForm(forms.Form):
+    location = forms.CharField(required=False)
+    property_type = forms.ChoiceField(
+        required=False,
+        choices=(
+            ('', 'All Types'),
+            ('room', 'Room'),
+            ('house', 'Entire House'),
+        )
+    )
+    months = forms.IntegerField(required=False, min_value=1, max_value=36)
+
+
+class SavedSearchForm(forms.Form):
+    email = forms.EmailField(label='Email me new matches')
+    # The property_list query string being saved
+    query = forms.CharField(required=False, widget=forms.HiddenInput)
@@ -0,0 +1,149 @@
+import csv
+import difflib
+import math
+from functools import lru_cache
+from pathlib import Path
+
+from django.db import connections
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+from .search import tokenize
+
+
+# -------------------------------
+# Offline geocoding + "near me" search
+# -------------------------------
+# Property.location is free text, so coordinates are derived from a bundled
+# gazetteer of Ghanaian towns and neighbourhoods (approximate centroids, no
+# network calls).  Coordinates are mirrored into an SQLite R*Tree so a radius
+# search only looks at listings inside the circle's bounding box; other
+# databases use the (latitude, longitude) B-tree index instead.  The exact
+# distance of the listings in the box is computed by the database, so the
+# other filters and the sort apply to every listing in the circle.
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'gh_places.csv'
+RTREE_TABLE = 'rentals_app_property_rtree'
+EARTH_RADIUS_KM = 6371.0
+MAX_PLACE_WORDS = 3
+
+
+@lru_cache(maxsize=1)
+def gazetteer():
+    """{normalized name: (display name, latitude, longitude)}"""
+    places = {}
+    with open(GAZETTEER_PATH, newline='', encoding='utf-8') as fh:
+        for row in csv.DictReader(fh):
+            key = ' '.join(tokenize(row['name']))
+            places[key] = (row['name'], float(row['latitude']), float(row['longitude']))
+    return places
+
+
+def geocode(text):
+    """
+    Best (latitude, longitude) for a free-text location, or None.  The most
+    specific place wins, so "East Legon, Accra" resolves to East Legon rather
+    than Accra; single misspelt words get a fuzzy second chance.
+    """
+    places = gazetteer()
+    tokens = tokenize(text)
+    for size in range(MAX_PLACE_WORDS, 0, -1):
+        for start in range(len(tokens) - size + 1):
+            key = ' '.join(tokens[start:start + size])
+            if key in places:
+                return places[key][1:]
+    for token in tokens:
+        if len(token) > 3:
+            match = difflib.get_close_matches(token, places.keys(), n=1, cutoff=0.85)
+            if match:
+                return places[match[0]][1:]
+    return None
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def distance_km(lat, lng):
+    """ORM expression for haversine_km() from (lat, lng) to a listing's coordinates."""
+    lat1 = math.radians(lat)
+    half_dlat = (Radians(F('latitude')) - lat1) / 2
+    half_dlng = (Radians(F('longitude')) - math.radians(lng)) / 2
+    a = Power(Sin(half_dlat), 2) + math.cos(lat1) * Cos(Radians(F('latitude'))) * Power(Sin(half_dlng), 2)
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a))
+
+
+def bounding_box(lat, lng, radius_km):
+    """(south, west, north, east) enclosing a circle of ``radius_km``."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlng = math.degrees(radius_km / (EARTH_RADIUS_KM * max(math.cos(math.radians(lat)), 1e-6)))
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+class BTreeGeoIndex:
+    """Portable fallback: a range scan on the (latitude, longitude) index."""
+
+    def __init__(self, using='default'):
+        self.using = using
+
+    def index(self, prop):
+        pass
+
+    def remove(self, pk):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def in_box(self, queryset, south, west, north, east):
+        return queryset.filter(latitude__range=(south, north), longitude__range=(west, east))
+
+    def within(self, queryset, lat, lng, radius_km):
+        """``queryset`` narrowed to ``radius_km`` around (lat, lng), annotated with ``distance_km``."""
+        box = self.in_box(queryset, *bounding_box(lat, lng, radius_km))
+        return box.annotate(distance_km=distance_km(lat, lng)).filter(distance_km__lte=radius_km)
+
+
+class RTreeGeoIndex(BTreeGeoIndex):
+    """SQLite R*Tree of listing coordinates, created by migration 0007."""
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def index(self, prop):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {RTREE_TABLE} WHERE id = %s', [prop.pk])
+            if prop.latitude is not None and prop.longitude is not None:
+                cursor.execute(
+                    f'INSERT INTO {RTREE_TABLE} (id, min_lat, max_lat, min_lng, max_lng) VALUES (%s, %s, %s, %s, %s)',
+                    [prop.pk, prop.latitude, prop.latitude, prop.longitude, prop.longitude],
+                )
+
+    def remove(self, pk):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {RTREE_TABLE} WHERE id = %s', [pk])
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {RTREE_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {RTREE_TABLE} (id, min_lat, max_lat, min_lng, max_lng) '
+                f'SELECT id, latitude, latitude, longitude, longitude FROM rentals_app_property '
+                f'WHERE latitude IS NOT NULL AND longitude IS NOT NULL'
+            )
+
+    def in_box(self, queryset, south, west, north, east):
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT id FROM {RTREE_TABLE} WHERE min_lat >= %s AND max_lat <= %s AND min_lng >= %s AND max_lng <= %s',
+            [south, north, west, east],
+        ))
+
+
+def get_geo_index(using='default'):
+    if connections[using].vendor == 'sqlite':
+        return RTreeGeoIndex(using=using)
+    return BTreeGeoIndex(using=using)
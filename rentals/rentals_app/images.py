@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------------
+# Image pipeline
+# -------------------------------
+# Uploaded originals can be several megabytes.  After an upload is committed
+# the original is re-encoded in a worker process into a few widths and
+# formats with EXIF (including GPS) stripped.  The resulting names are stored
+# in the model's ``variants`` JSON field and rendered with the
+# ``responsive_image`` template tag as a <picture> with srcset.
+#
+# Originals are public too (and served as immutable), so they are
+# re-encoded without metadata before they are stored: see strip_metadata().
+
+# variant name -> max width in px
+VARIANT_WIDTHS = {
+    'thumb': 160,
+    'card': 400,
+    'full': 1280,
+}
+
+# Best format first; the last one is the universal <img> fallback
+FORMATS = [fmt for fmt in ('avif', 'webp') if features.check(fmt)] + ['jpeg']
+
+SAVE_OPTIONS = {
+    'avif': {'quality': 60},
+    'webp': {'quality': 75, 'method': 4},
+    'jpeg': {'quality': 80, 'optimize': True, 'progressive': True},
+}
+
+# Originals are kept close to what was uploaded; only the metadata goes
+ORIGINAL_SAVE_OPTIONS = {
+    'JPEG': {'quality': 95},
+    'WEBP': {'quality': 90},
+    'AVIF': {'quality': 85},
+}
+
+VARIANTS_DIR = 'property_images/variants'
+
+
+def content_hash(fileobj):
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(64 * 1024), b''):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_upload_to(instance, filename):
+    """Name originals after a hash of their content instead of the client's filename."""
+    ext = os.path.splitext(filename)[1].lower()
+    return f'property_images/{content_hash(instance.image)[:32]}{ext}'
+
+
+def _without_metadata(image):
+    # Apply the camera orientation, then drop everything but the colour profile
+    image = ImageOps.exif_transpose(image)
+    image.info = {key: value for key, value in image.info.items() if key == 'icc_profile'}
+    return image
+
+
+def strip_metadata(fileobj):
+    """
+    Re-encode the image in ``fileobj`` in its own format without EXIF (GPS,
+    camera serials...) or comments; returns the new bytes.  Raises
+    ValueError if it is not an image.
+    """
+    try:
+        fileobj.seek(0)
+        with Image.open(fileobj) as image:
+            image.verify()
+        fileobj.seek(0)
+        with Image.open(fileobj) as image:
+            fmt = image.format
+            image.load()
+            image = _without_metadata(image)
+    except Exception:
+        name = os.path.basename(getattr(fileobj, 'name', None) or 'upload')
+        raise ValueError(f'"{name}" is not a valid image.')
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, fmt, icc_profile=image.info.get('icc_profile'), **ORIGINAL_SAVE_OPTIONS.get(fmt, {}))
+    return buffer.getvalue()
+
+
+def store_original(path, ext=None):
+    """
+    Strip the metadata from the image at local ``path`` and copy it into
+    media storage under its content hash; returns the storage name.
+    Identical photos share one stored file.  Raises ValueError if the file
+    is not an image.
+    """
+    ext = (ext or os.path.splitext(path)[1]).lower()
+    with open(path, 'rb') as fh:
+        content = ContentFile(strip_metadata(fh))
+    name = f'property_images/{content_hash(content)[:32]}{ext}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, content)
+    return name
+
+
+def strip_upload(instance):
+    """Replace a not-yet-saved upload on ``instance.image`` with a copy without metadata."""
+    upload = instance.image
+    if not upload or upload._committed:
+        return
+    try:
+        content = strip_metadata(upload)
+    except ValueError:
+        return  # left to ImageField validation, as before
+    instance.image = ContentFile(content, name=upload.name)
+
+
+def render_variants(source_name):
+    """
+    Runs in a worker process: returns {variant: {format: storage name}}.
+    Never touches the database.
+    """
+    with default_storage.open(source_name, 'rb') as fh:
+        digest = content_hash(fh)[:32]
+        original = Image.open(fh)
+        original.load()
+
+    original = _without_metadata(original)
+    if original.mode not in ('RGB', 'L'):
+        original = original.convert('RGB')
+
+    variants = {'source': source_name, 'width': original.width, 'height': original.height}
+    for variant, max_width in VARIANT_WIDTHS.items():
+        image = original
+        if image.width > max_width:
+            height = round(image.height * max_width / image.width)
+            image = image.resize((max_width, height), Image.LANCZOS)
+        variants[variant] = {'width': image.width}
+        for fmt in FORMATS:
+            name = f'{VARIANTS_DIR}/{digest}-{variant}.{"jpg" if fmt == "jpeg" else fmt}'
+            if not default_storage.exists(name):
+                buffer = BytesIO()
+                image.save(buffer, fmt.upper(), **SAVE_OPTIONS[fmt])
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+            variants[variant][fmt] = name
+    return variants
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_PIPELINE_WORKERS,
+            initializer=_init_worker,
+        )
+    return _executor
+
+
+def _store_variants(model, pk, card_pk, variants):
+    # .update() skips post_save, so the pipeline doesn't re-trigger itself
+    from . import listing_cache
+    from .models import Property
+
+    if model.objects.filter(pk=pk, image=variants['source']).update(variants=variants):
+        Property.objects.filter(pk=card_pk).touch()
+    listing_cache.invalidate_card(card_pk)
+
+
+def _on_done(model, pk, card_pk):
+    def callback(future):
+        try:
+            _store_variants(model, pk, card_pk, future.result())
+        except Exception:
+            logger.exception('Image processing failed for %s %s', model.__name__, pk)
+        finally:
+            connections.close_all()
+    return callback
+
+
+def needs_processing(instance):
+    return bool(instance.image) and (instance.variants or {}).get('source') != instance.image.name
+
+
+def _card_pk(instance):
+    # PropertyImage rows belong to their property's card
+    return getattr(instance, 'property_id', instance.pk)
+
+
+def process_now(instance):
+    _store_variants(type(instance), instance.pk, _card_pk(instance), render_variants(instance.image.name))
+
+
+def schedule(instance):
+    """Queue variant generation once the current transaction commits."""
+    if not settings.IMAGE_PIPELINE_ENABLED or not needs_processing(instance):
+        return
+    model, pk, card_pk, name = type(instance), instance.pk, _card_pk(instance), instance.image.name
+
+    def submit():
+        if settings.IMAGE_PIPELINE_ASYNC:
+            get_executor().submit(render_variants, name).add_done_callback(_on_done(model, pk, card_pk))
+        else:
+            _store_variants(model, pk, card_pk, render_variants(name))
+
+    transaction.on_commit(submit)
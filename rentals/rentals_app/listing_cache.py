@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import get_template
+
+from .db import reading_replica
+
+
+# -------------------------------
+# property_list result cache
+# -------------------------------
+# Anonymous traffic repeats a handful of filter combinations, so each
+# (normalized search, sort, cursor) page is cached as its ordered id list and
+# every listing card is cached once as rendered HTML.  Storage, LRU size and
+# TTL come from the "listings" alias in settings.CACHES (local memory, file
+# or Redis).
+#
+# Invalidation is precise rather than a global flush:
+#   * ``listing:card:<pk>`` is dropped when that Property or one of its
+#     images changes.  It also records the updated_at it was rendered from,
+#     so callers holding the Property (favourites, dashboard) re-render a
+#     card that another worker's save made stale;
+#   * ``listing:pages:<pk>`` remembers which cached pages contain a listing,
+#     so they are dropped when it changes;
+#   * ``listing:bands:<type>`` remembers each cached page's (and facet
+#     summary's) price band and the Property fields its results depend on,
+#     so a save drops the entries the listing enters or leaves, and those
+#     whose order or matches the changed fields can affect (e.g. a price
+#     change for price-sorted pages, a title change for keyword searches).
+#
+# The registries are plain cache values updated read-modify-write, so they
+# expire with the same TTL as the pages and hold at most REGISTRY_LIMIT
+# entries.  An update lost to a concurrent write, an eviction or a trim
+# can't leave a page serving stale results: get_page() and get_facets() only
+# trust entries still listed in their type registry.
+#
+# clear() must reach every worker, but a LocMemCache lives in one process.
+# So every key is versioned with the mtime of a small file
+# (LISTING_CACHE_GENERATION_PATH) that clear() touches; one stat() per use
+# lets each process see the bump and ignore what it cached before.
+#
+# Replicas lag: a page read from one just after a save could put the old
+# results back into the cache the save just cleaned, for every visitor.  So
+# for REPLICA_STICKY_SECONDS after a listing changes (the lag the replica
+# router already assumes), replica reads are served but not cached.
+
+CARD_TEMPLATE = '_property_card.html'
+
+REGISTRY_LIMIT = 1000  # entries per type registry, and pages per listing
+
+# Property fields cached results can depend on beyond type and price band;
+# Property.from_db records them for invalidate_property().
+TRACKED_FIELDS = ('is_available', 'property_type', 'price', 'title', 'location', 'description', 'latitude', 'longitude')
+KEYWORD_FIELDS = {
+    'q': ('title', 'location', 'description'),
+    'location': ('location',),
+    'near': ('latitude', 'longitude'),
+    'lat': ('latitude', 'longitude'),
+}
+
+
+def generation():
+    try:
+        return os.stat(settings.LISTING_CACHE_GENERATION_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _cache():
+    cache = caches[settings.LISTING_CACHE_ALIAS]
+    # The handle is per thread; its version is the default for every key
+    cache.version = generation()
+    return cache
+
+
+def normalize(cleaned_data, cursor=None):
+    """Canonical, JSON-safe form of PropertySearchForm.cleaned_data."""
+    criteria = {}
+    for name, value in sorted(cleaned_data.items()):
+        if value in (None, ''):
+            continue
+        if isinstance(value, Decimal):
+            value = str(value.normalize())
+        elif isinstance(value, str):
+            value = ' '.join(value.lower().split())
+        criteria[name] = value
+    if cursor:
+        criteria['cursor'] = cursor
+    return criteria
+
+
+def fingerprint(criteria):
+    raw = json.dumps(criteria, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _replica_may_lag(cache):
+    return reading_replica() and time.time() - cache.get('listing:written_at', 0) < settings.REPLICA_STICKY_SECONDS
+
+
+def _registry_key(criteria):
+    return f"listing:bands:{criteria.get('property_type', '')}"
+
+
+def _get_registered(cache, key, criteria):
+    registry_key = _registry_key(criteria)
+    found = cache.get_many([key, registry_key])
+    if key not in found.get(registry_key, {}):
+        return None
+    return found.get(key)
+
+
+def _depends_on(criteria, facets=False):
+    """Property fields besides type and price band that change which rows ``criteria`` shows, or their order."""
+    fields = set()
+    for name, depends in KEYWORD_FIELDS.items():
+        if criteria.get(name):
+            fields.update(depends)
+    if facets:
+        fields.update(('price', 'property_type', 'location'))  # counted per band, type and location
+    elif criteria.get('sort') in ('price', '-price'):
+        fields.add('price')
+    return tuple(sorted(fields))
+
+
+def _trim(registry):
+    """Keep the newest REGISTRY_LIMIT entries; returns the keys dropped."""
+    dropped = list(registry)[:max(0, len(registry) - REGISTRY_LIMIT)]
+    for key in dropped:
+        del registry[key]
+    return dropped
+
+
+def _register(cache, criteria, key, depends_on, extra=None):
+    registry_key = _registry_key(criteria)
+    registries = {registry_key: cache.get(registry_key, {}), **(extra or {})}
+    registry = registries[registry_key]
+    registry.pop(key, None)  # re-inserted as the newest
+    registry[key] = (criteria.get('min_price'), criteria.get('max_price'), depends_on)
+    dropped = set()
+    for members in registries.values():
+        dropped.update(_trim(members))
+    # Registries expire with the default TTL too, and are re-set with every
+    # entry, so they outlive the entries they list
+    cache.set_many(registries)
+    if dropped - {key}:
+        cache.delete_many(list(dropped - {key}))
+
+
+def get_page(criteria):
+    return _get_registered(_cache(), f'listing:page:{fingerprint(criteria)}', criteria)
+
+
+def store_page(criteria, page):
+    cache = _cache()
+    if _replica_may_lag(cache):
+        return
+    key = f'listing:page:{fingerprint(criteria)}'
+    ids = [prop.pk for prop in page]
+    cache.set(key, {'ids': ids, 'next_cursor': page.next_cursor})
+
+    listings = cache.get_many([f'listing:pages:{pk}' for pk in ids])
+    for pk in ids:
+        members = listings.setdefault(f'listing:pages:{pk}', {})
+        members.pop(key, None)
+        members[key] = None
+    _register(cache, criteria, key, _depends_on(criteria), listings)
+
+
+def facet_criteria(criteria):
+    # Facets describe the whole result set, not one page of it
+    return {name: value for name, value in criteria.items() if name not in ('cursor', 'sort')}
+
+
+def get_facets(criteria):
+    criteria = facet_criteria(criteria)
+    return _get_registered(_cache(), f'listing:facets:{fingerprint(criteria)}', criteria)
+
+
+def store_facets(criteria, facets):
+    cache = _cache()
+    if _replica_may_lag(cache):
+        return
+    criteria = facet_criteria(criteria)
+    key = f'listing:facets:{fingerprint(criteria)}'
+    cache.set(key, facets)
+    _register(cache, criteria, key, _depends_on(criteria, facets=True))
+
+
+def card_version(prop):
+    return prop.updated_at.isoformat() if prop.updated_at else ''
+
+
+def get_cards(properties_or_ids, loader=None):
+    """
+    [(pk, rendered card HTML)] for each listing, in order.  Given Property
+    objects, a cached card is reused only if it was rendered from the same
+    updated_at; given ids, ``loader`` is called with the ids that are not
+    cached and must return {pk: Property}.  Cards are shared by every
+    visitor, so per-visitor bits such as the favorite toggle are rendered
+    around them, not inside.
+    """
+    cache = _cache()
+    objects = {item.pk: item for item in properties_or_ids if hasattr(item, 'pk')}
+    ids = [getattr(item, 'pk', item) for item in properties_or_ids]
+    cached = cache.get_many([f'listing:card:{pk}' for pk in ids])
+    cards = {}
+    for pk in ids:
+        version, html = cached.get(f'listing:card:{pk}', (None, None))
+        if html is not None and (pk not in objects or version == card_version(objects[pk])):
+            cards[pk] = html
+
+    missing = [pk for pk in ids if pk not in cards]
+    if missing:
+        found = {pk: objects[pk] for pk in missing if pk in objects}
+        unloaded = [pk for pk in missing if pk not in objects]
+        if unloaded:
+            found.update(loader(unloaded))
+        template = get_template(CARD_TEMPLATE)
+        rendered = {pk: (card_version(prop), template.render({'property': prop})) for pk, prop in found.items()}
+        if not _replica_may_lag(cache):
+            cache.set_many({f'listing:card:{pk}': entry for pk, entry in rendered.items()})
+        cards.update({pk: html for pk, (version, html) in rendered.items()})
+    return [(pk, cards[pk]) for pk in ids if pk in cards]
+
+
+def _price_in_band(price, band):
+    low, high = band
+    if low is not None and price < Decimal(low):
+        return False
+    if high is not None and price > Decimal(high):
+        return False
+    return True
+
+
+def _shown(state, bucket_type, band):
+    """Whether a listing in ``state`` falls in a type registry's bucket and price band."""
+    if not state or not state['is_available']:
+        return False
+    if bucket_type and state['property_type'] != bucket_type:
+        return False
+    return _price_in_band(Decimal(state['price']), band)
+
+
+def invalidate_property(prop, deleted=False):
+    """
+    Drop the cached entries the save can have changed, comparing the listing
+    with the state it was loaded with (Property.from_db).  A listing without
+    one, e.g. a new one, is treated as entering every band it is in.
+    """
+    cache = _cache()
+    previous = getattr(prop, '_loaded_state', None)
+    current = {name: prop.__dict__.get(name) for name in TRACKED_FIELDS}
+    if deleted:
+        previous, current = previous or current, None
+    if previous is None:
+        changed = set(TRACKED_FIELDS)
+    elif current is None:
+        changed = {'is_available'}
+    else:
+        # Fields deferred when the row was loaded count as changed
+        changed = {name for name in TRACKED_FIELDS if name not in previous or previous[name] != current[name]}
+    if not changed:
+        invalidate_card(prop.pk)
+        return
+
+    bucket_types = {''} | {state['property_type'] for state in (previous, current) if state}
+    registries = cache.get_many([f'listing:bands:{bucket_type}' for bucket_type in bucket_types])
+    stale = set(cache.get(f'listing:pages:{prop.pk}', {}))
+    for registry_key, registry in registries.items():
+        bucket_type = registry_key[len('listing:bands:'):]
+        for key, (low, high, depends_on) in registry.items():
+            was = _shown(previous, bucket_type, (low, high))
+            now = _shown(current, bucket_type, (low, high))
+            # Entering or leaving the band, or moving within it in a way the entry depends on
+            if was != now or (was and changed.intersection(depends_on)):
+                stale.add(key)
+        if stale.intersection(registry):
+            cache.set(registry_key, {key: entry for key, entry in registry.items() if key not in stale})
+
+    cache.delete_many(list(stale) + [f'listing:pages:{prop.pk}', f'listing:card:{prop.pk}'])
+    cache.set('listing:written_at', time.time())
+
+
+def invalidate_card(pk):
+    cache = _cache()
+    cache.delete(f'listing:card:{pk}')
+    cache.set('listing:written_at', time.time())
+
+
+def clear():
+    """Drop every cached page, facet summary and card in every process, e.g. after a bulk import."""
+    path = Path(settings.LISTING_CACHE_GENERATION_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    previous = generation()
+    path.touch()
+    if generation() == previous:
+        # Coarse filesystem timestamps: move it on by hand
+        os.utime(path, ns=(previous + 1, previous + 1))
+    _cache().clear()
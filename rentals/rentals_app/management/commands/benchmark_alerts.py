@@ -0,0 +1,97 @@
+import random
+import time
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from rentals_app import alerts, benchmarks
+from rentals_app.forms import PropertySearchForm
+from rentals_app.models import Property
+from rentals_app.views import filter_properties
+
+
+class Command(BaseCommand):
+    help = (
+        "Time matching listings against saved searches with the alerts.py index, against "
+        "checking every search in turn and against running every search as a property_list "
+        "query (sampled), using listings from the current database and synthetic searches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--searches', type=int, default=10000)
+        parser.add_argument('--listings', type=int, default=200)
+        parser.add_argument('--query-sample', type=int, default=50, help="Searches run as queries to estimate that cost.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help="Results file (default: a new file in BENCHMARK_RESULTS_DIR).")
+
+    def searches(self, count, rng):
+        """Criteria shaped like PropertySearchForm queries people save."""
+        locations = list(
+            Property.objects.order_by().values_list('location', flat=True).distinct()[:200]
+        )
+        words = ['furnished', 'self contained', 'garden', 'quiet', 'new', 'spacious']
+        found = []
+        for _ in range(count):
+            criteria = {}
+            if rng.random() < 0.6:
+                criteria['property_type'] = rng.choice(['room', 'house'])
+            if rng.random() < 0.8:
+                criteria['location'] = rng.choice(locations).split(',')[0].lower()
+            elif rng.random() < 0.5:
+                criteria['q'] = rng.choice(words)
+            if rng.random() < 0.5:
+                criteria['min_price'] = str(rng.randrange(0, 3000, 100))
+            if rng.random() < 0.7:
+                criteria['max_price'] = str(rng.randrange(500, 8000, 100))
+            found.append(criteria)
+        return found
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        listings = list(Property.objects.order_by('-id')[:options['listings']])
+        if not listings:
+            raise CommandError("No listings; run `manage.py seed_data` first.")
+        searches = self.searches(options['searches'], rng)
+
+        start = time.perf_counter()
+        index = alerts.SearchIndex()
+        for pk, criteria in enumerate(searches, 1):
+            index.add(pk, criteria)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        compiled = [(pk, alerts.compile_criteria(criteria)) for pk, criteria in enumerate(searches, 1)]
+        results, hits = {}, {}
+        for name, match in [
+            ('index', index.match),
+            ('scan', lambda prop: {pk for pk, search in compiled if alerts.matches(search, prop)}),
+        ]:
+            timings, hits[name] = [], 0
+            for prop in listings:
+                start = time.perf_counter()
+                hits[name] += len(match(prop))
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = {**benchmarks.summarize(timings), 'matches': hits[name]}
+        if hits['index'] != hits['scan']:
+            raise CommandError(f"The index found {hits['index']} matches but the scan {hits['scan']}")
+
+        # What a listing save would cost if it ran each saved search as a query
+        sample = rng.sample(searches, min(options['query_sample'], len(searches)))
+        start = time.perf_counter()
+        for criteria in sample:
+            form = PropertySearchForm(QueryDict(urlencode(criteria)))
+            form.is_valid()
+            filter_properties(form)[0].filter(pk=listings[0].pk).exists()
+        per_query_ms = (time.perf_counter() - start) * 1000 / len(sample)
+        results['index']['build_ms'] = round(build_ms, 1)
+        results['queries'] = {'median_ms': round(per_query_ms * len(searches), 1), 'sampled': len(sample)}
+
+        self.stdout.write(f"{len(searches)} saved searches indexed in {build_ms:.0f} ms")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:8} per listing median {result['median_ms']:9.3f} ms"
+                + (f"  p95 {result['p95_ms']:8.3f} ms  {result['matches']} matches" if 'p95_ms' in result else
+                   f"  (estimated from {len(sample)} searches)")
+            )
+        path = benchmarks.save('alerts', results, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {path}"))
@@ -0,0 +1,142 @@
+import time
+from pathlib import Path
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.contrib.staticfiles.views import serve as dev_static_serve
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import re_path
+from django.views.static import serve as dev_media_serve
+
+from rentals_app import benchmarks
+from rentals_app.delivery import FileServingApplication
+
+
+STYLESHEET = 'admin/css/base.css'
+ACCEPT_ENCODING = 'gzip, deflate, br'
+
+# What rentals/urls.py used to mount with static() when DEBUG was on, and
+# what runserver does for /static/; used as ROOT_URLCONF for the "dev" handler
+urlpatterns = [
+    re_path(r'^media/(?P<path>.+)$', dev_media_serve, {'document_root': settings.MEDIA_ROOT}),
+    re_path(r'^static/(?P<path>.+)$', dev_static_serve, {'insecure': True}),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare serving a listing photo and a stylesheet through Django's development "
+        "handlers (django.views.static) with rentals_app/delivery.py, as a view behind the "
+        "middleware and as the WSGI front in rentals/wsgi.py: bytes sent and requests per "
+        "second for full, revalidated and ranged requests.  Runs in-process on one thread, "
+        "so it measures Django's share of the work; sendfile() and X-Accel-Redirect only "
+        "pay off behind a real server (see load_test)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photo', help="Media file to serve (default: the largest under MEDIA_ROOT).")
+        parser.add_argument('--repeat', type=int, default=500)
+        parser.add_argument('--output', help="Results file (default: a new file in BENCHMARK_RESULTS_DIR).")
+
+    def handlers(self):
+        """{name: (WSGI application, ROOT_URLCONF)}."""
+        return {
+            'dev': (WSGIHandler(), __name__),
+            'view': (WSGIHandler(), settings.ROOT_URLCONF),
+            'wsgi': (FileServingApplication(WSGIHandler()), settings.ROOT_URLCONF),
+        }
+
+    def scenarios(self, photo):
+        """{name: ({handler: path}, request headers)}; the dev handlers only know unhashed static names."""
+        media = f'/media/{photo}'
+        scenarios = {
+            'photo': ({'dev': media}, {}),
+            'photo_revalidate': ({'dev': media}, {'revalidate': True}),
+            'photo_range': ({'dev': media}, {'HTTP_RANGE': 'bytes=0-65535'}),
+        }
+        try:
+            collected = staticfiles_storage.stored_name(STYLESHEET)
+        except ValueError:
+            collected = STYLESHEET
+        if settings.STATIC_ROOT and (Path(settings.STATIC_ROOT) / collected).exists():
+            scenarios['stylesheet'] = (
+                {'dev': f'/static/{STYLESHEET}', 'view': f'/static/{collected}'},
+                {'HTTP_ACCEPT_ENCODING': ACCEPT_ENCODING},
+            )
+        else:
+            self.stderr.write(f"{STYLESHEET} is not in STATIC_ROOT; run collectstatic to include the stylesheet.")
+        return scenarios
+
+    def largest_photo(self):
+        root = Path(settings.MEDIA_ROOT)
+        photos = [path for path in root.rglob('*') if path.suffix.lower() in ('.jpg', '.jpeg', '.png', '.webp', '.avif')]
+        if not photos:
+            raise CommandError(f"No photos under {root}; pass --photo or run seed_data.")
+        return max(photos, key=lambda path: path.stat().st_size).relative_to(root).as_posix()
+
+    def call(self, app, path, headers):
+        environ = RequestFactory(SERVER_NAME='localhost').get(path, **headers).environ
+        environ['wsgi.file_wrapper'] = FileWrapper
+        response = {}
+
+        def start_response(status, response_headers):
+            response['status'] = int(status.split()[0])
+            response['headers'] = dict(response_headers)
+
+        result = app(environ, start_response)
+        try:
+            size = sum(len(chunk) for chunk in result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], size
+
+    def measure(self, app, path, headers, repeat):
+        headers = dict(headers)
+        if headers.pop('revalidate', False):
+            # What a browser sends once the photo is in its cache
+            _, first, _ = self.call(app, path, {})
+            headers['HTTP_IF_MODIFIED_SINCE'] = first.get('Last-Modified', '')
+            if 'ETag' in first:
+                headers['HTTP_IF_NONE_MATCH'] = first['ETag']
+
+        status, response_headers, size = self.call(app, path, headers)
+        timings = []
+        started = time.perf_counter()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            self.call(app, path, headers)
+            timings.append((time.perf_counter() - start) * 1000)
+        elapsed = time.perf_counter() - started
+        return {
+            **benchmarks.summarize(timings),
+            'rps': round(repeat / elapsed, 1),
+            'status': status,
+            'bytes': size,
+            'cache_control': response_headers.get('Cache-Control', ''),
+            'content_encoding': response_headers.get('Content-Encoding', ''),
+        }
+
+    def handle(self, *args, **options):
+        photo = options['photo'] or self.largest_photo()
+        scenarios = self.scenarios(photo)
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['localhost'], RATE_LIMIT_ENABLED=False, PERF_METRICS_ENABLED=False):
+            for handler, (app, urlconf) in self.handlers().items():
+                with override_settings(ROOT_URLCONF=urlconf):
+                    for scenario, (paths, headers) in scenarios.items():
+                        path = paths.get(handler, paths.get('view', paths['dev']))
+                        name = f'{scenario}_{handler}'
+                        results[name] = result = self.measure(app, path, headers, options['repeat'])
+                        self.stdout.write(
+                            f"{name:26} {result['status']}  {result['bytes']:8} bytes  "
+                            f"{result['rps']:8.1f} req/s  median {result['median_ms']:6.3f} ms  "
+                            f"{result['content_encoding'] or '-':5} {result['cache_control'] or '-'}"
+                        )
+        path = benchmarks.save('files', results, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {path}"))
@@ -0,0 +1,53 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from rentals_app.forms import PropertySearchForm
+from rentals_app.views import filter_properties, search_properties
+
+
+DEFAULT_QUERIES = ['legon', 'east legon', 'madina room', 'kumasi', 'osu', 'spintex', 'tema community', 'adenta']
+
+BACKENDS = {
+    'icontains': 'rentals_app.search.LikeSearchBackend',
+    'index': None,  # get_search_backend()'s default for the database
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the latency of a search's first listing page (filter_properties() plus the "
+        "paginator) between full-text search and the old icontains path on the current database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', default=DEFAULT_QUERIES)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def _time(self, queries, repeat):
+        timings = []
+        hits = 0
+        for query in queries:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                form = PropertySearchForm({'q': query})
+                page = search_properties(*filter_properties(form))
+                hits += len(page)
+                timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return {
+            'median_ms': statistics.median(timings),
+            'p95_ms': timings[int(len(timings) * 0.95) - 1],
+            'hits': hits // repeat,
+        }
+
+    def handle(self, *args, **options):
+        for name, backend in BACKENDS.items():
+            with override_settings(RENTALS_SEARCH_BACKEND=backend):
+                result = self._time(options['queries'], options['repeat'])
+            self.stdout.write(
+                f"{name:10} median {result['median_ms']:.2f} ms  p95 {result['p95_ms']:.2f} ms  "
+                f"first-page hits {result['hits']}"
+            )
@@ -0,0 +1,75 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import F
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from rentals_app import tracking
+from rentals_app.models import Property, PropertyStats
+
+
+BROWSER = 'Mozilla/5.0 (X11; Linux x86_64; rv:130.0) Gecko/20100101 Firefox/130.0'
+
+
+class Command(BaseCommand):
+    help = (
+        "Load property_detail from several threads with view tracking off, with a "
+        "naive per-hit UPDATE, and with the buffered tracker, and compare latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def _run(self, ids, total, threads, per_hit_update):
+        def worker(n):
+            client = Client(SERVER_NAME='localhost', HTTP_USER_AGENT=BROWSER)
+            timings = []
+            try:
+                for i in range(n):
+                    pk = ids[i % len(ids)]
+                    start = time.perf_counter()
+                    if per_hit_update:
+                        PropertyStats.objects.filter(property_id=pk).update(view_count=F('view_count') + 1)
+                    response = client.get(reverse('property_detail', args=[pk]))
+                    timings.append((time.perf_counter() - start) * 1000)
+                    if response.status_code != 200:
+                        raise CommandError(f"property_detail returned {response.status_code}")
+            finally:
+                connections.close_all()
+            return timings
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            timings = sorted(t for chunk in pool.map(worker, [total // threads] * threads) for t in chunk)
+        elapsed = time.perf_counter() - started
+        return {
+            'median_ms': statistics.median(timings),
+            'p95_ms': timings[int(len(timings) * 0.95) - 1],
+            'p99_ms': timings[int(len(timings) * 0.99) - 1],
+            'rps': len(timings) / elapsed,
+        }
+
+    def handle(self, *args, **options):
+        ids = list(Property.objects.values_list('pk', flat=True)[:200])
+        if not ids:
+            raise CommandError("No listings to request; seed the database first.")
+
+        modes = [
+            ('off', {'VIEW_TRACKING_ENABLED': False}, False),
+            ('per-hit UPDATE', {'VIEW_TRACKING_ENABLED': False}, True),
+            ('buffered', {'VIEW_TRACKING_ENABLED': True, 'VIEW_FLUSH_IN_BACKGROUND': True}, False),
+        ]
+        for name, overrides, per_hit_update in modes:
+            with override_settings(IMAGE_PIPELINE_ENABLED=False, **overrides):
+                result = self._run(ids, options['requests'], options['threads'], per_hit_update)
+            self.stdout.write(
+                f"{name:15} median {result['median_ms']:.2f} ms  p95 {result['p95_ms']:.2f} ms  "
+                f"p99 {result['p99_ms']:.2f} ms  {result['rps']:.0f} req/s"
+            )
+        tracking.flush()
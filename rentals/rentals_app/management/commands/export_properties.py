@@ -0,0 +1,53 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from rentals_app.models import Property
+
+
+# Same columns import_properties reads
+EXPORT_FIELDS = [
+    'id', 'title', 'location', 'price', 'property_type', 'description',
+    'is_available', 'contact_email', 'contact_phone', 'image',
+]
+
+
+class Command(BaseCommand):
+    help = "Stream listings to a CSV or JSONL file that import_properties can read back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-', help="File to write; '-' for stdout.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Default: from the file extension.")
+        parser.add_argument('--owner', help="Only this user's listings.")
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or ('jsonl' if output.endswith(('.jsonl', '.ndjson')) else 'csv')
+        properties = Property.objects.order_by('id')
+        if options['owner']:
+            properties = properties.filter(owner__username=options['owner'])
+
+        fh = sys.stdout if output == '-' else open(output, 'w', newline='', encoding='utf-8')
+        try:
+            count = self.write(fh, fmt, properties.values_list(*EXPORT_FIELDS).iterator(chunk_size=2000))
+        finally:
+            if fh is not sys.stdout:
+                fh.close()
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(f"Exported {count} listing(s) to {output}"))
+
+    def write(self, fh, fmt, rows):
+        count = 0
+        if fmt == 'csv':
+            writer = csv.writer(fh)
+            writer.writerow(EXPORT_FIELDS)
+            for count, row in enumerate(rows, 1):
+                writer.writerow(['' if value is None else value for value in row])
+        else:
+            for count, row in enumerate(rows, 1):
+                record = dict(zip(EXPORT_FIELDS, row))
+                record['price'] = str(record['price'])
+                fh.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return count
@@ -0,0 +1,170 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from rentals_app import alerts, analytics, geo, images, listing_cache
+from rentals_app.forms import PropertyForm
+from rentals_app.models import Property, PropertyStats, User
+from rentals_app.search import get_search_backend
+
+
+# Every PropertyForm field except the upload, which comes from --images-dir
+FORM_FIELDS = [name for name in PropertyForm._meta.fields if name != 'image']
+FALSE_VALUES = {'', '0', 'false', 'no', 'n', 'off'}
+
+
+def read_rows(path, fmt):
+    """Yield (line number, row dict) lazily, so memory stays flat for any file size."""
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        if fmt == 'csv':
+            reader = csv.DictReader(fh)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for number, line in enumerate(fh, 1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError as exc:
+                        yield number, exc
+
+
+def form_data(row):
+    data = {name: row[name] for name in FORM_FIELDS if row.get(name) is not None}
+    # A missing column means available, like the checkbox's default on the form
+    data['is_available'] = str(row.get('is_available', 'true')).strip().lower() not in FALSE_VALUES
+    return data
+
+
+class Command(BaseCommand):
+    help = (
+        "Import listings for one owner from a CSV or JSONL file.  Rows are validated with "
+        "PropertyForm and written in batches; rows with the id of one of the owner's "
+        "listings update it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--owner', required=True, help="Username the listings belong to.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Default: from the file extension.")
+        parser.add_argument('--images-dir', help="Directory the image column is relative to.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Validate only.")
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['owner']!r}.")
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        rows = read_rows(options['path'], fmt)
+        started = time.monotonic()
+        created = updated = failed = 0
+        while chunk := list(islice(rows, options['batch_size'])):
+            new, changed, errors = self.import_chunk(owner, chunk, options)
+            created, updated, failed = created + new, updated + changed, failed + len(errors)
+            for number, message in errors:
+                self.stderr.write(f"line {number}: {message}")
+            if options['verbosity'] > 1:
+                self.stdout.write(f"... {created + updated + failed} rows")
+
+        if (created or updated) and not options['dry_run']:
+            listing_cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Checked' if options['dry_run'] else 'Imported'} {created} new and {updated} updated listing(s), "
+            f"{failed} row(s) rejected, in {time.monotonic() - started:.1f}s"
+        ))
+
+    def import_chunk(self, owner, chunk, options):
+        errors, valid = [], []
+        for number, row in chunk:
+            if isinstance(row, Exception):
+                errors.append((number, f"invalid JSON: {row}"))
+                continue
+            form = PropertyForm(data=form_data(row))
+            if form.is_valid():
+                valid.append((number, row, form.cleaned_data))
+            else:
+                errors.append((number, '; '.join(f"{field}: {' '.join(msgs)}" for field, msgs in form.errors.items())))
+
+        stored = self.store_images(valid, options['images_dir'], options['dry_run'])
+        ids = {int(row['id']) for _, row, _ in valid if str(row.get('id') or '').isdigit()}
+        existing = Property.objects.filter(owner=owner, pk__in=ids).in_bulk()
+
+        to_create, to_update = [], []
+        for number, row, data in valid:
+            image = stored.get(number)
+            if isinstance(image, Exception):
+                errors.append((number, f"image: {image}"))
+                continue
+            pk = str(row.get('id') or '').strip()
+            if pk and (not pk.isdigit() or int(pk) not in existing):
+                errors.append((number, f"id: {pk} is not one of {owner.username}'s listings"))
+                continue
+            prop = existing.get(int(pk)) if pk else Property(owner=owner)
+            for name, value in data.items():
+                setattr(prop, name, value)
+            if image:
+                prop.image = image
+            prop.latitude, prop.longitude = geo.geocode(prop.location) or (None, None)
+            (to_update if prop.pk else to_create).append(prop)
+
+        if not options['dry_run']:
+            self.write(to_create, to_update)
+        return len(to_create), len(to_update), errors
+
+    def store_images(self, valid, images_dir, dry_run):
+        """{line number: storage name or error}, copied into media storage by the image worker pool."""
+        results, jobs = {}, {}
+        for number, row, _ in valid:
+            image = str(row.get('image') or '').strip()
+            if not image:
+                continue
+            if images_dir is None:
+                # e.g. a name written by export_properties
+                results[number] = image if default_storage.exists(image) else ValueError(f'"{image}" is not in media storage.')
+                continue
+            path = os.path.realpath(os.path.join(images_dir, image))
+            if not path.startswith(os.path.realpath(images_dir) + os.sep) or not os.path.isfile(path):
+                results[number] = ValueError(f'"{image}" is not a file in {images_dir}.')
+            elif not dry_run:
+                jobs[number] = images.get_executor().submit(images.store_original, path)
+        for number, job in jobs.items():
+            try:
+                results[number] = job.result()
+            except (ValueError, OSError) as exc:
+                results[number] = exc
+        return results
+
+    def write(self, to_create, to_update):
+        # bulk_create/bulk_update skip the post_save signals, so the search and
+        # geo indexes, stats rows, rent rollups, saved-search alerts and image
+        # variants are done here instead
+        with transaction.atomic():
+            Property.objects.bulk_create(to_create)
+            now = timezone.now()
+            for prop in to_update:
+                prop.updated_at = now
+            Property.objects.bulk_update(
+                to_update, FORM_FIELDS + ['image', 'latitude', 'longitude', 'updated_at'],
+            )
+            PropertyStats.objects.bulk_create([PropertyStats(property=prop) for prop in to_create], ignore_conflicts=True)
+            updated = {prop.pk: prop for prop in to_update}.values()
+            analytics.update(
+                removed=[prop._rollup_entry for prop in updated],
+                added=[analytics.entry(prop.__dict__) for prop in [*to_create, *updated]],
+            )
+            alerts.percolate([*to_create, *updated])
+            search, geo_index = get_search_backend(), geo.get_geo_index()
+            for prop in to_create + to_update:
+                search.index(prop)
+                geo_index.index(prop)
+                images.schedule(prop)
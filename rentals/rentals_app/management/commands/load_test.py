@@ -0,0 +1,181 @@
+import html
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rentals_app import benchmarks
+from rentals_app.management.commands.run_benchmarks import BROWSER, LIST_FILTERS
+
+
+LISTING_RE = re.compile(r'href="/property/(\d+)/"')
+# The only links on a list page that carry a cursor are "Next page"
+NEXT_PAGE_RE = re.compile(r'href="(\?[^"]*\bcursor=[^"]+)"')
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class VisitorSession:
+    """One simulated visitor: a cookie jar, the listings it has seen so far and its last list page."""
+
+    def __init__(self, host, rng, record):
+        self.host = host.rstrip('/')
+        self.rng = rng
+        self.record = record
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+        self.listings = []
+        self.next_page_link = None
+
+    def request(self, task, path, data=None):
+        request = Request(self.host + path, data=data, headers={'User-Agent': BROWSER})
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                status, body = response.status, response.read().decode('utf-8', 'replace')
+        except HTTPError as exc:
+            status, body = exc.code, ''
+        except (URLError, OSError):
+            status, body = 0, ''
+        self.record(task, (time.perf_counter() - start) * 1000, status)
+        return body
+
+    def remember(self, body):
+        self.listings = LISTING_RE.findall(body) or self.listings
+        link = NEXT_PAGE_RE.search(body)
+        self.next_page_link = html.unescape(link.group(1)) if link else None
+
+    # Tasks; each returns nothing and records its own timing
+
+    def browse(self):
+        params = LIST_FILTERS[self.rng.choice(list(LIST_FILTERS))]
+        self.remember(self.request('browse', f'/?{urlencode(params)}'))
+
+    def next_page(self):
+        if self.next_page_link is None:
+            return self.browse()
+        self.remember(self.request('next_page', f'/{self.next_page_link}'))
+
+    def facets(self):
+        self.request('facets', f"/facets/?property_type={self.rng.choice(['room', 'house'])}")
+
+    def view_listing(self):
+        if not self.listings:
+            return self.browse()
+        self.request('view_listing', f'/property/{self.rng.choice(self.listings)}/')
+
+    def save_favorite(self):
+        if not self.listings:
+            return self.browse()
+        self.request('save_favorite', f'/favorite/{self.rng.choice(self.listings)}/?next=/favorites/')
+
+    def favorites(self):
+        self.request('favorites', '/favorites/')
+
+    def send_inquiry(self):
+        if not self.listings:
+            return self.browse()
+        path = f'/property/{self.rng.choice(self.listings)}/'
+        token = CSRF_RE.search(self.request('view_listing', path))
+        if token:
+            data = urlencode({
+                'csrfmiddlewaretoken': token.group(1), 'sender_name': 'Load Test',
+                'sender_email': 'load@bench.example.com', 'content': 'Is this still available?',
+            }).encode()
+            self.request('send_inquiry', path, data)
+
+
+# task: weight, roughly the mix of a day's traffic
+TASKS = {
+    'browse': 30,
+    'next_page': 10,
+    'facets': 5,
+    'view_listing': 35,
+    'save_favorite': 8,
+    'favorites': 8,
+    'send_inquiry': 4,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a running server (runserver, gunicorn, uvicorn) with simulated visitors who "
+        "browse, filter, page, open listings, save favorites and send inquiries, and record "
+        "per-task latency, throughput and errors as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='http://127.0.0.1:8000')
+        parser.add_argument('--users', type=int, default=20, help="Concurrent visitors.")
+        parser.add_argument('--duration', type=float, default=60, help="Seconds to run.")
+        parser.add_argument('--ramp-up', type=float, default=5, help="Seconds over which visitors start.")
+        parser.add_argument('--think', type=float, default=1.0, help="Mean pause between a visitor's requests.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help="Results file (default: a new file in BENCHMARK_RESULTS_DIR).")
+
+    def handle(self, *args, **options):
+        lock = threading.Lock()
+        timings, statuses = defaultdict(list), defaultdict(lambda: defaultdict(int))
+
+        def record(task, elapsed_ms, status):
+            with lock:
+                timings[task].append(elapsed_ms)
+                statuses[task][status] += 1
+
+        try:
+            urlopen(options['host'], timeout=5).close()
+        except HTTPError:
+            pass  # up, just unhappy with "/"
+        except (URLError, OSError) as exc:
+            raise CommandError(f"{options['host']} is not reachable: {exc}")
+
+        started = time.monotonic()
+        deadline = started + options['ramp_up'] + options['duration']
+        tasks, weights = list(TASKS), list(TASKS.values())
+
+        def visitor(n):
+            rng = random.Random(options['seed'] * 10_000 + n)
+            time.sleep(options['ramp_up'] * n / max(1, options['users']))
+            session = VisitorSession(options['host'], rng, record)
+            while time.monotonic() < deadline:
+                getattr(session, rng.choices(tasks, weights)[0])()
+                if options['think']:
+                    time.sleep(rng.expovariate(1 / options['think']))
+
+        threads = [threading.Thread(target=visitor, args=(n,), daemon=True) for n in range(options['users'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        results = {}
+        for task in sorted(timings) + ['total']:
+            samples = timings[task] if task != 'total' else [t for values in timings.values() for t in values]
+            codes = defaultdict(int)
+            for name in ([task] if task != 'total' else list(statuses)):
+                for status, count in statuses[name].items():
+                    codes[status] += count
+            errors = sum(count for status, count in codes.items() if status == 0 or status >= 500)
+            results[task] = {
+                **benchmarks.summarize(samples),
+                'rps': round(len(samples) / elapsed, 2),
+                'error_rate': round(errors / max(1, len(samples)), 4),
+                # The inquiry rate limit applies to everyone here, since all
+                # visitors share one IP; 429s are reported, not counted as errors
+                'rate_limited': codes.get(429, 0),
+                'statuses': {str(status): count for status, count in sorted(codes.items())},
+            }
+            result = results[task]
+            self.stdout.write(
+                f"{task:14} {result['count']:6} req  {result['rps']:7.1f} req/s  "
+                f"median {result.get('median_ms', 0):7.1f} ms  p95 {result.get('p95_ms', 0):7.1f} ms  "
+                f"errors {result['error_rate']:.1%}  429s {result['rate_limited']}"
+            )
+        path = benchmarks.save('load', results, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {path}"))
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+
+from rentals_app import perf
+
+
+SORT_KEYS = {
+    'total': lambda stats: stats['duration']['sum'],
+    'mean': lambda stats: stats['duration']['sum'] / max(1, sum(stats['duration']['counts'])),
+    'queries': lambda stats: stats['queries']['sum'] / max(1, sum(stats['queries']['counts'])),
+}
+
+
+def bound(value):
+    return '>10' if value is None else f'<={value}'
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarise the request metrics collected by PerfMiddleware across all workers: "
+        "the slowest views and the most expensive queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--sort', choices=list(SORT_KEYS), default='total', help="How to rank views.")
+        parser.add_argument('--reset', action='store_true', help="Delete the collected metrics afterwards.")
+
+    def handle(self, *args, **options):
+        data = perf.collect()
+        if not data['views']:
+            self.stdout.write("No metrics collected; set RENTALS_PERF_METRICS=1 and send some traffic.")
+            return
+
+        limit = options['limit']
+        views = sorted(data['views'].items(), key=lambda item: SORT_KEYS[options['sort']](item[1]), reverse=True)
+        self.stdout.write(self.style.MIGRATE_HEADING("Views"))
+        self.stdout.write(
+            f"{'view':28} {'requests':>8} {'mean ms':>8} {'p95 s':>7} {'queries':>7} {'db ms':>7} "
+            f"{'tmpl ms':>7} {'KB':>7}"
+        )
+        for view, stats in views[:limit]:
+            count = max(1, sum(stats['duration']['counts']))
+            sized = max(1, sum(stats['size']['counts']))
+            self.stdout.write(
+                f"{view[:28]:28} {sum(stats['duration']['counts']):8} "
+                f"{stats['duration']['sum'] / count * 1000:8.1f} "
+                f"{bound(perf.quantile(stats['duration'], perf.TIME_BUCKETS, 0.95)):>7} "
+                f"{stats['queries']['sum'] / count:7.1f} {stats['db_time']['sum'] / count * 1000:7.1f} "
+                f"{stats['template_time']['sum'] / count * 1000:7.1f} {stats['size']['sum'] / sized / 1024:7.1f}"
+            )
+
+        queries = sorted(data['queries'].items(), key=lambda item: item[1]['total'], reverse=True)
+        self.stdout.write(self.style.MIGRATE_HEADING("\nQueries by total time"))
+        for sql, entry in queries[:limit]:
+            self.stdout.write(
+                f"{entry['total'] * 1000:9.1f} ms total  {entry['count']:6}x  "
+                f"worst {entry['max'] * 1000:.1f} ms in {entry['view']}\n    {sql[:300]}"
+            )
+
+        if options['reset']:
+            perf.reset()
+            self.stdout.write(self.style.SUCCESS("Metrics reset"))
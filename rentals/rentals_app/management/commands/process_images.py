@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from rentals_app import images
+from rentals_app.models import Property, PropertyImage
+
+
+class Command(BaseCommand):
+    help = "Generate missing responsive image variants (backfill or recover lost pipeline jobs)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Re-process images that already have variants.")
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        for model in (Property, PropertyImage):
+            queryset = model.objects.exclude(image='').exclude(image__isnull=True).only('pk', 'image', 'variants')
+            if model is PropertyImage:
+                queryset = queryset.only('pk', 'image', 'variants', 'property_id')
+            for instance in queryset.iterator():
+                if not options['force'] and not images.needs_processing(instance):
+                    continue
+                try:
+                    images.process_now(instance)
+                    done += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} {instance.pk}: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Processed {done} image(s), {failed} failed"))
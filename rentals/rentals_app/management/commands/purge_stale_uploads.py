@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from rentals_app.uploads import purge_stale
+
+
+class Command(BaseCommand):
+    help = "Delete chunked uploads that were never committed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=settings.UPLOAD_STALE_AFTER, help="Age in seconds.")
+
+    def handle(self, *args, **options):
+        removed = purge_stale(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} stale upload(s)"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from rentals_app.favorites import purge_orphaned
+
+
+class Command(BaseCommand):
+    help = "Delete favorites saved by anonymous visitors whose session has expired (run after clearsessions)."
+
+    def handle(self, *args, **options):
+        deleted = purge_orphaned()
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} orphaned favorite(s)"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from rentals_app import counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the unread message and favorite counters shown on the owner dashboard."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help="Property ids (default: all).")
+
+    def handle(self, *args, **options):
+        counters.recount(options['ids'] or None)
+        self.stdout.write(self.style.SUCCESS("Property stats recounted"))
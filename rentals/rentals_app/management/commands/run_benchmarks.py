@@ -0,0 +1,190 @@
+import json
+import re
+import time
+import tracemalloc
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from rentals_app import benchmarks, listing_cache, perf, tracking
+from rentals_app.models import Property, User
+from rentals_app.management.commands.seed_data import PREFIX
+
+
+BROWSER = 'Mozilla/5.0 (X11; Linux x86_64; rv:130.0) Gecko/20100101 Firefox/130.0'
+CURSOR_RE = re.compile(r'[?;]cursor=([^"&]+)')
+
+# property_list filter combinations worth tracking, by scenario name
+LIST_FILTERS = {
+    'list_newest': {},
+    'list_price_asc': {'sort': 'price'},
+    'list_price_desc': {'sort': '-price'},
+    'list_type': {'property_type': 'room'},
+    'list_price_range': {'min_price': 500, 'max_price': 1500},
+    'list_type_price_sorted': {'property_type': 'house', 'max_price': 4000, 'sort': '-price'},
+    'list_location': {'location': 'Madina'},
+    'list_search': {'q': 'furnished room'},
+    'list_search_type': {'q': 'legon', 'property_type': 'room'},
+    'list_near': {'near': 'Osu', 'radius_km': 3},
+    'list_near_by_distance': {'near': 'East Legon', 'sort': 'distance', 'max_price': 1000},
+}
+ADMIN_CHANGELISTS = ['property', 'message', 'favorite', 'user']
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the main pages in-process against the current database (see seed_data) and "
+        "record latency, query count, peak memory and response size per scenario as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help="Only scenarios whose name starts with one of these.")
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--warm', action='store_true', help="Keep the listing cache between requests.")
+        parser.add_argument('--output', help="Results file (default: a new file in BENCHMARK_RESULTS_DIR).")
+        parser.add_argument('--compare', help="Earlier results file to check for regressions.")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def scenarios(self):
+        """{name: (client, url)} for the seeded database."""
+        anonymous = Client(SERVER_NAME='localhost', HTTP_USER_AGENT=BROWSER)
+        scenarios = {
+            name: (anonymous, f"{reverse('property_list')}?{urlencode(params)}")
+            for name, params in LIST_FILTERS.items()
+        }
+        first_page = anonymous.get(reverse('property_list')).content.decode()
+        cursor = CURSOR_RE.search(first_page)
+        if cursor:
+            scenarios['list_second_page'] = (anonymous, f"{reverse('property_list')}?cursor={cursor.group(1)}")
+        scenarios['facets'] = (anonymous, f"{reverse('property_facets')}?property_type=room")
+
+        popular = (
+            Property.objects.available().annotate(images_count=Count('images'))
+            .order_by('-images_count').values_list('pk', flat=True).first()
+        )
+        scenarios['property_detail'] = (anonymous, reverse('property_detail', args=[popular]))
+
+        tenant = User.objects.filter(favorites__isnull=False).annotate(saved=Count('favorites')).order_by('-saved').first()
+        owner = User.objects.filter(role='owner').annotate(listings=Count('properties')).order_by('-listings').first()
+        admin = User.objects.filter(is_superuser=True).first()
+        for name, user, url in [
+            ('favorite_list', tenant, reverse('favorite_list')),
+            ('owner_dashboard', owner, reverse('owner_dashboard')),
+            ('owner_inbox', owner, reverse('owner_inbox')),
+        ] + [
+            (f'admin_{model}', admin, reverse(f'admin:rentals_app_{model}_changelist'))
+            for model in ADMIN_CHANGELISTS
+        ] + [
+            ('admin_property_search', admin, reverse('admin:rentals_app_property_changelist') + '?q=legon'),
+            ('admin_property_location', admin, reverse('admin:rentals_app_property_changelist') + '?location=Madina%2C+Ghana'),
+            ('admin_message_unread', admin, reverse('admin:rentals_app_message_changelist') + '?is_read__exact=0'),
+            ('admin_property_change', admin, reverse('admin:rentals_app_property_change', args=[popular])),
+        ]:
+            if user is None:
+                continue
+            client = Client(SERVER_NAME='localhost', HTTP_USER_AGENT=BROWSER)
+            client.force_login(user)
+            scenarios[name] = (client, url)
+        return scenarios
+
+    def measure(self, client, url, repeat, warm):
+        def get():
+            if not warm:
+                listing_cache.clear()
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}")
+            return response
+
+        get()  # warm up imports, templates and the SQLite page cache
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            get()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = perf.Record()
+        with connection.execute_wrapper(queries):
+            response = get()
+        tracemalloc.start()
+        try:
+            get()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {
+            **benchmarks.summarize(timings),
+            'queries': queries.queries,
+            'peak_kb': round(peak / 1024, 1),
+            'response_kb': round(len(response.content) / 1024, 1),
+        }
+
+    def measure_cards(self, count, repeat, warm):
+        """Render time for ``count`` listing cards, from scratch or from the card cache."""
+        properties = list(Property.objects.for_listing().order_by('-id')[:count])
+
+        def render():
+            if not warm:
+                listing_cache.clear()
+            return listing_cache.get_cards(properties)
+
+        render()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - start) * 1000)
+        tracemalloc.start()
+        try:
+            cards = render()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {
+            **benchmarks.summarize(timings),
+            'queries': 0,
+            'peak_kb': round(peak / 1024, 1),
+            'response_kb': round(sum(len(html) for pk, html in cards) / 1024, 1),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:24} median {result['median_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+            f"{result['queries']:3} queries  peak {result['peak_kb']:8.1f} KB"
+        )
+
+    def handle(self, *args, **options):
+        if not Property.objects.exists():
+            raise CommandError("No listings; run `manage.py seed_data` first.")
+        if not User.objects.filter(username__startswith=PREFIX).exists():
+            self.stderr.write("No seed users found; logged-in scenarios use whatever users exist.")
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['localhost'], RATE_LIMIT_ENABLED=False, IMAGE_PIPELINE_ENABLED=False):
+            for name, (client, url) in self.scenarios().items():
+                if options['scenarios'] and not name.startswith(tuple(options['scenarios'])):
+                    continue
+                results[name] = result = self.measure(client, url, options['repeat'], options['warm'])
+                self.report(name, result)
+            for name, warm in [('cards_100_cold', False), ('cards_100_warm', True)]:
+                if options['scenarios'] and not name.startswith(tuple(options['scenarios'])):
+                    continue
+                results[name] = result = self.measure_cards(100, options['repeat'], warm)
+                self.report(name, result)
+        tracking.flush()
+
+        path = benchmarks.save('micro', results, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {path}"))
+        if options['compare']:
+            with open(options['compare']) as fh:
+                regressions = benchmarks.compare(json.load(fh), {'results': results})
+            for scenario, metric, old, new in regressions:
+                self.stdout.write(self.style.WARNING(f"{scenario}: {metric} {old} -> {new}"))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
+            elif options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['compare']}")
@@ -0,0 +1,236 @@
+import io
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from rentals_app import analytics, counters, listing_cache
+from rentals_app.geo import gazetteer, get_geo_index
+from rentals_app.models import Favorite, Message, Property, PropertyImage, PropertyStats, PropertyViewBucket, User
+from rentals_app.search import get_search_backend
+
+
+PREFIX = 'bench-'
+PASSWORD = 'bench'
+# Monthly rent (GHS): median and spread of a log-normal per type
+PRICES = {'room': (650, 0.5), 'house': (3200, 0.6)}
+ADJECTIVES = ['Spacious', 'Cosy', 'Newly built', 'Furnished', 'Quiet', 'Modern', 'Affordable', 'Self-contained']
+NOUNS = {'room': ['room', 'single room', 'chamber and hall', 'studio'], 'house': ['house', '2 bedroom house', '3 bedroom house', 'townhouse']}
+FEATURES = [
+    'Water flows every day.', 'Prepaid meter.', 'Walled and gated.', 'Close to the main road.',
+    'Tiled floors.', 'Quiet neighbourhood.', 'Parking for two cars.', 'Two years advance.',
+    'Kitchen cabinets fitted.', 'Borehole on site.', 'Security man at night.', 'Near the market.',
+]
+IMAGE_COLOURS = ['#c9b79c', '#8fa3b8', '#b5c99a', '#e0c3a8', '#a3a3a3', '#d9a5a5', '#9cc5c9', '#c2b280']
+
+
+def zipf_weights(n, s=1.0):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic owners, listings, images, inquiries and favorites "
+        "for benchmarking.  Listings per owner, inquiries and favorites per listing are "
+        "long-tailed, and the busy Accra neighbourhoods get most listings, as on the live site."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owners', type=int, default=500)
+        parser.add_argument('--properties', type=int, default=20_000)
+        parser.add_argument('--messages', type=int, default=40_000)
+        parser.add_argument('--favorites', type=int, default=30_000)
+        parser.add_argument('--tenants', type=int, default=2_000, help="Signed-in users who save favorites.")
+        parser.add_argument('--images', type=float, default=2.0, help="Mean gallery images per listing.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--clear', action='store_true', help="Delete earlier seed data first.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+        if options['clear']:
+            self.stdout.write(f"Deleted {self.clear()} rows of earlier seed data")
+
+        owners = self.create_users('owner', options['owners'], role='owner')
+        tenants = self.create_users('tenant', options['tenants'], role='')
+        self.create_users('admin', 1, role='', is_staff=True, is_superuser=True)
+        properties = self.create_properties(owners, options['properties'])
+        self.create_images(properties, options['images'])
+        self.create_messages(properties, options['messages'])
+        self.create_favorites(properties, tenants, options['favorites'])
+
+        # bulk_create skips signals: rebuild what they would have maintained
+        get_search_backend().rebuild()
+        get_geo_index().rebuild()
+        counters.recount()
+        analytics.rebuild()
+        listing_cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(owners)} owners, {len(properties)} listings, {options['messages']} inquiries and "
+            f"{options['favorites']} favorites in {time.monotonic() - started:.1f}s; "
+            f"users are {PREFIX}owner-N, {PREFIX}tenant-N and {PREFIX}admin-0 with password {PASSWORD!r}"
+        ))
+
+    def clear(self):
+        # A cascading delete would fire the per-row counter and index signals
+        # for every favorite and inquiry; the seed listings' rows go with them
+        # and the indexes are rebuilt afterwards, so delete table by table
+        properties = Property.objects.filter(owner__username__startswith=PREFIX)
+        deleted = 0
+        with transaction.atomic():
+            for model in (Favorite, Message, PropertyImage, PropertyViewBucket, PropertyStats):
+                deleted += model.objects.filter(property__in=properties)._raw_delete(model.objects.db)
+            deleted += properties._raw_delete(properties.db)
+            deleted += User.objects.filter(username__startswith=PREFIX).delete()[0]
+        return deleted
+
+    def bulk(self, model, objects, timestamps=()):
+        """bulk_create, then put back the back-dated timestamps auto_now(_add) overwrote."""
+        quote = connection.ops.quote_name
+        columns = [model._meta.get_field(name).column for name in timestamps]
+        update = (
+            f'UPDATE {quote(model._meta.db_table)} SET {", ".join(f"{quote(c)} = %s" for c in columns)} '
+            f'WHERE {quote(model._meta.pk.column)} = %s'
+        )
+        created = []
+        for start in range(0, len(objects), self.batch_size):
+            batch = objects[start:start + self.batch_size]
+            wanted = [[getattr(obj, name) for name in timestamps] for obj in batch]
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+                if timestamps:
+                    # executemany of a plain UPDATE; bulk_update's CASE per row is far slower
+                    with connection.cursor() as cursor:
+                        cursor.executemany(update, [
+                            [connection.ops.adapt_datetimefield_value(value) for value in values] + [obj.pk]
+                            for obj, values in zip(batch, wanted)
+                        ])
+                    for obj, values in zip(batch, wanted):
+                        for name, value in zip(timestamps, values):
+                            setattr(obj, name, value)
+            created += batch
+        return created
+
+    def ago(self, max_days):
+        # Recent rows are more common than old ones
+        return timezone.now() - timedelta(days=max_days * self.rng.random() ** 2, seconds=self.rng.randrange(86400))
+
+    def create_users(self, kind, count, **fields):
+        password = make_password(PASSWORD)  # hashing once keeps seeding fast
+        start = User.objects.filter(username__startswith=f'{PREFIX}{kind}-').count()
+        users = [
+            User(
+                username=f'{PREFIX}{kind}-{n}', email=f'{kind}{n}@bench.example.com',
+                password=password, **fields,
+            )
+            for n in range(start, start + count)
+        ]
+        return self.bulk(User, users)
+
+    def create_properties(self, owners, count):
+        coordinates = {name: (lat, lng) for name, lat, lng in gazetteer().values()}
+        places = list(coordinates)
+        # The gazetteer lists the busiest areas first
+        place_weights = zipf_weights(len(places), 0.9)
+        owner_weights = zipf_weights(len(owners), 1.1)
+        properties = []
+        for owner, place in zip(
+            self.rng.choices(owners, owner_weights, k=count),
+            self.rng.choices(places, place_weights, k=count),
+        ):
+            kind = self.rng.choices(['room', 'house'], [0.65, 0.35])[0]
+            median, sigma = PRICES[kind]
+            created_at = self.ago(365)
+            lat, lng = coordinates[place]
+            properties.append(Property(
+                owner=owner,
+                title=f'{self.rng.choice(ADJECTIVES)} {self.rng.choice(NOUNS[kind])} in {place}',
+                location=f'{place}, Ghana',
+                price=Decimal(round(self.rng.lognormvariate(0, sigma) * median, -1) or 50),
+                property_type=kind,
+                description=' '.join(self.rng.sample(FEATURES, self.rng.randint(2, 6))),
+                is_available=self.rng.random() < 0.85,
+                contact_email=owner.email,
+                contact_phone=f'024{self.rng.randrange(10 ** 7):07d}',
+                # a little jitter so "near" searches see distinct points
+                latitude=lat + self.rng.uniform(-0.01, 0.01),
+                longitude=lng + self.rng.uniform(-0.01, 0.01),
+                created_at=created_at,
+                updated_at=created_at,
+            ))
+        return self.bulk(Property, properties, timestamps=('created_at', 'updated_at'))
+
+    def placeholder_images(self):
+        names = []
+        for colour in IMAGE_COLOURS:
+            buffer = io.BytesIO()
+            Image.new('RGB', (800, 600), colour).save(buffer, 'JPEG', quality=80)
+            name = f'property_images/{PREFIX}{colour.lstrip("#")}.jpg'
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            names.append(name)
+        return names
+
+    def create_images(self, properties, mean):
+        names = self.placeholder_images()
+        images = []
+        for prop in properties:
+            # Geometric: many listings have one or two photos, a few have lots
+            count = 0
+            while self.rng.random() < mean / (mean + 1):
+                count += 1
+            if count:
+                prop.image = names[prop.pk % len(names)]
+            images += [PropertyImage(property=prop, image=self.rng.choice(names)) for _ in range(count)]
+        self.bulk(PropertyImage, images)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {Property._meta.db_table} SET image = %s WHERE id = %s',
+                [(prop.image.name, prop.pk) for prop in properties if prop.image],
+            )
+
+    def create_messages(self, properties, count):
+        # A few popular listings get most of the inquiries, from a pool of
+        # repeat senders so the inbox has real threads
+        weights = zipf_weights(len(properties), 0.8)
+        self.rng.shuffle(weights)
+        senders = [(f'Tenant {n}', f'sender{n}@bench.example.com') for n in range(max(1, count // 4))]
+        messages = []
+        for prop in self.rng.choices(properties, weights, k=count):
+            name, email = self.rng.choice(senders)
+            sent_at = self.ago(180)
+            messages.append(Message(
+                property=prop, sender_name=name, sender_email=email,
+                content=f'Hello, is the {prop.get_property_type_display().lower()} still available?',
+                sent_at=sent_at,
+                is_read=sent_at < timezone.now() - timedelta(days=3) or self.rng.random() < 0.3,
+                notified=True,  # don't have the outbox worker email seed owners
+            ))
+        self.bulk(Message, messages, timestamps=('sent_at',))
+
+    def create_favorites(self, properties, tenants, count):
+        available = [prop for prop in properties if prop.is_available] or properties
+        weights = zipf_weights(len(available), 0.8)
+        self.rng.shuffle(weights)
+        savers = [('tenant', tenant) for tenant in tenants] + [
+            ('visitor', f'{PREFIX}{n:026x}') for n in range(max(1, len(tenants)))
+        ]
+        seen, favorites = set(), []
+        for prop in self.rng.choices(available, weights, k=count):
+            kind, who = self.rng.choice(savers)
+            key = (kind, getattr(who, 'pk', who), prop.pk)
+            if key in seen:
+                continue
+            seen.add(key)
+            favorites.append(Favorite(property=prop, saved_at=self.ago(90), **{kind: who}))
+        self.bulk(Favorite, favorites, timestamps=('saved_at',))
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from rentals_app.notifications import deliver_due, enqueue_new_messages, enqueue_search_alerts
+
+
+class Command(BaseCommand):
+    help = (
+        "Email owners about new inquiries and visitors about listings matching their saved "
+        "searches: queue them in the outbox and send it in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain what is due, then exit.")
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when idle.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            close_old_connections()
+            queued = enqueue_new_messages(batch_size)
+            matched = enqueue_search_alerts(batch_size)
+            sent, failed = deliver_due(batch_size)
+            if queued or matched or sent or failed:
+                self.stdout.write(
+                    f"queued {queued} inquiries and {matched} search matches, sent {sent} emails, {failed} to retry"
+                )
+            if options['once'] and not queued and not matched and not sent:
+                return
+            if not queued and not matched and not sent:
+                time.sleep(options['interval'])
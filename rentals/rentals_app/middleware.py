@@ -0,0 +1,137 @@
+import re
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from .ratelimit import STORES, parse_rate, retry_after
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+
+# -------------------------------
+# API response compression
+# -------------------------------
+# Only /api/ responses are compressed.  HTML pages embed CSRF tokens, and
+# compressing secrets next to attacker-controlled input invites BREACH.
+
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+ACCEPTS_BR = re.compile(r'\bbr\b')
+MIN_LENGTH = 200
+
+
+@sync_and_async_middleware
+class APICompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if (
+            not request.path.startswith('/api/')
+            or response.streaming
+            or response.has_header('Content-Encoding')
+            or len(response.content) < MIN_LENGTH
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept = request.headers.get('Accept-Encoding', '')
+        if brotli is not None and ACCEPTS_BR.search(accept):
+            encoding, compressed = 'br', brotli.compress(response.content, quality=5)
+        elif ACCEPTS_GZIP.search(accept):
+            encoding, compressed = 'gzip', compress_string(response.content)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # A different byte stream needs a different strong validator
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'{etag[:-1]}-{encoding}"'
+        return response
+
+
+# -------------------------------
+# Write-rate limiting
+# -------------------------------
+# Limits are declared per URL name in rentals_app/urls.py (RATE_LIMITS) and
+# checked in process_view, after URL resolution but before the view runs.
+# Nothing here loads the session or the user, so a rejected request costs a
+# bucket lookup and never reaches the ORM.
+
+@lru_cache(maxsize=1)
+def rate_limits():
+    from .urls import RATE_LIMITS
+
+    return {
+        name: {
+            'per_second': parse_rate(rule['rate']),
+            'burst': rule.get('burst', 1),
+            'methods': set(rule.get('methods', ['GET', 'POST'])),
+            'key': rule.get('key', 'ip'),
+        }
+        for name, rule in RATE_LIMITS.items()
+    }
+
+
+def client_key(request, key):
+    if key == 'session':
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if session_key:
+            return f'session:{session_key}'
+    ip = request.META.get('REMOTE_ADDR', '')
+    if settings.RATE_LIMIT_TRUST_X_FORWARDED_FOR:
+        ip = request.headers.get('X-Forwarded-For', ip).split(',')[0].strip()
+    return f'ip:{ip}'
+
+
+@sync_and_async_middleware
+class RateLimitMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.store = STORES[settings.RATE_LIMIT_STORE](path=settings.RATE_LIMIT_SHARED_PATH)
+
+    def __call__(self, request):
+        # Under ASGI this hands back the inner coroutine for the caller to await
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if not settings.RATE_LIMIT_ENABLED or match is None:
+            return None
+        rule = rate_limits().get(match.url_name)
+        if rule is None or request.method not in rule['methods']:
+            return None
+
+        wait = self.store.consume(
+            f'{match.url_name}:{client_key(request, rule["key"])}', rule['per_second'], rule['burst'],
+        )
+        if not wait:
+            return None
+        response = HttpResponse('Too many requests, please slow down.', status=429, content_type='text/plain')
+        response['Retry-After'] = str(retry_after(wait))
+        return response
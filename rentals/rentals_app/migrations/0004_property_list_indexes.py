@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_app', '0003_property_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['is_available', '-created_at', '-id'], name='property_avail_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['is_available', 'property_type', '-created_at', '-id'], name='property_avail_type_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['is_available', 'price', 'id'], name='property_avail_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['is_available', 'property_type', 'price', 'id'], name='property_avail_type_price_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Full-text index over Property title/location/description (SQLite FTS5).
+# On other databases this is a no-op and search falls back to the
+# configured RENTALS_SEARCH_BACKEND.
+
+from django.db import migrations
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS rentals_app_property_fts "
+        "USING fts5(title, location, description, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS rentals_app_property_fts_vocab "
+        "USING fts5vocab(rentals_app_property_fts, 'row')"
+    )
+    schema_editor.execute(
+        "INSERT INTO rentals_app_property_fts (rowid, title, location, description) "
+        "SELECT id, title, location, description FROM rentals_app_property"
+    )
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS rentals_app_property_fts_vocab")
+    schema_editor.execute("DROP TABLE IF EXISTS rentals_app_property_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_app', '0004_property_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
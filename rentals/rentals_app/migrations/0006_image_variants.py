@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 09:28
+
+import rentals_app.images
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_app', '0005_property_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='propertyimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='property',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to=rentals_app.images.hashed_upload_to),
+        ),
+        migrations.AlterField(
+            model_name='propertyimage',
+            name='image',
+            field=models.ImageField(upload_to=rentals_app.images.hashed_upload_to),
+        ),
+    ]
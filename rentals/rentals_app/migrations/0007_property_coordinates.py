@@ -0,0 +1,60 @@
+# Generated by Django 6.0 on 2026-10-18 09:34
+
+from django.db import migrations, models
+
+from rentals_app.geo import geocode
+
+
+def geocode_existing(apps, schema_editor):
+    Property = apps.get_model('rentals_app', 'Property')
+    db = schema_editor.connection.alias
+    for prop in Property.objects.using(db).only('id', 'location').iterator():
+        point = geocode(prop.location)
+        if point:
+            Property.objects.using(db).filter(pk=prop.pk).update(latitude=point[0], longitude=point[1])
+
+
+def create_rtree(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS rentals_app_property_rtree "
+        "USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+    )
+    schema_editor.execute(
+        "INSERT INTO rentals_app_property_rtree (id, min_lat, max_lat, min_lng, max_lng) "
+        "SELECT id, latitude, latitude, longitude, longitude FROM rentals_app_property "
+        "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    )
+
+
+def drop_rtree(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS rentals_app_property_rtree")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_app', '0006_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='property',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['latitude', 'longitude'], name='property_lat_lng_idx'),
+        ),
+        migrations.RunPython(geocode_existing, migrations.RunPython.noop),
+        migrations.RunPython(create_rtree, drop_rtree),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-18 09:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_app', '0007_property_coordinates'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='favorite',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='visitor',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='tenant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['tenant', '-saved_at', '-id'], name='favorite_tenant_saved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['visitor', '-saved_at', '-id'], name='favorite_visitor_saved_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(condition=models.Q(('tenant__isnull', False)), fields=('tenant', 'property'), name='favorite_unique_tenant'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(condition=models.Q(('visitor__isnull', False)), fields=('visitor', 'property'), name='favorite_unique_visitor'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('tenant__isnull', False), ('visitor__isnull', True)), models.Q(('tenant__isnull', True), ('visitor__isnull', False)), _connector='OR'), name='favorite_tenant_xor_visitor'),
+        ),
+    ]
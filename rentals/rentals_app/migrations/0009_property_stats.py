@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 09:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_stats(apps, schema_editor):
+    Property = apps.get_model('rentals_app', 'Property')
+    PropertyStats = apps.get_model('rentals_app', 'PropertyStats')
+    db = schema_editor.connection.alias
+    rows = Property.objects.using(db).annotate(
+        unread=Count('messages', filter=Q(messages__is_read=False), distinct=True),
+        favorites=Count('favorited_by', distinct=True),
+    ).values_list('pk', 'unread', 'favorites')
+    PropertyStats.objects.using(db).bulk_create(
+        [PropertyStats(property_id=pk, unread_messages=unread, favorite_count=favorites) for pk, unread, favorites in rows],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_app', '0008_favorite_visitors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyStats',
+            fields=[
+                ('property', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='rentals_app.property')),
+                ('view_count', models.PositiveIntegerField(default=0)),
+                ('unread_messages', models.PositiveIntegerField(default=0)),
+                ('favorite_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 09:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_app', '0009_property_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='rentals_app.property')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('property', 'hour'), name='view_bucket_property_hour')],
+            },
+        ),
+    ]
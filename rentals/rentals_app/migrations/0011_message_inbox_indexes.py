@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 09:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_app', '0010_property_view_buckets'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='property',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='rentals_app.property'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['property', 'is_read', '-sent_at', '-id'], name='message_prop_read_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender_email', '-sent_at', '-id'], name='message_sender_sent_idx'),
+        ),
+    ]
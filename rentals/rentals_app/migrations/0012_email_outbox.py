@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 09:47
+
+from django.db import migrations, models
+
+
+def skip_existing_messages(apps, schema_editor):
+    # Don't email owners about inquiries they received before notifications existed
+    Message = apps.get_model('rentals_app', 'Message')
+    Message.objects.using(schema_editor.connection.alias).update(notified=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_app', '0011_message_inbox_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('next_attempt_at', models.DateTimeField()),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('failed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='notified',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(skip_existing_messages, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('notified', False)), fields=['id'], name='message_unnotified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxemail',
+            index=models.Index(condition=models.Q(('failed_at__isnull', True), ('sent_at__isnull', True)), fields=['next_attempt_at'], name='outbox_due_idx'),
+        ),
+    ]
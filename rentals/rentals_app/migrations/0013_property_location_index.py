@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_app', '0012_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['location', '-id'], name='property_location_idx'),
+        ),
+    ]
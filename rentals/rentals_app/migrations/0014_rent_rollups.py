@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 10:39
+
+from django.db import migrations, models
+
+from rentals_app.analytics import entry, _rollups_python
+
+
+def backfill_rollups(apps, schema_editor):
+    Property = apps.get_model('rentals_app', 'Property')
+    RentRollup = apps.get_model('rentals_app', 'RentRollup')
+    db = schema_editor.connection.alias
+    rows = (
+        entry(dict(zip(('location', 'property_type', 'created_at', 'price'), values)))
+        for values in Property.objects.using(db).values_list('location', 'property_type', 'created_at', 'price').iterator()
+    )
+    RentRollup.objects.using(db).bulk_create(
+        [
+            RentRollup(location=location, property_type=kind, month=month, listings=n, total_rent=total, sketch=sketch)
+            for (location, kind, month), (n, total, sketch) in _rollups_python(rows).items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_app', '0013_property_location_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(blank=True, max_length=255)),
+                ('property_type', models.CharField(blank=True, max_length=10)),
+                ('month', models.DateField()),
+                ('listings', models.PositiveIntegerField(default=0)),
+                ('total_rent', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('sketch', models.JSONField(default=dict)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('location', 'property_type', 'month'), name='rent_rollup_key')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_app', '0015_saved_searches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedsearch',
+            name='confirmed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
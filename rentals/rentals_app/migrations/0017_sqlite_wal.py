@@ -0,0 +1,28 @@
+# Switch SQLite databases to write-ahead logging.  journal_mode=WAL is stored
+# in the database file, so it is set once here rather than by every
+# connection (settings.SQLITE_PRAGMAS); `migrate` is the deploy step.  On
+# other databases this is a no-op.
+
+from django.db import migrations
+
+
+def journal_mode(mode):
+    def set_mode(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        # Can't be changed inside a transaction, hence atomic = False below
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode={mode}')
+    return set_mode
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('rentals_app', '0016_saved_search_confirmed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(journal_mode('WAL'), journal_mode('DELETE')),
+    ]
@@ -1,6 +1,13 @@
+from decimal import Decimal
+
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
+from .analytics import entry as rollup_entry
+from .images import hashed_upload_to
+from .listing_cache import TRACKED_FIELDS as LISTING_CACHE_FIELDS
+
 # Custom User Model
 
 
@@ -20,6 +27,26 @@ class User(AbstractUser):
 
 # Property Listings
 
+class PropertyQuerySet(models.QuerySet):
+    def available(self):
+        return self.filter(is_available=True)
+
+    def for_listing(self):
+        # Cards never show the description, so don't drag it out of the table
+        return self.select_related('owner').defer('description')
+
+    def for_detail(self):
+        return self.select_related('owner').prefetch_related('images')
+
+    def touch(self):
+        """
+        Bump updated_at without post_save, for changes saved around the
+        Property (its images, image variants): the card version and the API
+        ETags follow updated_at.
+        """
+        return self.update(updated_at=timezone.now())
+
+
 class Property(models.Model):
     PROPERTY_TYPE_CHOICES = (
         ('room', 'Room'),
@@ -37,8 +64,39 @@ class Property(models.Model):
     contact_phone = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    image = models.ImageField(upload_to='property_images/', null=True, blank=True)  # <-- new field
+    image = models.ImageField(upload_to=hashed_upload_to, null=True, blank=True)  # <-- new field
+    variants = models.JSONField(default=dict, blank=True, editable=False)  # filled in by images.py
+    # Geocoded from `location` against the bundled gazetteer (see geo.py)
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
 
+    objects = PropertyQuerySet.as_manager()
+
+    class Meta:
+        # Composite indexes matching the PropertySearchForm filters and the
+        # keyset orderings used by property_list (see pagination.py).
+        indexes = [
+            models.Index(fields=['is_available', '-created_at', '-id'], name='property_avail_newest_idx'),
+            models.Index(fields=['is_available', 'property_type', '-created_at', '-id'], name='property_avail_type_newest_idx'),
+            models.Index(fields=['is_available', 'price', 'id'], name='property_avail_price_idx'),
+            models.Index(fields=['is_available', 'property_type', 'price', 'id'], name='property_avail_type_price_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='property_lat_lng_idx'),
+            # Admin location filter and its cached choices
+            models.Index(fields=['location', '-id'], name='property_location_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the search filters saw, for listing cache invalidation
+        instance._loaded_state = {
+            name: instance.__dict__[name] for name in LISTING_CACHE_FIELDS if name in instance.__dict__
+        }
+        if any(instance._loaded_state.get(name) is None for name in ('is_available', 'property_type', 'price')):
+            instance._loaded_state = None
+        # ... and what the rent rollups counted it as
+        instance._rollup_entry = rollup_entry(instance.__dict__)
+        return instance
 
     def __str__(self):
         return f"{self.title} - {self.location} (${self.price})"
@@ -49,7 +107,8 @@ class Property(models.Model):
 
 class PropertyImage(models.Model):
     property = models.ForeignKey('rentals_app.Property', on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='property_images/')
+    image = models.ImageField(upload_to=hashed_upload_to)
+    variants = models.JSONField(default=dict, blank=True, editable=False)  # filled in by images.py
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -60,15 +119,29 @@ class PropertyImage(models.Model):
 # Favorites (for Tenants)
 # ------------------------------
 class Favorite(models.Model):
-    tenant = models.ForeignKey('rentals_app.User', on_delete=models.CASCADE, related_name='favorites')
+    # Signed-in users are keyed by `tenant`, anonymous visitors by the random
+    # `visitor` id kept in their session (see favorites.py).
+    tenant = models.ForeignKey('rentals_app.User', on_delete=models.CASCADE, related_name='favorites', null=True, blank=True)
+    visitor = models.CharField(max_length=32, null=True, blank=True)
     property = models.ForeignKey('rentals_app.Property', on_delete=models.CASCADE, related_name='favorited_by')
     saved_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('tenant', 'property')
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'property'], condition=models.Q(tenant__isnull=False), name='favorite_unique_tenant'),
+            models.UniqueConstraint(fields=['visitor', 'property'], condition=models.Q(visitor__isnull=False), name='favorite_unique_visitor'),
+            models.CheckConstraint(
+                condition=models.Q(tenant__isnull=False, visitor__isnull=True) | models.Q(tenant__isnull=True, visitor__isnull=False),
+                name='favorite_tenant_xor_visitor',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['tenant', '-saved_at', '-id'], name='favorite_tenant_saved_idx'),
+            models.Index(fields=['visitor', '-saved_at', '-id'], name='favorite_visitor_saved_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.tenant.username} saved {self.property.title}"
+        return f"{self.tenant.username if self.tenant_id else 'Visitor ' + self.visitor} saved {self.property.title}"
 
 
 # ------------------------------
@@ -77,12 +150,173 @@ class Favorite(models.Model):
 
 
 class Message(models.Model):
-    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='messages')
+    # Indexed by message_prop_read_sent_idx, which leads with property
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='messages', db_index=False)
     sender_name = models.CharField(max_length=100)
     sender_email = models.EmailField()
     content = models.TextField()
     sent_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
+    # Picked up by the notification worker (notifications.py), not the request
+    notified = models.BooleanField(default=False, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(notified=False), name='message_unnotified_idx'),
+            # Owner inbox: newest (unread) messages across a set of listings
+            models.Index(fields=['property', 'is_read', '-sent_at', '-id'], name='message_prop_read_sent_idx'),
+            # One sender's thread
+            models.Index(fields=['sender_email', '-sent_at', '-id'], name='message_sender_sent_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the unread counter tell a "mark as read" save from any other
+        instance._loaded_is_read = instance.__dict__.get('is_read')
+        return instance
 
     def __str__(self):
         return f"Message for {self.property.title} from {self.sender_name}"
+
+
+# ------------------------------
+# Per-listing Counters
+# ------------------------------
+# One row per listing holding the numbers on the owner dashboard.  Kept up to
+# date incrementally by counters.py so the dashboard never counts rows.
+
+
+class PropertyStats(models.Model):
+    property = models.OneToOneField(Property, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    view_count = models.PositiveIntegerField(default=0)
+    unread_messages = models.PositiveIntegerField(default=0)
+    favorite_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats for {self.property_id}"
+
+
+class PropertyViewBucket(models.Model):
+    # Views of one listing during one hour, written in batches by tracking.py
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='view_buckets')
+    hour = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'hour'], name='view_bucket_property_hour'),
+        ]
+
+    def __str__(self):
+        return f"{self.views} views of {self.property_id} at {self.hour:%Y-%m-%d %H:00}"
+
+
+# ------------------------------
+# Email Outbox
+# ------------------------------
+# Emails waiting to be sent by the send_notifications worker.  Requests never
+# talk to SMTP; rows are written here and delivered in batches.
+
+
+class OutboxEmail(models.Model):
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(sent_at__isnull=True, failed_at__isnull=True),
+                name='outbox_due_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipient}"
+
+
+# ------------------------------
+# Rent Market Rollups
+# ------------------------------
+# Listings, total rent and a quantile sketch per location, property type and
+# month posted, maintained by analytics.py.  '' in location or property_type
+# is the rollup over all of them.
+
+
+class RentRollup(models.Model):
+    location = models.CharField(max_length=255, blank=True)
+    property_type = models.CharField(max_length=10, blank=True)
+    month = models.DateField()
+    listings = models.PositiveIntegerField(default=0)
+    total_rent = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    sketch = models.JSONField(default=dict)  # analytics.RentSketch buckets
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['location', 'property_type', 'month'], name='rent_rollup_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.location or 'All locations'} / {self.property_type or 'all types'} {self.month:%Y-%m}"
+
+
+# ------------------------------
+# Saved-Search Alerts
+# ------------------------------
+# A PropertySearchForm query someone asked to be emailed about, and the
+# listings found to match it (see alerts.py).  A listing is announced to each
+# search at most once; send_notifications emails pending matches in batches.
+
+
+class SavedSearch(models.Model):
+    email = models.EmailField()
+    criteria = models.JSONField()  # listing_cache.normalize() output, with "near" resolved to lat/lng
+    token = models.CharField(max_length=32, unique=True)  # for the confirm and unsubscribe links
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set once the address owner follows the emailed link; unconfirmed searches get no alerts
+    confirmed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['email'], name='saved_search_email_idx'),
+        ]
+
+    def __str__(self):
+        criteria = self.criteria
+        parts = [
+            dict(Property.PROPERTY_TYPE_CHOICES).get(criteria.get('property_type'), 'Any type'),
+            criteria.get('q'),
+            criteria.get('location'),
+        ]
+        if criteria.get('lat') is not None:
+            parts.append(f"within {criteria['radius_km']} km of {criteria.get('near') or 'a chosen spot'}")
+        # Prices are stored normalized, e.g. "1E+3"
+        low, high = (f"${Decimal(criteria[name]):,f}" if criteria.get(name) else None for name in ('min_price', 'max_price'))
+        parts.append(f"{low}–{high}" if low and high else f"from {low}" if low else f"up to {high}" if high else None)
+        return ', '.join(part for part in parts if part)
+
+
+class SavedSearchMatch(models.Model):
+    search = models.ForeignKey('rentals_app.SavedSearch', on_delete=models.CASCADE, related_name='matches')
+    property = models.ForeignKey('rentals_app.Property', on_delete=models.CASCADE, related_name='+')
+    matched_at = models.DateTimeField(auto_now_add=True)
+    notified = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['search', 'property'], name='saved_search_match_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['matched_at'], condition=models.Q(notified=False), name='saved_search_match_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id} for saved search {self.search_id}"
@@ -0,0 +1,179 @@
+import random
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Message, OutboxEmail, SavedSearchMatch
+
+
+# -------------------------------
+# Owner email notifications
+# -------------------------------
+# An inquiry POST only inserts the Message.  The send_notifications worker
+# then, in a loop:
+#
+#   1. turns unnotified messages into OutboxEmail rows -- one email per
+#      message, or a single digest for an owner with NOTIFY_DIGEST_THRESHOLD
+#      or more new messages in the batch;
+#   2. does the same for saved-search matches (see alerts.py), one email per
+#      address covering all of its searches;
+#   3. sends due outbox rows over one SMTP connection per batch, retrying
+#      failures with exponential backoff until OUTBOX_MAX_ATTEMPTS.
+#
+# Run a single worker; rows are not claimed, so two workers would double-send.
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number ``attempts``, with jitter."""
+    delay = settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return min(delay, settings.OUTBOX_RETRY_MAX_SECONDS) * random.uniform(0.8, 1.2)
+
+
+def enqueue_new_messages(batch_size):
+    """Queue emails for up to ``batch_size`` new inquiries; returns how many were queued."""
+    messages = list(
+        Message.objects.filter(notified=False)
+        .select_related('property__owner')
+        .defer('property__description')
+        .order_by('id')[:batch_size]
+    )
+    if not messages:
+        return 0
+
+    by_owner = {}
+    for message in messages:
+        by_owner.setdefault(message.property.owner, []).append(message)
+
+    now = timezone.now()
+    emails = []
+    for owner, inquiries in by_owner.items():
+        if not owner.email:
+            continue
+        if len(inquiries) >= settings.NOTIFY_DIGEST_THRESHOLD:
+            batches = [('emails/message_digest.txt', f'{len(inquiries)} new inquiries about your listings', inquiries)]
+        else:
+            batches = [
+                ('emails/new_message.txt', f'New inquiry about {message.property.title}', [message])
+                for message in inquiries
+            ]
+        for template, subject, batch in batches:
+            emails.append(OutboxEmail(
+                recipient=owner.email,
+                subject=subject,
+                body=render_to_string(template, {'owner': owner, 'messages': batch}),
+                next_attempt_at=now,
+            ))
+
+    with transaction.atomic():
+        OutboxEmail.objects.bulk_create(emails)
+        Message.objects.filter(pk__in=[message.pk for message in messages]).update(notified=True)
+    return len(messages)
+
+
+def queue_search_confirmation(search):
+    """Queue the email whose link confirms a new SavedSearch (see views.confirm_search)."""
+    OutboxEmail.objects.create(
+        recipient=search.email,
+        subject='Confirm your search alert',
+        body=render_to_string('emails/confirm_search.txt', {'search': search, 'site_url': settings.SITE_URL}),
+        next_attempt_at=timezone.now(),
+    )
+
+
+def enqueue_search_alerts(batch_size):
+    """
+    Queue one email per address for up to ``batch_size`` saved-search
+    matches older than SAVED_SEARCH_ALERT_DELAY_SECONDS; returns how many
+    matches were handled.  Listings taken down since they matched, and
+    searches nobody has confirmed, are skipped.
+    """
+    now = timezone.now()
+    matches = list(
+        SavedSearchMatch.objects.filter(
+            notified=False, matched_at__lte=now - timedelta(seconds=settings.SAVED_SEARCH_ALERT_DELAY_SECONDS),
+        )
+        .select_related('search', 'property')
+        .defer('property__description', 'property__variants')
+        .order_by('matched_at')[:batch_size]
+    )
+    if not matches:
+        return 0
+
+    by_email = {}
+    for match in matches:
+        if match.property.is_available and match.search.confirmed_at is not None:
+            by_email.setdefault(match.search.email, {}).setdefault(match.search, []).append(match.property)
+
+    emails = []
+    for email, searches in by_email.items():
+        found = sum(len(listings) for listings in searches.values())
+        emails.append(OutboxEmail(
+            recipient=email,
+            subject=f'{found} new listing{"s" if found != 1 else ""} matching your saved search{"es" if len(searches) != 1 else ""}',
+            body=render_to_string(
+                'emails/search_alert.txt', {'searches': list(searches.items()), 'site_url': settings.SITE_URL},
+            ),
+            next_attempt_at=now,
+        ))
+
+    with transaction.atomic():
+        OutboxEmail.objects.bulk_create(emails)
+        SavedSearchMatch.objects.filter(pk__in=[match.pk for match in matches]).update(notified=True)
+    return len(matches)
+
+
+def deliver_due(batch_size, connection=None):
+    """Send up to ``batch_size`` due emails over one connection; returns (sent, failed)."""
+    now = timezone.now()
+    due = list(
+        OutboxEmail.objects.filter(sent_at__isnull=True, failed_at__isnull=True, next_attempt_at__lte=now)
+        .order_by('next_attempt_at')[:batch_size]
+    )
+    if not due:
+        return 0, 0
+
+    connection = connection or get_connection()
+    sent, retry = [], []
+    try:
+        connection.open()
+        for email in due:
+            message = EmailMessage(
+                email.subject, email.body, settings.DEFAULT_FROM_EMAIL, [email.recipient], connection=connection,
+            )
+            try:
+                message.send()
+            except smtplib.SMTPServerDisconnected as exc:
+                # The server dropped the pooled connection; reopen once for the rest
+                connection.close()
+                connection.open()
+                retry.append((email, exc))
+            except (smtplib.SMTPException, OSError) as exc:
+                retry.append((email, exc))
+            else:
+                sent.append(email.pk)
+    except OSError as exc:
+        # Could not connect at all: everything not yet sent is retried
+        handled = set(sent) | {email.pk for email, _ in retry}
+        retry.extend((email, exc) for email in due if email.pk not in handled)
+    finally:
+        connection.close()
+
+    now = timezone.now()
+    if sent:
+        OutboxEmail.objects.filter(pk__in=sent).update(sent_at=now)
+    for email, exc in retry:
+        email.attempts += 1
+        email.last_error = f'{type(exc).__name__}: {exc}'
+        if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS or isinstance(exc, smtplib.SMTPRecipientsRefused):
+            email.failed_at = now
+        else:
+            email.next_attempt_at = now + timedelta(seconds=backoff(email.attempts))
+    OutboxEmail.objects.bulk_update(
+        [email for email, _ in retry], ['attempts', 'last_error', 'failed_at', 'next_attempt_at'],
+    )
+    return len(sent), len(retry)
@@ -0,0 +1,146 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+
+
+# -------------------------------
+# Keyset (cursor) pagination
+# -------------------------------
+# OFFSET pagination makes the database walk and discard every row before the
+# requested page.  Keyset pagination instead remembers the sort key of the
+# last row shown and asks for rows "after" it, which an index on the sort
+# columns answers in the same time for page 1 and page 10,000.
+
+# sort name -> (field, descending, python type of the field)
+ORDERINGS = {
+    'newest': ('created_at', True, datetime),
+    'distance': ('distance_km', False, float),  # annotated by the geo index's within()
+    'price': ('price', False, Decimal),
+    '-price': ('price', True, Decimal),
+    'saved': ('saved_at', True, datetime),  # Favorite rows
+    'sent': ('sent_at', True, datetime),  # Message rows
+}
+DEFAULT_ORDERING = 'newest'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    raw = json.dumps([value, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, value_type):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if value_type is datetime:
+            value = datetime.fromisoformat(value)
+        else:
+            value = value_type(value)
+        return value, int(pk)
+    except Exception as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _keyset_queryset(queryset, sort, cursor, per_page):
+    field, descending, value_type = ORDERINGS.get(sort, ORDERINGS[DEFAULT_ORDERING])
+    prefix = '-' if descending else ''
+    queryset = queryset.order_by(f'{prefix}{field}', f'{prefix}id')
+
+    if cursor:
+        try:
+            value, pk = decode_cursor(cursor, value_type)
+        except InvalidCursor:
+            pass
+        else:
+            op = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk})
+            )
+
+    # Fetch one extra row to learn whether there is a next page without COUNT(*)
+    return queryset[:per_page + 1], field
+
+
+def _keyset_page(rows, field, per_page):
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return KeysetPage(rows, next_cursor)
+
+
+def keyset_paginate(queryset, sort=DEFAULT_ORDERING, cursor=None, per_page=20):
+    """
+    Return one KeysetPage of ``queryset`` ordered by ``sort`` with ``id`` as
+    the tie breaker.  An invalid or tampered cursor falls back to page one.
+    """
+    queryset, field = _keyset_queryset(queryset, sort, cursor, per_page)
+    return _keyset_page(list(queryset), field, per_page)
+
+
+async def akeyset_paginate(queryset, sort=DEFAULT_ORDERING, cursor=None, per_page=20):
+    queryset, field = _keyset_queryset(queryset, sort, cursor, per_page)
+    return _keyset_page([row async for row in queryset.aiterator()], field, per_page)
+
+
+def _ranked_after(cursor):
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor, float)
+    except InvalidCursor:
+        return None
+
+
+def _ranked_page(hits, per_page, found):
+    shown = hits[:per_page]
+    rows = [found[pk] for score, pk in shown if pk in found]
+    next_cursor = encode_cursor(*shown[-1]) if len(hits) > per_page else None
+    return KeysetPage(rows, next_cursor)
+
+
+def ranked_paginate(queryset, ranking, cursor=None, per_page=20):
+    """
+    Page through ``queryset`` in the order of ``ranking`` (relevance from
+    the search backend), a callable (queryset, after, limit) returning
+    the next [(score, id)] of the queryset's rows after the (score, id) pair
+    ``after``.  The cursor is the last (score, id) shown, so nothing is capped.
+    """
+    hits = ranking(queryset, after=_ranked_after(cursor), limit=per_page + 1)
+    found = queryset.in_bulk([pk for score, pk in hits[:per_page]])
+    return _ranked_page(hits, per_page, found)
+
+
+async def aranked_paginate(queryset, ranking, cursor=None, per_page=20):
+    hits = await sync_to_async(ranking)(queryset, after=_ranked_after(cursor), limit=per_page + 1)
+    found = await queryset.ain_bulk([pk for score, pk in hits[:per_page]])
+    return _ranked_page(hits, per_page, found)
@@ -0,0 +1,290 @@
+import atexit
+import json
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.decorators import sync_and_async_middleware
+
+
+# -------------------------------
+# Request instrumentation
+# -------------------------------
+# With PERF_METRICS_ENABLED, PerfMiddleware times a PERF_SAMPLE_RATE share of
+# requests and folds, per URL name, wall time, ORM query count and time,
+# template render time and response size into fixed-bucket histograms.  The
+# statements themselves are normalised (literals become "?") and kept in a
+# bounded table of count / total / worst time.
+#
+# Everything lives in the worker process.  Each worker writes a snapshot to
+# PERF_METRICS_DIR/<pid>.json every PERF_DUMP_SECONDS and on exit; histograms
+# are plain bucket counts, so the /metrics/ endpoint and `manage.py
+# perf_report` merge the snapshots of all workers by adding them up.
+#
+# Requests that are not sampled only pay for one random() call, and with the
+# setting off the middleware removes itself from the stack.
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+SIZE_BUCKETS = (1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000)
+
+METRICS = {
+    # name in snapshots: (Prometheus name, bucket bounds, help text)
+    'duration': ('rentals_request_duration_seconds', TIME_BUCKETS, 'Wall time of the request.'),
+    'db_time': ('rentals_request_db_seconds', TIME_BUCKETS, 'Time spent executing ORM queries.'),
+    'queries': ('rentals_request_queries', QUERY_BUCKETS, 'Queries executed per request.'),
+    'template_time': ('rentals_request_template_seconds', TIME_BUCKETS, 'Time spent rendering templates.'),
+    'size': ('rentals_response_size_bytes', SIZE_BUCKETS, 'Response body size.'),
+}
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r'\bIN \((?:\?|%s)(?:, (?:\?|%s))*\)')
+
+_current = ContextVar('perf_record', default=None)
+_lock = threading.Lock()
+_views = {}
+_queries = {}
+_last_dump = time.monotonic()
+
+
+def new_histogram(bounds):
+    # One count per bound plus the +Inf bucket; counts are not cumulative
+    return {'counts': [0] * (len(bounds) + 1), 'sum': 0.0}
+
+
+def observe(histogram, bounds, value):
+    histogram['counts'][bisect_left(bounds, value)] += 1
+    histogram['sum'] += value
+
+
+def quantile(histogram, bounds, q):
+    """Upper bound of the bucket holding the q-th quantile (None above the last bound)."""
+    total = sum(histogram['counts'])
+    if not total:
+        return 0
+    seen = 0
+    for bound, count in zip(bounds + (None,), histogram['counts']):
+        seen += count
+        if seen >= q * total:
+            return bound
+
+
+def normalize_sql(sql):
+    return IN_LIST_RE.sub('IN (...)', LITERAL_RE.sub('?', ' '.join(sql.split())))
+
+
+class Record:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # A connection.execute_wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            self.statements.append((sql, elapsed))
+
+
+def record(view, duration, size, rec):
+    values = {
+        'duration': duration, 'db_time': rec.db_time, 'queries': rec.queries,
+        'template_time': rec.template_time, 'size': size,
+    }
+    with _lock:
+        stats = _views.setdefault(view, {name: new_histogram(bounds) for name, (_, bounds, _) in METRICS.items()})
+        for name, value in values.items():
+            if value is not None:
+                observe(stats[name], METRICS[name][1], value)
+        for sql, elapsed in rec.statements:
+            key = normalize_sql(sql)
+            entry = _queries.get(key)
+            if entry is None:
+                if len(_queries) >= settings.PERF_MAX_QUERIES:
+                    continue
+                entry = _queries[key] = {'count': 0, 'total': 0.0, 'max': 0.0, 'view': view}
+            entry['count'] += 1
+            entry['total'] += elapsed
+            if elapsed > entry['max']:
+                entry['max'], entry['view'] = elapsed, view
+
+
+def snapshot():
+    with _lock:
+        return json.loads(json.dumps({'views': _views, 'queries': _queries}))
+
+
+def dump():
+    """Write this process's snapshot to PERF_METRICS_DIR/<pid>.json."""
+    global _last_dump
+    _last_dump = time.monotonic()
+    if not _views:
+        return
+    directory = Path(settings.PERF_METRICS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{os.getpid()}.json'
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(snapshot()))
+    os.replace(tmp, path)
+
+
+def merge(snapshots):
+    views, queries = {}, {}
+    for snap in snapshots:
+        for view, stats in snap['views'].items():
+            merged = views.setdefault(view, {name: new_histogram(bounds) for name, (_, bounds, _) in METRICS.items()})
+            for name, histogram in stats.items():
+                merged[name]['counts'] = [a + b for a, b in zip(merged[name]['counts'], histogram['counts'])]
+                merged[name]['sum'] += histogram['sum']
+        for sql, entry in snap['queries'].items():
+            merged = queries.setdefault(sql, {'count': 0, 'total': 0.0, 'max': 0.0, 'view': entry['view']})
+            merged['count'] += entry['count']
+            merged['total'] += entry['total']
+            if entry['max'] > merged['max']:
+                merged['max'], merged['view'] = entry['max'], entry['view']
+    return {'views': views, 'queries': queries}
+
+
+def collect():
+    """Merged snapshot of every worker, this one included."""
+    dump()
+    snapshots = []
+    for path in Path(settings.PERF_METRICS_DIR).glob('*.json'):
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # a worker mid-write or a file being reset
+    return merge(snapshots)
+
+
+def reset():
+    with _lock:
+        _views.clear()
+        _queries.clear()
+    for path in Path(settings.PERF_METRICS_DIR).glob('*.json'):
+        path.unlink(missing_ok=True)
+
+
+def prometheus(data):
+    def labels(**pairs):
+        return '{' + ','.join(f'{key}="{value}"' for key, value in pairs.items()) + '}'
+
+    lines = []
+    for name, (metric, bounds, help_text) in METRICS.items():
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+        for view, stats in sorted(data['views'].items()):
+            histogram, cumulative = stats[name], 0
+            for bound, count in zip(bounds + ('+Inf',), histogram['counts']):
+                cumulative += count
+                lines.append(f'{metric}_bucket{labels(view=view, le=bound)} {cumulative}')
+            lines.append(f'{metric}_sum{labels(view=view)} {histogram["sum"]:.6f}')
+            lines.append(f'{metric}_count{labels(view=view)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+@sync_and_async_middleware
+class PerfMiddleware:
+    def __init__(self, get_response):
+        if not settings.PERF_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= settings.PERF_SAMPLE_RATE:
+            return self.get_response(request)
+
+        rec, start = Record(), time.perf_counter()
+        token = _current.set(rec)
+        try:
+            with self.wrap_connections(rec):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, rec, start)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.PERF_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        rec, start = Record(), time.perf_counter()
+        # Connections are per thread: wrap those of the thread sync_to_async
+        # runs this request's ORM calls in, not this coroutine's
+        wrappers = await sync_to_async(self.wrap_connections)(rec)
+        token = _current.set(rec)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+            wrappers.close()
+        return self.finish(request, response, rec, start)
+
+    def wrap_connections(self, rec):
+        stack = ExitStack()
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(rec))
+        return stack
+
+    def finish(self, request, response, rec, start):
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        size = None if response.streaming else len(response.content)
+        record(match.view_name if match else '<unresolved>', duration, size, rec)
+        if time.monotonic() - _last_dump >= settings.PERF_DUMP_SECONDS:
+            dump()
+        return response
+
+
+# -------------------------------
+# Template render timing
+# -------------------------------
+# Set as the TEMPLATES backend.  Only templates rendered by views are timed;
+# includes render inside them and are not counted twice.
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        rec = _current.get()
+        if rec is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            rec.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def _dump_at_exit():
+    if settings.PERF_METRICS_ENABLED:
+        dump()
+
+
+atexit.register(_dump_at_exit)
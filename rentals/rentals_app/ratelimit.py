@@ -0,0 +1,107 @@
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# -------------------------------
+# Token-bucket rate limiting
+# -------------------------------
+# Each (URL name, client) pair owns a bucket holding up to ``burst`` tokens
+# that refills at ``rate``.  A request spends one token; an empty bucket means
+# 429.  Buckets live outside the main database so a flood of rejected writes
+# never touches the ORM or SQLite's global write lock:
+#
+#   * MemoryBucketStore -- a dict per process; limits are per worker.
+#   * SharedBucketStore -- a small SQLite file of its own (keep it on local
+#     disk or tmpfs), shared by every gunicorn worker on the machine.
+
+RATE_RE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'5/m' or '20/10m' -> tokens per second."""
+    match = RATE_RE.match(rate)
+    if not match:
+        raise ValueError(f'Invalid rate "{rate}", expected e.g. "5/m" or "20/10m".')
+    count, multiplier, unit = match.groups()
+    return int(count) / (int(multiplier or 1) * PERIODS[unit])
+
+
+def _refill(tokens, updated, now, per_second, burst):
+    return min(burst, tokens + (now - updated) * per_second)
+
+
+class MemoryBucketStore:
+    def __init__(self, max_buckets=100_000, **kwargs):
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, key, per_second, burst):
+        """Take one token.  Returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (burst, now))
+            tokens = _refill(tokens, updated, now, per_second, burst)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)  # least recently used
+        return 0 if allowed else (1 - tokens) / per_second
+
+
+class SharedBucketStore:
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, max_idle=86400, **kwargs):
+        self.path = str(path)
+        self.max_idle = max_idle
+        self.local = threading.local()
+        self.calls = 0
+
+    @property
+    def db(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=OFF')
+            db.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+        return db
+
+    def consume(self, key, per_second, burst):
+        now = time.time()
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = _refill(*(row or (burst, now)), now, per_second, burst)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            db.execute(
+                'INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (key, tokens, now),
+            )
+            self.calls += 1
+            if self.calls % self.PRUNE_EVERY == 0:
+                db.execute('DELETE FROM buckets WHERE updated < ?', (now - self.max_idle,))
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return 0 if allowed else (1 - tokens) / per_second
+
+
+STORES = {'memory': MemoryBucketStore, 'shared': SharedBucketStore}
+
+
+def retry_after(seconds):
+    return max(1, math.ceil(seconds))
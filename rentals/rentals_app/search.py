@@ -0,0 +1,209 @@
+import difflib
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+# -------------------------------
+# Full-text listing search
+# -------------------------------
+# ``location__icontains`` compiles to ``LIKE '%term%'`` which no index can
+# serve.  Listings are instead mirrored into an inverted index (SQLite FTS5
+# locally) that is kept in sync by the Property signals in signals.py.
+#
+# Backends are pluggable through settings.RENTALS_SEARCH_BACKEND; any class
+# with index / remove / rebuild / filter / matching_ids methods can be
+# dropped in; those that can order by relevance also set ``ranks`` and
+# provide ranked().
+#
+# Pages use filter() and ranked(): the match is a subquery of the listing
+# query, so the availability, price and type filters and the sort apply to
+# every match instead of to a capped list of the best-ranked ids.
+
+FTS_TABLE = 'rentals_app_property_fts'
+FTS_VOCAB_TABLE = 'rentals_app_property_fts_vocab'
+
+# bm25 column weights: a hit in the location beats one in the title, which
+# beats one buried in the description.
+FTS_WEIGHTS = (5.0, 10.0, 1.0)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+class LikeSearchBackend:
+    """
+    Portable fallback that reproduces the old ``icontains`` behaviour.  Used
+    on databases without an FTS engine and as the benchmark baseline.
+    """
+
+    ranks = False
+
+    def __init__(self, using='default'):
+        self.using = using
+
+    def index(self, prop):
+        pass
+
+    def remove(self, pk):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def _narrow(self, queryset, q, location):
+        for token in tokenize(q):
+            queryset = queryset.filter(
+                Q(title__icontains=token) | Q(location__icontains=token) | Q(description__icontains=token)
+            )
+        if location:
+            queryset = queryset.filter(location__icontains=location)
+        return queryset
+
+    def filter(self, queryset, q=None, location=None):
+        """``queryset`` narrowed to the matches; there is no relevance order here."""
+        return self._narrow(queryset, q, location)
+
+    def matching_ids(self, q=None, location=None):
+        from .models import Property
+
+        return self._narrow(Property.objects.using(self.using).all(), q, location).values('id')
+
+
+class SQLiteFTSSearchBackend:
+    """
+    FTS5 index over title, location and description with bm25 ranking,
+    prefix matching and typo tolerance.  The virtual tables are created by
+    migration 0005_property_fts.
+    """
+
+    typo_cutoff = 0.75
+    typo_candidates = 3
+    ranks = True
+
+    def __init__(self, using='default'):
+        self.using = using
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def index(self, prop):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [prop.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, location, description) VALUES (%s, %s, %s, %s)',
+                [prop.pk, prop.title, prop.location, prop.description],
+            )
+
+    def remove(self, pk):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, location, description) '
+                f'SELECT id, title, location, description FROM rentals_app_property'
+            )
+
+    def _close_terms(self, cursor, token):
+        """Indexed terms within a small edit distance of a misspelt token."""
+        first = token[0]
+        cursor.execute(
+            f'SELECT term FROM {FTS_VOCAB_TABLE} WHERE term >= %s AND term < %s',
+            [first, chr(ord(first) + 1)],
+        )
+        vocabulary = [row[0] for row in cursor.fetchall()]
+        return difflib.get_close_matches(token, vocabulary, n=self.typo_candidates, cutoff=self.typo_cutoff)
+
+    def _has_prefix(self, cursor, token):
+        cursor.execute(
+            f'SELECT 1 FROM {FTS_VOCAB_TABLE} WHERE term >= %s AND term < %s LIMIT 1',
+            [token, token + '\uffff'],
+        )
+        return cursor.fetchone() is not None
+
+    def _expression(self, cursor, tokens):
+        parts = []
+        for token in tokens:
+            alternatives = [f'"{token}"*']
+            if len(token) > 3 and not self._has_prefix(cursor, token):
+                alternatives += [f'"{term}"' for term in self._close_terms(cursor, token)]
+            parts.append('(' + ' OR '.join(alternatives) + ')')
+        return ' AND '.join(parts)
+
+    def match_expression(self, q=None, location=None):
+        """The FTS5 MATCH string for a search, or None if it has no words."""
+        q_tokens = tokenize(q)
+        location_tokens = tokenize(location)
+        if not q_tokens and not location_tokens:
+            return None
+        with self.connection.cursor() as cursor:
+            clauses = []
+            if q_tokens:
+                clauses.append('(' + self._expression(cursor, q_tokens) + ')')
+            if location_tokens:
+                clauses.append('location : (' + self._expression(cursor, location_tokens) + ')')
+        return ' AND '.join(clauses)
+
+    def filter(self, queryset, q=None, location=None):
+        """``queryset`` narrowed to the matches (uncapped)."""
+        expression = self.match_expression(q, location)
+        if expression is None:
+            return queryset.none()
+        return queryset.filter(id__in=self._matches(expression))
+
+    def ranked(self, queryset, q=None, location=None, after=None, limit=20):
+        """
+        [(bm25 score, id)] of the best ``limit`` matches in ``queryset``
+        ranked after ``after`` (a (score, id) pair), best first.
+
+        bm25() costs little over the whole match set but a lot once per row
+        of a correlated subquery, so every match is scored once in a
+        materialized CTE and the filtered listing query is applied to that.
+        """
+        expression = self.match_expression(q, location)
+        if expression is None:
+            return []
+        weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+        listing_sql, listing_params = queryset.order_by().values('id').query.get_compiler(self.using).as_sql()
+        score, pk = after if after is not None else (float('-inf'), 0)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH ranked AS MATERIALIZED ('
+                f'SELECT rowid AS id, bm25({FTS_TABLE}, {weights}) AS score '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s) '
+                f'SELECT score, id FROM ranked WHERE id IN ({listing_sql}) '
+                f'AND (score > %s OR (score = %s AND id > %s)) '
+                f'ORDER BY score, id LIMIT %s',
+                [expression, *listing_params, score, score, pk, limit],
+            )
+            return [(row[0], row[1]) for row in cursor.fetchall()]
+
+    def matching_ids(self, q=None, location=None):
+        """Subquery of every matching listing id, for ``pk__in``."""
+        expression = self.match_expression(q, location)
+        if expression is None:
+            return []
+        return self._matches(expression)
+
+    def _matches(self, expression):
+        return RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression])
+
+
+def get_search_backend(using='default'):
+    path = getattr(settings, 'RENTALS_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)(using=using)
+    if connections[using].vendor == 'sqlite':
+        return SQLiteFTSSearchBackend(using=using)
+    return LikeSearchBackend(using=using)
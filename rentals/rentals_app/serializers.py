@@ -0,0 +1,71 @@
+from rest_framework import serializers
+
+from .models import Property, PropertyImage, Message
+
+
+# =====================================================
+# SPARSE FIELDSETS
+# =====================================================
+# ?fields=id,title,price trims every object to the listed fields, so the
+# mobile client only pays for what it renders.
+
+class SparseFieldsetsMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or not request.query_params.get('fields'):
+            return
+        for name in set(self.fields) - requested_fields(request):
+            self.fields.pop(name)
+
+
+def requested_fields(request, default=()):
+    wanted = request.query_params.get('fields')
+    return {name.strip() for name in wanted.split(',')} if wanted else set(default)
+
+
+# =====================================================
+# SERIALIZERS
+# =====================================================
+
+class PropertyImageSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PropertyImage
+        fields = ['id', 'property', 'image', 'variants', 'uploaded_at']
+
+
+class NestedImageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PropertyImage
+        fields = ['id', 'image', 'variants']
+
+
+class PropertySerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    images = NestedImageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Property
+        fields = [
+            'id',
+            'title',
+            'location',
+            'price',
+            'property_type',
+            'description',
+            'is_available',
+            'contact_email',
+            'contact_phone',
+            'image',
+            'variants',
+            'images',
+            'latitude',
+            'longitude',
+            'created_at',
+            'updated_at',
+        ]
+
+
+class MessageSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Message
+        fields = ['id', 'property', 'sender_name', 'sender_email', 'content', 'sent_at', 'is_read']
@@ -0,0 +1,149 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Favorite, Message, Property, PropertyImage, PropertyStats
+from . import alerts, analytics, counters, favorites, geo, images, listing_cache
+from .search import get_search_backend
+
+
+# -------------------------------
+# Search index sync
+# -------------------------------
+@receiver(post_save, sender=Property)
+def index_property(sender, instance, using, **kwargs):
+    get_search_backend(using).index(instance)
+
+
+@receiver(post_delete, sender=Property)
+def unindex_property(sender, instance, using, **kwargs):
+    get_search_backend(using).remove(instance.pk)
+
+
+# -------------------------------
+# Listing cache invalidation
+# -------------------------------
+@receiver(post_save, sender=Property)
+def refresh_listing_cache(sender, instance, **kwargs):
+    listing_cache.invalidate_property(instance)
+
+
+@receiver(post_delete, sender=Property)
+def evict_listing_cache(sender, instance, **kwargs):
+    listing_cache.invalidate_property(instance, deleted=True)
+
+
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_delete, sender=PropertyImage)
+def refresh_listing_card(sender, instance, **kwargs):
+    Property.objects.filter(pk=instance.property_id).touch()
+    listing_cache.invalidate_card(instance.property_id)
+
+
+# -------------------------------
+# Image variants
+# -------------------------------
+@receiver(pre_save, sender=Property)
+@receiver(pre_save, sender=PropertyImage)
+def strip_image_metadata(sender, instance, **kwargs):
+    images.strip_upload(instance)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_save, sender=PropertyImage)
+def schedule_image_variants(sender, instance, **kwargs):
+    images.schedule(instance)
+
+
+# -------------------------------
+# Geocoding + spatial index
+# -------------------------------
+@receiver(pre_save, sender=Property)
+def geocode_property(sender, instance, **kwargs):
+    # A location we can't place has no coordinates, not the old ones
+    instance.latitude, instance.longitude = geo.geocode(instance.location) or (None, None)
+
+
+@receiver(post_save, sender=Property)
+def index_property_location(sender, instance, using, **kwargs):
+    geo.get_geo_index(using).index(instance)
+
+
+@receiver(post_delete, sender=Property)
+def unindex_property_location(sender, instance, using, **kwargs):
+    geo.get_geo_index(using).remove(instance.pk)
+
+
+# -------------------------------
+# Favorites
+# -------------------------------
+@receiver(user_logged_in)
+def merge_favorites_on_login(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        favorites.merge_visitor_favorites(request, user)
+
+
+# -------------------------------
+# Dashboard counters
+# -------------------------------
+@receiver(post_save, sender=Property)
+def create_property_stats(sender, instance, created, **kwargs):
+    # So the first inquiry or favorite is a plain UPDATE
+    if created:
+        PropertyStats.objects.bulk_create([PropertyStats(property=instance)], ignore_conflicts=True)
+
+
+@receiver(post_save, sender=Message)
+def count_message(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_is_read', None)
+    if created and not instance.is_read:
+        counters.adjust_unread(instance.property_id, 1)
+    elif not created and loaded is not None and loaded != instance.is_read:
+        counters.adjust_unread(instance.property_id, -1 if instance.is_read else 1)
+    instance._loaded_is_read = instance.is_read
+
+
+@receiver(post_delete, sender=Message)
+def uncount_message(sender, instance, **kwargs):
+    if not instance.is_read:
+        counters.adjust_unread(instance.property_id, -1)
+
+
+@receiver(post_save, sender=Favorite)
+def count_favorite(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust_favorites(instance.property_id, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def uncount_favorite(sender, instance, **kwargs):
+    counters.adjust_favorites(instance.property_id, -1)
+
+
+# -------------------------------
+# Rent rollups
+# -------------------------------
+@receiver(post_save, sender=Property)
+def update_rent_rollups(sender, instance, created, **kwargs):
+    current = analytics.entry(instance.__dict__)
+    loaded = getattr(instance, '_rollup_entry', None)
+    if created:
+        analytics.update(added=[current])
+    elif loaded is not None and loaded != current:
+        analytics.update(removed=[loaded], added=[current])
+    # Saves of instances that weren't loaded whole are left to rebuild_rent_rollups
+    instance._rollup_entry = current
+
+
+@receiver(post_delete, sender=Property)
+def remove_from_rent_rollups(sender, instance, **kwargs):
+    analytics.update(removed=[getattr(instance, '_rollup_entry', None) or analytics.entry(instance.__dict__)])
+
+
+# -------------------------------
+# Saved-search alerts
+# -------------------------------
+@receiver(post_save, sender=Property)
+def percolate_property(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        alerts.percolate([instance], using)
@@ -0,0 +1,53 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+
+# -------------------------------
+# Static files
+# -------------------------------
+# collectstatic copies every asset to STATIC_ROOT under a content-hashed name
+# (base.css -> base.5af66c1b1797.css), so rentals_app/delivery.py can serve
+# those names as immutable.  Text assets also get .gz and, with brotli
+# installed, .br siblings compressed once here instead of on every request.
+
+COMPRESSIBLE = ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.xml', '.html', '.ico', '.ttf', '.otf', '.eot')
+# Not worth a second file unless it saves at least this much
+MIN_SAVING = 0.05
+
+
+def compressors():
+    yield '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield '.br', lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for original, processed, changed in super().post_process(paths, dry_run, **options):
+            if not isinstance(changed, Exception):
+                names.update({original, processed})
+            yield original, processed, changed
+        if dry_run:
+            return
+        for name in sorted(names):
+            if name and name.endswith(COMPRESSIBLE) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as fh:
+            data = fh.read()
+        for suffix, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) > len(data) * (1 - MIN_SAVING):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
@@ -0,0 +1,51 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from rentals_app.images import FORMATS, VARIANT_WIDTHS
+
+
+register = template.Library()
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+def _srcset(variants, fmt):
+    return ', '.join(
+        f"{default_storage.url(variants[name][fmt])} {variants[name]['width']}w"
+        for name in VARIANT_WIDTHS
+        if fmt in variants.get(name, {})
+    )
+
+
+@register.simple_tag
+def responsive_image(obj, sizes='100vw', variant='card', alt='', **attrs):
+    """
+    <picture> for a Property or PropertyImage with an AVIF/WebP/JPEG srcset.
+    Falls back to the original upload until the pipeline has produced the
+    variants.
+
+        {% responsive_image property sizes="200px" alt=property.title %}
+    """
+    if not obj.image:
+        return ''
+    extra = format_html_join('', ' {}="{}"', attrs.items())
+    variants = obj.variants or {}
+    if variants.get('source') != obj.image.name or variant not in variants:
+        return format_html('<img src="{}" alt="{}" loading="lazy"{}>', obj.image.url, alt, extra)
+
+    fallback = FORMATS[-1]
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[fmt], _srcset(variants, fmt), sizes) for fmt in FORMATS[:-1] if fmt in variants[variant]),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" alt="{}" loading="lazy"{}></picture>',
+        sources,
+        default_storage.url(variants[variant][fallback]),
+        _srcset(variants, fallback),
+        sizes,
+        variants[variant]['width'],
+        alt,
+        extra,
+    )
@@ -1,3 +1,1812 @@
-from django.test import TestCase
+import gzip
+import json
+import random
+import smtplib
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+from wsgiref.util import FileWrapper
 
-# Create your tests here.
+from asgiref.sync import SyncToAsync, iscoroutinefunction, sync_to_async
+from django.core import mail
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.db import connection, router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+from PIL import ExifTags, Image
+
+from .models import User, Property, PropertyImage, Message, Favorite, PropertyStats, PropertyViewBucket, OutboxEmail, RentRollup, SavedSearch, SavedSearchMatch
+from . import alerts, analytics, async_views, benchmarks, counters, db, delivery, images, listing_cache, notifications, perf, storage, tracking, views
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_paginate
+from .ratelimit import SharedBucketStore, parse_rate
+from .geo import get_geo_index
+from .search import get_search_backend
+from .uploads import ChunkedUpload, UploadError
+from . import urls as app_urls
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:  # optional, only for the SMTP round-trip test
+    Controller = None
+
+
+def use_temporary_state_files(test):
+    """Point the shared rate-limit store and the cache generation file at a temporary directory."""
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    test.enterContext(override_settings(
+        RATE_LIMIT_SHARED_PATH=Path(tmp.name) / 'ratelimit.sqlite3',
+        LISTING_CACHE_GENERATION_PATH=Path(tmp.name) / 'listing_cache.generation',
+    ))
+
+
+# =====================================================
+# QUERY BUDGETS
+# =====================================================
+# Every public page gets a fixed number of queries no matter how many
+# listings, images or favorites it shows.  If a change to views.py or a
+# template sneaks in a per-row query, the page blows its budget here.
+
+QUERY_BUDGETS = {
+    # url name: max queries
+    'property_list': 4,  # session, page, facets, which cards are favorited
+    'property_detail': 3,
+    'favorite_list': 2,
+    'owner_dashboard': 3,
+    'owner_inbox': 4,  # session, user, page, thread totals
+    'api-property-list': 3,  # session, page, images
+    'api-property-detail': 4,  # session, updated_at for the ETag, listing, images
+}
+
+
+@override_settings(IMAGE_PIPELINE_ENABLED=False, VIEW_FLUSH_IN_BACKGROUND=False, VIEW_FLUSH_SECONDS=3600)
+class QueryBudgetTests(TestCase):
+    LISTINGS = 25
+    IMAGES_PER_LISTING = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass', role='owner')
+        for i in range(cls.LISTINGS):
+            prop = Property.objects.create(
+                owner=cls.owner,
+                title=f'Room {i}',
+                location='East Legon, Accra',
+                price=500 + i,
+                property_type='room',
+                description='Self-contained room near the university.',
+                contact_email='owner@example.com',
+                image='property_images/th.jpg',
+            )
+            for _ in range(cls.IMAGES_PER_LISTING):
+                PropertyImage.objects.create(property=prop, image='property_images/jk.jpg')
+            Message.objects.create(property=prop, sender_name='Ama', sender_email='ama@example.com', content='Hi')
+        cls.prop = Property.objects.first()
+
+    def setUp(self):
+        caches['listings'].clear()
+        session = self.client.session
+        session['visitor_id'] = 'a' * 32
+        session.save()
+        Favorite.objects.bulk_create(
+            [Favorite(visitor='a' * 32, property=prop) for prop in Property.objects.all()]
+        )
+
+    def tearDown(self):
+        tracking.flush()  # inside the test transaction, not at exit
+
+    def assertWithinBudget(self, name, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        queries = '\n'.join(q['sql'] for q in ctx.captured_queries)
+        self.assertLessEqual(
+            len(ctx), QUERY_BUDGETS[name],
+            f'{name} ran {len(ctx)} queries (budget {QUERY_BUDGETS[name]}):\n{queries}',
+        )
+
+    def test_property_list(self):
+        self.assertWithinBudget('property_list', reverse('property_list'))
+
+    def test_property_list_search(self):
+        self.assertWithinBudget('property_list', reverse('property_list') + '?property_type=room&max_price=520')
+
+    def test_property_detail(self):
+        self.assertWithinBudget('property_detail', reverse('property_detail', args=[self.prop.pk]))
+
+    def test_favorite_list(self):
+        self.assertWithinBudget('favorite_list', reverse('favorite_list'))
+
+    def test_owner_dashboard(self):
+        self.client.force_login(self.owner)
+        self.assertWithinBudget('owner_dashboard', reverse('owner_dashboard'))
+
+    def test_owner_inbox(self):
+        self.client.force_login(self.owner)
+        self.assertWithinBudget('owner_inbox', reverse('owner_inbox'))
+
+    def test_api_property_list(self):
+        self.assertWithinBudget('api-property-list', reverse('api-property-list', kwargs={'version': 'v1'}))
+
+    def test_api_property_detail(self):
+        url = reverse('api-property-detail', kwargs={'version': 'v1', 'pk': self.prop.pk})
+        self.assertWithinBudget('api-property-detail', url)
+
+
+# =====================================================
+# KEYSET PAGINATION
+# =====================================================
+@override_settings(IMAGE_PIPELINE_ENABLED=False)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner', password='pass', role='owner')
+        Property.objects.bulk_create([
+            Property(
+                owner=owner, title=f'Room {i}', location='Osu', price=500 + 100 * (i % 3),
+                property_type='room', description='Room.', contact_email='owner@example.com',
+            )
+            for i in range(7)
+        ])
+        # An import stamps every row with the same time: only the id tells them apart
+        cls.stamp = timezone.now()
+        Property.objects.update(created_at=cls.stamp)
+
+    def setUp(self):
+        use_temporary_state_files(self)
+        listing_cache.clear()
+
+    def walk(self, sort, per_page=3):
+        ids, cursor = [], None
+        while True:
+            page = keyset_paginate(Property.objects.all(), sort=sort, cursor=cursor, per_page=per_page)
+            ids += [prop.pk for prop in page]
+            if not page.has_next:
+                return ids
+            cursor = page.next_cursor
+
+    def test_ties_are_broken_by_id(self):
+        for sort, order in [('newest', ['-created_at', '-id']), ('price', ['price', 'id']), ('-price', ['-price', '-id'])]:
+            expected = list(Property.objects.order_by(*order).values_list('pk', flat=True))
+            self.assertEqual(self.walk(sort), expected, sort)
+
+    def test_cursor_round_trip(self):
+        for value, value_type in [(self.stamp, datetime), (Decimal('1250.50'), Decimal), (2.75, float)]:
+            self.assertEqual(decode_cursor(encode_cursor(value, 42), value_type), (value, 42))
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('bogus', datetime)
+        # A tampered cursor starts over instead of failing the page
+        page = keyset_paginate(Property.objects.all(), cursor='bogus', per_page=3)
+        self.assertEqual([prop.pk for prop in page], self.walk('newest')[:3])
+
+    @override_settings(PROPERTY_LIST_PAGE_SIZE=2)
+    def test_list_follows_its_cursors(self):
+        ids, cursor = [], None
+        for _ in range(4):
+            response = self.client.get(reverse('property_list'), {'cursor': cursor} if cursor else {})
+            ids += [pk for pk, card in response.context['cards']]
+            cursor = response.context['next_cursor']
+        self.assertIsNone(cursor)
+        self.assertEqual(ids, self.walk('newest'))
+
+
+# =====================================================
+# LISTING SEARCH
+# =====================================================
+def search(**params):
+    """Ids of every listing matching q / location, best first."""
+    return [pk for score, pk in get_search_backend().ranked(Property.objects.all(), limit=1000, **params)]
+
+
+@override_settings(IMAGE_PIPELINE_ENABLED=False, PROPERTY_LIST_PAGE_SIZE=20)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass', role='owner')
+        cls.legon = cls.listing(title='Room', location='East Legon, Accra', description='Near the university.')
+        cls.mention = cls.listing(title='Flat', location='Madina', description='Twenty minutes from Osu.')
+        cls.osu = cls.listing(title='Room', location='Osu, Accra', description='Quiet street.')
+
+    @classmethod
+    def listing(cls, **fields):
+        fields = {'price': 700, 'property_type': 'room', 'contact_email': 'owner@example.com', **fields}
+        return Property.objects.create(owner=cls.owner, **fields)
+
+    def setUp(self):
+        caches['listings'].clear()
+
+    def pages(self, **params):
+        """(pk list, page count) from following property_list's next links."""
+        ids, cursor, pages = [], None, 0
+        while True:
+            query = dict(params, **({'cursor': cursor} if cursor else {}))
+            response = self.client.get(reverse('property_list'), query)
+            ids += [pk for pk, card in response.context['cards']]
+            pages += 1
+            cursor = response.context['next_cursor']
+            if not cursor:
+                return ids, pages
+
+    def test_prefix_typo_and_ranking(self):
+        self.assertEqual(search(q='leg'), [self.legon.pk])
+        self.assertEqual(search(q='legoon'), [self.legon.pk])
+        # A hit in the location outranks one in the description
+        self.assertEqual(search(q='osu'), [self.osu.pk, self.mention.pk])
+        self.assertEqual(search(location='osu'), [self.osu.pk])
+
+    def test_list_ranks_prefixes_and_typos(self):
+        def found(**params):
+            response = self.client.get(reverse('property_list'), params)
+            return [pk for pk, card in response.context['cards']]
+
+        self.assertEqual(found(q='osu'), [self.osu.pk, self.mention.pk])
+        self.assertEqual(found(q='east leg'), [self.legon.pk])
+        self.assertEqual(found(q='univrsity'), [self.legon.pk])
+        self.assertEqual(set(found(location='acc')), {self.legon.pk, self.osu.pk})
+        self.assertEqual(found(q='zzzz'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.mention.title = 'Garden flat'
+        self.mention.save()
+        self.assertEqual(search(q='garden'), [self.mention.pk])
+        self.mention.delete()
+        self.assertEqual(search(q='garden'), [])
+        self.assertEqual(search(q='osu'), [self.osu.pk])
+
+    def test_filters_apply_to_every_match(self):
+        # More better-ranked matches than searches used to be capped at (500), all filtered out
+        Property.objects.bulk_create([
+            Property(
+                owner=self.owner, title=f'Osu Osu apartment {i}', location='Osu, Accra', price=2000,
+                property_type='room', description='Osu.', contact_email='owner@example.com', is_available=i % 2 == 0,
+            )
+            for i in range(510)
+        ])
+        get_search_backend().rebuild()
+        cheap = {self.osu.pk} | {self.listing(title=f'Room {i}', location='Osu', price=600).pk for i in range(3)}
+
+        response = self.client.get(reverse('property_list'), {'location': 'Osu', 'max_price': 800})
+        self.assertEqual({pk for pk, card in response.context['cards']}, cheap)
+        response = self.client.get(reverse('property_list'), {'q': 'osu', 'max_price': 800, 'sort': 'price'})
+        self.assertEqual({pk for pk, card in response.context['cards']}, cheap | {self.mention.pk})
+
+    @override_settings(PROPERTY_LIST_PAGE_SIZE=2)
+    def test_relevance_cursor_round_trip(self):
+        for i in range(4):
+            self.listing(title=f'Osu room {i}', location='Osu, Accra')
+        ids, pages = self.pages(q='osu')
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(set(ids), set(search(q='osu')))
+        self.assertEqual(ids[-1], self.mention.pk)
+        self.assertEqual(pages, 3)
+
+
+@override_settings(IMAGE_PIPELINE_ENABLED=False, PROPERTY_LIST_PAGE_SIZE=20)
+class NearSearchTests(TestCase):
+    OSU = (5.556, -0.182)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass', role='owner')
+
+    def setUp(self):
+        caches['listings'].clear()
+
+    def listing(self, **fields):
+        fields = {'price': 700, 'property_type': 'room', 'contact_email': 'owner@example.com', 'description': 'Room.', **fields}
+        return Property.objects.create(owner=self.owner, title=fields.pop('title', 'Room'), **fields)
+
+    def ids(self, **params):
+        response = self.client.get(reverse('property_list'), params)
+        return [pk for pk, card in response.context['cards']], response.context['next_cursor']
+
+    def test_geocoding_follows_the_location(self):
+        prop = self.listing(location='East Legon, Accra')
+        self.assertEqual((prop.latitude, prop.longitude), (5.6363, -0.1615))
+        prop.location = 'Atlantis Bay'
+        prop.save()
+        prop.refresh_from_db()
+        self.assertIsNone(prop.latitude)
+        self.assertIsNone(prop.longitude)
+        self.assertEqual(self.ids(near='East Legon', radius_km=5)[0], [])
+
+    def test_radius_filters_and_sorts_every_listing_in_the_circle(self):
+        lat, lng = self.OSU
+        # More listings in the circle than searches used to be capped at (500),
+        # all nearer than the cheap ones and all filtered out by price
+        Property.objects.bulk_create([
+            Property(
+                owner=self.owner, title=f'Dear {i}', location='Osu, Accra', price=2000, property_type='room',
+                description='Room.', contact_email='owner@example.com', latitude=lat, longitude=lng,
+            )
+            for i in range(510)
+        ])
+        get_geo_index().rebuild()
+        near = self.listing(title='Near', location='Osu, Accra')
+        Property.objects.filter(pk=near.pk).update(latitude=lat + 0.005)  # about 0.6 km north
+        far = self.listing(title='Far', location='Osu, Accra')
+        Property.objects.filter(pk=far.pk).update(latitude=lat + 0.015)  # about 1.7 km north
+        # Inside the 2 km circle's bounding box, outside the circle
+        corner = self.listing(title='Corner', location='Osu, Accra')
+        Property.objects.filter(pk=corner.pk).update(latitude=lat + 0.015, longitude=lng + 0.015)
+        get_geo_index().rebuild()
+        osu = self.listing(title='Centre', location='Osu, Accra')
+
+        self.assertEqual(
+            self.ids(near='Osu', radius_km=2, max_price=800),
+            ([osu.pk, near.pk, far.pk], None),
+        )
+        with self.settings(PROPERTY_LIST_PAGE_SIZE=2):
+            caches['listings'].clear()
+            first, cursor = self.ids(near='Osu', radius_km=2, max_price=800)
+            second, end = self.ids(near='Osu', radius_km=2, max_price=800, cursor=cursor)
+        self.assertEqual((first + second, end), ([osu.pk, near.pk, far.pk], None))
+        self.assertEqual(
+            set(self.ids(near='Osu', radius_km=2, max_price=800, sort='price')[0]), {osu.pk, near.pk, far.pk},
+        )
+
+
+# =====================================================
+# READ API
+# =====================================================
+@override_settings(IMAGE_PIPELINE_ENABLED=False)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass', role='owner')
+        cls.listings = [
+            Property.objects.create(
+                owner=cls.owner, title=f'Room {i}', location='Osu, Accra', price=500 + 100 * i,
+                property_type='room', description='Room.', contact_email='owner@example.com',
+            )
+            for i in range(3)
+        ]
+
+    def get(self, url, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, params, **headers)
+
+    def test_list_etag_follows_the_page_not_the_whole_set(self):
+        url = reverse('api-property-list', kwargs={'version': 'v1'})
+        response = self.get(url, page_size=2)
+        self.assertEqual([row['title'] for row in response.json()['results']], ['Room 2', 'Room 1'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(url, response['ETag'], page_size=2).status_code, 304)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'])
+
+        # A change past the page doesn't matter, one on it does
+        Property.objects.filter(pk=self.listings[0].pk).touch()
+        self.assertEqual(self.get(url, response['ETag'], page_size=2).status_code, 304)
+        Property.objects.filter(pk=self.listings[2].pk).touch()
+        self.assertEqual(self.get(url, response['ETag'], page_size=2).status_code, 200)
+
+    def test_image_changes_change_the_etags(self):
+        prop = self.listings[0]
+        detail = reverse('api-property-detail', kwargs={'version': 'v1', 'pk': prop.pk})
+        images_url = reverse('api-image-list', kwargs={'version': 'v1'})
+        etag = self.get(detail)['ETag']
+        image = PropertyImage.objects.create(property=prop, image='property_images/ab/photo.jpg')
+        response = self.get(detail, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['images']), 1)
+
+        # Variants are written with .update(), skipping post_save
+        etag, image_etag = response['ETag'], self.get(images_url, property=prop.pk)['ETag']
+        images._store_variants(PropertyImage, image.pk, prop.pk, {'source': image.image.name, 'thumb': 'thumb.webp'})
+        self.assertEqual(self.get(detail, etag).status_code, 200)
+        self.assertEqual(self.get(images_url, image_etag, property=prop.pk).status_code, 200)
+
+    def test_invalid_filters_are_rejected(self):
+        properties = reverse('api-property-list', kwargs={'version': 'v1'})
+        self.assertEqual(self.get(properties, min_price='cheap').status_code, 400)
+        response = self.get(properties, property_type='castle')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('property_type', response.json())
+        self.assertEqual(len(self.get(properties, max_price='600').json()['results']), 2)
+        self.assertEqual(self.get(properties, sort='cheapest').status_code, 400)
+        response = self.get(properties, sort='price')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sort', response.json())
+        self.assertEqual(self.get(properties, sort='newest').status_code, 200)
+
+        self.assertEqual(self.get(reverse('api-image-list', kwargs={'version': 'v1'}), property='one').status_code, 400)
+        self.client.force_login(self.owner)
+        messages = reverse('api-message-list', kwargs={'version': 'v1'})
+        self.assertEqual(self.get(messages, is_read='maybe').status_code, 400)
+        self.assertEqual(self.get(messages, is_read='false').status_code, 200)
+
+    async def test_responses_are_compressed_under_asgi(self):
+        url = reverse('api-property-list', kwargs={'version': 'v1'})
+        response = await self.async_client.get(url, headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['results'][0]['title'], 'Room 2')
+
+
+# =====================================================
+# FAVORITES
+# =====================================================
+@override_settings(RATE_LIMIT_STORE='memory')
+class FavoriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner', password='pass', role='owner')
+        cls.props = [
+            Property.objects.create(
+                owner=owner, title=f'Room {i}', location='Osu, Accra', price=400 + i,
+                property_type='room', description='Room.', contact_email='owner@example.com',
+            )
+            for i in range(3)
+        ]
+        cls.tenant = User.objects.create_user('tenant', password='pass', role='tenant')
+
+    def saved_titles(self):
+        response = self.client.get(reverse('favorite_list'))
+        return [prop.title for prop in response.context['properties']]
+
+    def test_visitor_favorites_newest_first(self):
+        for prop in self.props:
+            self.client.get(reverse('save_favorite', args=[prop.pk]))
+        self.client.get(reverse('save_favorite', args=[self.props[0].pk]))  # no duplicate
+        self.assertEqual(self.saved_titles(), ['Room 2', 'Room 1', 'Room 0'])
+
+    def test_deleted_listing_drops_out(self):
+        self.client.get(reverse('save_favorite', args=[self.props[0].pk]))
+        self.props[0].delete()
+        self.assertEqual(self.saved_titles(), [])
+
+    def test_legacy_session_list_is_imported(self):
+        session = self.client.session
+        session['favorites'] = [self.props[1].pk, 999999]
+        session.save()
+        self.assertEqual(self.saved_titles(), ['Room 1'])
+        self.assertNotIn('favorites', self.client.session)
+
+    def test_saving_imports_the_legacy_session_list(self):
+        session = self.client.session
+        session['favorites'] = [self.props[1].pk]
+        session.save()
+        self.client.get(reverse('save_favorite', args=[self.props[0].pk]))
+        self.assertEqual(
+            set(Favorite.objects.values_list('property_id', flat=True)), {self.props[0].pk, self.props[1].pk},
+        )
+        self.assertNotIn('favorites', self.client.session)
+
+    def test_purge_drops_visitors_without_a_session(self):
+        self.client.get(reverse('save_favorite', args=[self.props[0].pk]))
+        Favorite.objects.bulk_create([
+            Favorite(visitor='gone' * 8, property=self.props[0]),
+            Favorite(visitor='gone' * 8, property=self.props[1]),
+            Favorite(visitor='new' + 'x' * 29, property=self.props[2]),  # session not written yet
+        ])
+        Favorite.objects.filter(visitor='gone' * 8).update(saved_at=timezone.now() - timedelta(days=3))
+        Favorite.objects.create(tenant=self.tenant, property=self.props[1])
+        counters.recount()
+
+        out = StringIO()
+        call_command('purge_visitor_favorites', stdout=out)
+        self.assertIn('Removed 2 orphaned', out.getvalue())
+        self.assertFalse(Favorite.objects.filter(visitor='gone' * 8).exists())
+        self.assertEqual(self.saved_titles(), ['Room 0'])
+        self.assertEqual(
+            list(PropertyStats.objects.order_by('property_id').values_list('favorite_count', flat=True)), [1, 1, 1],
+        )
+
+    def test_merge_on_login(self):
+        Favorite.objects.create(tenant=self.tenant, property=self.props[0])
+        self.client.get(reverse('save_favorite', args=[self.props[0].pk]))
+        self.client.get(reverse('save_favorite', args=[self.props[1].pk]))
+        self.client.post(reverse('owner_login'), {'username': 'tenant', 'password': 'pass'})
+        self.assertEqual(Favorite.objects.filter(tenant=self.tenant).count(), 2)
+        self.assertFalse(Favorite.objects.filter(visitor__isnull=False).exists())
+
+    def test_remove(self):
+        self.client.get(reverse('save_favorite', args=[self.props[0].pk]))
+        self.client.post(reverse('remove_favorite', args=[self.props[0].pk]))
+        self.assertEqual(self.saved_titles(), [])
+
+
+# =====================================================
+# ASYNC PUBLIC VIEWS
+# =====================================================
+# urls.py picks async_views at import time (ASYNC_PUBLIC_VIEWS, on under
+# ASGI), so the suite as a whole runs against whichever set that chose.
+# These tests always route the public pages to async_views.
+
+ASYNC_PUBLIC_VIEWS = ['property_list', 'property_detail', 'save_favorite', 'remove_favorite', 'favorite_list']
+
+
+class AsyncPublicUrls:
+    urlpatterns = [
+        path(str(pattern.pattern), getattr(async_views, pattern.name), name=pattern.name)
+        if pattern.name in ASYNC_PUBLIC_VIEWS else pattern
+        for pattern in app_urls.urlpatterns
+    ]
+
+
+@override_settings(
+    ROOT_URLCONF=AsyncPublicUrls, RATE_LIMIT_STORE='memory', IMAGE_PIPELINE_ENABLED=False,
+    VIEW_FLUSH_IN_BACKGROUND=False, VIEW_FLUSH_HITS=1,
+)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner', password='pass', role='owner')
+        cls.props = [
+            Property.objects.create(
+                owner=owner, title=f'Room {i}', location='Osu, Accra', price=400 + 100 * i,
+                property_type='room', description='Room.', contact_email='owner@example.com',
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        use_temporary_state_files(self)
+        listing_cache.clear()
+
+    async def test_list_matches_the_sync_view(self):
+        query = {'max_price': '550', 'sort': 'price'}
+        response = await self.async_client.get(reverse('property_list'), query)
+        self.assertIs(response.resolver_match.func, async_views.property_list)
+        self.assertEqual([pk for pk, card in response.context['cards']], [self.props[0].pk, self.props[1].pk])
+        self.assertEqual(response.context['facets']['total'], 2)
+        with override_settings(ROOT_URLCONF='rentals.urls'):
+            await sync_to_async(listing_cache.clear)()
+            expected = await self.async_client.get(reverse('property_list'), query)
+        self.assertEqual(response.context['cards'], expected.context['cards'])
+
+    async def test_detail_counts_views_and_takes_messages(self):
+        url = reverse('property_detail', args=[self.props[0].pk])
+        response = await self.async_client.get(url, headers={'user-agent': ViewTrackingTests.BROWSER})
+        self.assertContains(response, 'Room 0')
+        self.assertEqual((await PropertyViewBucket.objects.aget(property=self.props[0])).views, 1)
+        response = await self.async_client.post(url, {
+            'sender_name': 'Ama', 'sender_email': 'ama@example.com', 'content': 'Is it free?',
+        })
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertTrue(await Message.objects.filter(property=self.props[0], sender_name='Ama').aexists())
+        response = await self.async_client.get(reverse('property_detail', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_favorites_round_trip(self):
+        for prop in self.props[:2]:
+            await self.async_client.get(reverse('save_favorite', args=[prop.pk]))
+        response = await self.async_client.get(reverse('favorite_list'))
+        self.assertEqual([prop.title for prop in response.context['properties']], ['Room 1', 'Room 0'])
+        response = await self.async_client.get(reverse('property_list'))
+        self.assertEqual(response.context['favorited'], {self.props[0].pk, self.props[1].pk})
+
+        remove = reverse('remove_favorite', args=[self.props[1].pk])
+        self.assertEqual((await self.async_client.get(remove)).status_code, 405)
+        await self.async_client.post(remove)
+        response = await self.async_client.get(reverse('favorite_list'))
+        self.assertEqual([prop.title for prop in response.context['properties']], ['Room 0'])
+        response = await self.async_client.get(reverse('save_favorite', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+
+# =====================================================
+# DASHBOARD COUNTERS
+# =====================================================
+@override_settings(RATE_LIMIT_STORE='memory')
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass', role='owner')
+        cls.prop = Property.objects.create(
+            owner=cls.owner, title='Flat', location='Osu, Accra', price=900,
+            property_type='room', description='Flat.', contact_email='owner@example.com',
+        )
+
+    def stats(self):
+        return PropertyStats.objects.get(property=self.prop)
+
+    def test_unread_messages(self):
+        first = Message.objects.create(property=self.prop, sender_name='Ama', sender_email='ama@example.com', content='Hi')
+        Message.objects.create(property=self.prop, sender_name='Kofi', sender_email='kofi@example.com', content='Hi')
+        self.assertEqual(self.stats().unread_messages, 2)
+        first = Message.objects.get(pk=first.pk)
+        first.is_read = True
+        first.save()
+        first.save()
+        self.assertEqual(self.stats().unread_messages, 1)
+        Message.objects.filter(is_read=False).delete()
+        self.assertEqual(self.stats().unread_messages, 0)
+
+    def test_inbox_threads_and_mark_read(self):
+        for sender in ('ama', 'kofi', 'ama'):
+            Message.objects.create(property=self.prop, sender_name=sender, sender_email=f'{sender}@example.com', content='Hi')
+        self.client.force_login(self.owner)
+        threads = self.client.get(reverse('owner_inbox')).context['threads']
+        self.assertEqual([(t['sender_email'], t['total']) for t in threads], [('ama@example.com', 2), ('kofi@example.com', 1)])
+
+        self.client.post(reverse('mark_messages_read'), {'sender': 'ama@example.com'})
+        self.assertEqual(self.stats().unread_messages, 1)
+        self.client.post(reverse('mark_messages_read'))
+        self.assertFalse(Message.objects.filter(is_read=False).exists())
+        self.assertEqual(self.stats().unread_messages, 0)
+
+    def test_favorites_and_recount(self):
+        self.client.get(reverse('save_favorite', args=[self.prop.pk]))
+        self.client.get(reverse('save_favorite', args=[self.prop.pk]))
+        self.assertEqual(self.stats().favorite_count, 1)
+        PropertyStats.objects.update(favorite_count=7)
+        counters.recount()
+        self.assertEqual(self.stats().favorite_count, 1)
+
+
+
+# =====================================================
+# VIEW TRACKING
+# =====================================================
+@override_settings(IMAGE_PIPELINE_ENABLED=False, VIEW_FLUSH_IN_BACKGROUND=False, VIEW_FLUSH_HITS=3, VIEW_FLUSH_SECONDS=3600)
+class ViewTrackingTests(TestCase):
+    BROWSER = 'Mozilla/5.0 (X11; Linux x86_64) Firefox/130.0'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass', role='owner')
+        cls.prop = Property.objects.create(
+            owner=cls.owner, title='Flat', location='Osu, Accra', price=900,
+            property_type='room', description='Flat.', contact_email='owner@example.com',
+        )
+        cls.url = reverse('property_detail', args=[cls.prop.pk])
+
+    def tearDown(self):
+        tracking.flush()
+
+    def test_views_are_buffered_then_shown_on_dashboard(self):
+        self.client.get(self.url, headers={'user-agent': self.BROWSER})
+        self.client.get(self.url, headers={'user-agent': self.BROWSER})
+        self.assertFalse(PropertyViewBucket.objects.exists())
+        self.client.get(self.url, headers={'user-agent': self.BROWSER})
+        self.assertEqual(PropertyViewBucket.objects.get().views, 3)
+
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('owner_dashboard'))
+        self.assertEqual(response.context['properties'][0].view_count, 3)
+
+    def test_bots_and_prefetches_are_not_counted(self):
+        self.client.get(self.url, headers={'user-agent': 'Googlebot/2.1 (+http://www.google.com/bot.html)'})
+        self.client.get(self.url)
+        self.client.get(self.url, headers={'user-agent': self.BROWSER, 'sec-purpose': 'prefetch'})
+        tracking.flush()
+        self.assertFalse(PropertyViewBucket.objects.exists())
+
+    def test_flushes_add_to_the_hourly_bucket(self):
+        for _ in range(5):
+            self.client.get(self.url, headers={'user-agent': self.BROWSER})
+        tracking.flush()
+        self.assertEqual(PropertyViewBucket.objects.get().views, 5)
+        self.assertEqual(PropertyStats.objects.get(property=self.prop).view_count, 5)
+
+
+# =====================================================
+# OWNER NOTIFICATIONS
+# =====================================================
+@override_settings(
+    IMAGE_PIPELINE_ENABLED=False,
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    NOTIFY_DIGEST_THRESHOLD=3,
+    RATE_LIMIT_STORE='memory',
+)
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', email='owner@example.com', password='pass', role='owner')
+        cls.prop = Property.objects.create(
+            owner=cls.owner, title='Flat', location='Osu, Accra', price=900,
+            property_type='room', description='Flat.', contact_email='owner@example.com',
+        )
+
+    def inquire(self, sender='ama'):
+        return self.client.post(
+            reverse('property_detail', args=[self.prop.pk]),
+            {'sender_name': sender, 'sender_email': f'{sender}@example.com', 'content': 'Is it available?'},
+        )
+
+    def test_inquiry_only_inserts_the_message(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.inquire().status_code, 302)
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1, inserts)
+        self.assertEqual(mail.outbox, [])
+
+    def test_single_inquiries_and_digests(self):
+        self.inquire('ama')
+        notifications.enqueue_new_messages(100)
+        self.assertEqual(notifications.deliver_due(100), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['owner@example.com'])
+        self.assertIn('ama@example.com', mail.outbox[0].body)
+
+        for sender in ('kofi', 'yaw', 'esi'):
+            self.inquire(sender)
+        self.assertEqual(notifications.enqueue_new_messages(100), 3)
+        self.assertEqual(notifications.deliver_due(100), (1, 0))
+        self.assertEqual(mail.outbox[1].subject, '3 new inquiries about your listings')
+        self.assertEqual(notifications.enqueue_new_messages(100), 0)
+
+    def test_failures_are_retried_later(self):
+        class Refusing(LocmemBackend):
+            def send_messages(self, messages):
+                raise smtplib.SMTPDataError(451, 'try again')
+
+        self.inquire()
+        notifications.enqueue_new_messages(100)
+        self.assertEqual(notifications.deliver_due(100, connection=Refusing()), (0, 1))
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.attempts, 1)
+        self.assertIsNone(email.sent_at)
+        self.assertEqual(notifications.deliver_due(100), (0, 0))  # not due yet
+
+    @unittest.skipIf(Controller is None, 'aiosmtpd is not installed')
+    def test_delivers_over_smtp(self):
+        received = []
+
+        class Handler:
+            async def handle_DATA(self, server, session, envelope):
+                received.append(envelope)
+                return '250 OK'
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        controller = Controller(Handler(), hostname='127.0.0.1', port=port)
+        controller.start()
+        self.addCleanup(controller.stop)
+        for sender in ('ama', 'kofi'):
+            self.inquire(sender)
+        notifications.enqueue_new_messages(100)
+        with self.settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=port,
+        ):
+            self.assertEqual(notifications.deliver_due(100), (2, 0))
+        self.assertEqual([envelope.rcpt_tos for envelope in received], [['owner@example.com']] * 2)
+
+
+# =====================================================
+# RATE LIMITING
+# =====================================================
+class RateLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner', password='pass', role='owner')
+        cls.prop = Property.objects.create(
+            owner=owner, title='Flat', location='Osu, Accra', price=900,
+            property_type='room', description='Flat.', contact_email='owner@example.com',
+        )
+
+    def setUp(self):
+        use_temporary_state_files(self)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('6/m'), 0.1)
+        self.assertEqual(parse_rate('3/10m'), 3 / 600)
+        with self.assertRaises(ValueError):
+            parse_rate('often')
+
+    def test_contact_form_burst_then_429_without_queries(self):
+        url = reverse('property_detail', args=[self.prop.pk])
+        data = {'sender_name': 'Bot', 'sender_email': 'bot@example.com', 'content': 'Spam'}
+        for _ in range(5):
+            self.assertEqual(self.client.post(url, data).status_code, 302)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(len(ctx), 0)
+        self.assertEqual(Message.objects.count(), 5)
+        # Reads of the same page are not limited
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    async def test_limits_apply_under_asgi(self):
+        url = reverse('property_detail', args=[self.prop.pk])
+        data = {'sender_name': 'Bot', 'sender_email': 'bot@example.com', 'content': 'Spam'}
+        codes = [(await self.async_client.post(url, data)).status_code for _ in range(6)]
+        self.assertEqual(codes, [302] * 5 + [429])
+
+    def test_shared_store_is_shared_between_instances(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / 'buckets.sqlite3'
+        first, second = SharedBucketStore(path), SharedBucketStore(path)
+        self.assertEqual(first.consume('k', 1 / 60, 2), 0)
+        self.assertEqual(second.consume('k', 1 / 60, 2), 0)
+        self.assertGreater(first.consume('k', 1 / 60, 2), 0)
+
+
+# =====================================================
+# REPLICA ROUTING
+# =====================================================
+@override_settings(IMAGE_PIPELINE_ENABLED=False)
+@mock.patch.object(db, 'replica_configured', return_value=True)
+class ReplicaRoutingTests(SimpleTestCase):
+    def route(self, request, url_name):
+        """Alias a read inside the view would use, plus the response."""
+        seen = []
+
+        def view(request):
+            seen.append(db.ReplicaRouter().db_for_read(Property))
+            return HttpResponse()
+
+        def handler(request):
+            # What BaseHandler does between the middleware's __call__ and the view
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = db.ReplicaRoutingMiddleware(handler)
+        request.resolver_match = mock.Mock(url_name=url_name)
+        response = middleware(request)
+        return seen[0], response
+
+    def test_listing_reads_use_the_replica(self, _):
+        alias, response = self.route(RequestFactory().get('/'), 'property_list')
+        self.assertEqual(alias, 'replica')
+        self.assertNotIn(db.STICKY_COOKIE, response.cookies)
+        # Nothing leaks into code running after the request
+        self.assertEqual(db.ReplicaRouter().db_for_read(Property), 'default')
+
+    def test_other_views_and_writes_use_the_primary(self, _):
+        self.assertEqual(self.route(RequestFactory().get('/'), 'owner_dashboard')[0], 'default')
+        alias, response = self.route(RequestFactory().post('/'), 'property_detail')
+        self.assertEqual(alias, 'default')
+        self.assertIn(db.STICKY_COOKIE, response.cookies)
+        self.assertEqual(db.ReplicaRouter().db_for_write(Property), 'default')
+
+    def test_sticky_cookie_pins_reads_to_the_primary(self, _):
+        request = RequestFactory().get('/', HTTP_COOKIE=f'{db.STICKY_COOKIE}=1')
+        self.assertEqual(self.route(request, 'property_list')[0], 'default')
+
+    def test_a_get_that_writes_pins_reads_to_the_primary(self, _):
+        # save_favorite is a plain link: a GET that inserts a Favorite, then
+        # redirects to favorite_list, which must not read a lagging replica
+        def handler(request):
+            middleware.process_view(request, None, (), {})
+            router.db_for_write(Favorite)  # as Favorite.objects.get_or_create() does
+            return HttpResponse()
+
+        middleware = db.ReplicaRoutingMiddleware(handler)
+        request = RequestFactory().get('/')
+        request.resolver_match = mock.Mock(url_name='save_favorite')
+        response = middleware(request)
+        self.assertIn(db.STICKY_COOKIE, response.cookies)
+        request = RequestFactory().get('/', HTTP_COOKIE=f'{db.STICKY_COOKIE}=1')
+        self.assertEqual(self.route(request, 'favorite_list')[0], 'default')
+
+        # Writes outside a request are not remembered
+        router.db_for_write(Favorite)
+        self.assertNotIn(db.STICKY_COOKIE, self.route(RequestFactory().get('/'), 'property_list')[1].cookies)
+
+    async def test_listing_reads_use_the_replica_under_asgi(self, _):
+        seen = []
+
+        async def handler(request):
+            # Django runs the sync process_view through sync_to_async too
+            await sync_to_async(middleware.process_view)(request, None, (), {})
+            seen.append(await sync_to_async(db.ReplicaRouter().db_for_read)(Property))
+            return HttpResponse()
+
+        middleware = db.ReplicaRoutingMiddleware(handler)
+        request = RequestFactory().get('/')
+        request.resolver_match = mock.Mock(url_name='property_list')
+        response = await middleware(request)
+        self.assertEqual(seen, ['replica'])
+        self.assertNotIn(db.STICKY_COOKIE, response.cookies)
+        self.assertEqual(db.ReplicaRouter().db_for_read(Property), 'default')
+
+
+# =====================================================
+# PHOTO UPLOADS AND IMAGES
+# =====================================================
+def image_bytes(fmt='PNG', size=(64, 48), **options):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def camera_exif():
+    """What a phone writes: orientation (rotate 90° to view), make and a GPS fix."""
+    exif = Image.Exif()
+    exif[ExifTags.Base.Orientation] = 6
+    exif[ExifTags.Base.Make] = 'PhoneCo'
+    exif.get_ifd(ExifTags.IFD.GPSInfo).update({
+        ExifTags.GPS.GPSLatitudeRef: 'N', ExifTags.GPS.GPSLatitude: (5.0, 33.0, 36.0),
+    })
+    return exif
+
+
+class SlowStream:
+    """A request body that calls ``during`` after handing out its first bytes."""
+
+    def __init__(self, data, during=None):
+        self.data, self.during = BytesIO(data), during
+
+    def read(self, size):
+        chunk = self.data.read(size)
+        if self.during:
+            during, self.during = self.during, None
+            during()
+        return chunk
+
+
+@override_settings(IMAGE_PIPELINE_ENABLED=False)
+class UploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass', role='owner')
+        cls.property = Property.objects.create(
+            owner=cls.owner, title='Room', location='Osu', price=500,
+            property_type='room', description='Room.', contact_email='owner@example.com',
+        )
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.enterContext(override_settings(MEDIA_ROOT=self.dir / 'media', UPLOAD_CHUNK_DIR=self.dir / 'chunks'))
+        self.client.force_login(self.owner)
+
+    def put(self, upload_id, data, offset, total):
+        return self.client.put(
+            reverse('upload_chunk', args=[self.property.pk, upload_id]), data,
+            content_type='application/octet-stream',
+            headers={'Content-Range': f'bytes {offset}-{offset + len(data) - 1}/{total}'},
+        )
+
+    def test_resumed_upload_is_attached(self):
+        data = image_bytes()
+        started = self.client.post(
+            reverse('start_upload', args=[self.property.pk]), {'filename': 'room.PNG', 'size': len(data)},
+        ).json()
+        half = len(data) // 2
+        self.assertEqual(self.put(started['upload_id'], data[:half], 0, len(data)).json()['received'], half)
+        # A retried first chunk is told where to carry on from
+        response = self.put(started['upload_id'], data[:half], 0, len(data))
+        self.assertEqual((response.status_code, response.json()['received']), (409, half))
+        self.assertTrue(self.put(started['upload_id'], data[half:], half, len(data)).json()['complete'])
+
+        result = self.client.post(
+            reverse('commit_uploads', args=[self.property.pk]), {'upload_id': started['upload_id']},
+        ).json()
+        image = PropertyImage.objects.get(pk__in=result['created'])
+        self.assertEqual((image.image.width, image.image.height), (64, 48))
+        self.assertEqual(list((self.dir / 'chunks').iterdir()), [])
+
+    def test_racing_retries_append_once(self):
+        data = image_bytes()
+        upload = ChunkedUpload.start(self.owner.pk, self.property.pk, 'room.png', len(data))
+        errors = []
+
+        def retry():
+            try:
+                ChunkedUpload.load(upload.upload_id, self.owner.pk, self.property.pk).append(0, BytesIO(data))
+            except UploadError as exc:
+                errors.append(str(exc))
+
+        # The retry arrives while the original PUT is still streaming its body
+        racer = threading.Thread(target=retry)
+        upload.append(0, SlowStream(data, during=lambda: (racer.start(), time.sleep(0.2))))
+        racer.join()
+        self.assertEqual(errors, [f'Expected offset {len(data)}.'])
+        self.assertEqual(upload.path.read_bytes(), data)
+
+    def test_overlong_chunk_is_dropped_whole(self):
+        upload = ChunkedUpload.start(self.owner.pk, self.property.pk, 'room.png', 100)
+        upload.append(0, BytesIO(b'x' * 40))
+        with self.assertRaisesMessage(UploadError, 'past the declared file size'):
+            upload.append(40, SlowStream(b'y' * 100 * 1024))
+        self.assertEqual(upload.received, 40)
+
+
+@override_settings(IMAGE_PIPELINE_ENABLED=True, IMAGE_PIPELINE_ASYNC=False)
+class ImagePipelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass', role='owner')
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media = Path(tmp.name)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+
+    def assertNoMetadata(self, name):
+        with Image.open(self.media / name) as image:
+            self.assertEqual(dict(image.getexif()), {}, name)
+            self.assertNotIn(b'PhoneCo', (self.media / name).read_bytes(), name)
+            return image.size
+
+    def test_uploaded_photos_lose_their_exif_everywhere(self):
+        photo = SimpleUploadedFile('photo.jpg', image_bytes('JPEG', exif=camera_exif()), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            prop = Property.objects.create(
+                owner=self.owner, title='Room', location='Osu', price=500, property_type='room',
+                description='Room.', contact_email='owner@example.com', image=photo,
+            )
+        prop.refresh_from_db()
+        # Turned upright, and named after what is actually stored
+        self.assertEqual(self.assertNoMetadata(prop.image.name), (48, 64))
+        self.assertEqual(prop.image.name, f'property_images/{images.content_hash(prop.image)[:32]}.jpg')
+        self.assertEqual(prop.variants['source'], prop.image.name)
+        for variant in images.VARIANT_WIDTHS:
+            for fmt in images.FORMATS:
+                self.assertNoMetadata(prop.variants[variant][fmt])
+
+    def test_chunked_original_loses_its_exif(self):
+        tmp = tempfile.NamedTemporaryFile(suffix='.webp')
+        self.addCleanup(tmp.close)
+        tmp.write(image_bytes('WEBP', exif=camera_exif()))
+        tmp.flush()
+        name = images.store_original(tmp.name)
+        self.assertEqual(self.assertNoMetadata(name), (48, 64))
+        # The same photo uploaded again is the same stored file
+        self.assertEqual(images.store_original(tmp.name), name)
+
+    def test_non_images_are_rejected(self):
+        with self.assertRaisesMessage(ValueError, 'is not a valid image'):
+            images.strip_metadata(BytesIO(b'not an image'))
+
+
+# =====================================================
+# IMPORT / EXPORT
+# =====================================================
+class ImportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = User.objects.create_user('agency', password='pass', role='owner')
+        cls.other = User.objects.create_user('other', password='pass', role='owner')
+        cls.theirs = Property.objects.create(
+            owner=cls.other, title='Not yours', location='Osu', price=900,
+            property_type='room', description='Room.', contact_email='other@example.com',
+        )
+
+    def setUp(self):
+        use_temporary_state_files(self)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def run_import(self, name, content, *args):
+        path = self.dir / name
+        path.write_text(content)
+        out, err = StringIO(), StringIO()
+        call_command('import_properties', str(path), '--owner', 'agency', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_rows_are_validated_and_reported(self):
+        out, err = self.run_import('units.csv', (
+            'title,location,price,property_type,description,contact_email,is_available\n'
+            'Unit 1,"East Legon, Accra",1200,house,Two bedrooms.,agency@example.com,yes\n'
+            'Unit 2,Madina,cheap,room,One room.,agency@example.com,no\n'
+            'Unit 3,Osu,700,room,Taken.,agency@example.com,0\n'
+        ))
+        self.assertIn('2 new and 0 updated', out)
+        self.assertIn('line 3: price:', err)
+        self.assertFalse(Property.objects.get(title='Unit 3').is_available)
+        unit = Property.objects.get(title='Unit 1')
+        self.assertEqual(unit.owner, self.agency)
+        self.assertIsNotNone(unit.latitude)
+        self.assertEqual(search(q='legon'), [unit.pk])
+        self.assertEqual(PropertyStats.objects.filter(property=unit).count(), 1)
+
+    def test_jsonl_round_trip_updates_own_listings_only(self):
+        Property.objects.create(
+            owner=self.agency, title='Old title', location='Osu', price=500,
+            property_type='room', description='Room.', contact_email='agency@example.com',
+        )
+        path = self.dir / 'export.jsonl'
+        call_command('export_properties', str(path), '--owner', 'agency', stdout=StringIO())
+        record = json.loads(path.read_text())
+        record['title'] = 'New title'
+        stolen = dict(record, id=self.theirs.pk)
+        out, err = self.run_import('edit.jsonl', json.dumps(record) + '\n' + json.dumps(stolen) + '\n{oops\n')
+        self.assertIn('0 new and 1 updated', out)
+        self.assertIn(f'line 2: id: {self.theirs.pk} is not one of agency', err)
+        self.assertIn('line 3: invalid JSON', err)
+        self.assertEqual(Property.objects.get(pk=record['id']).title, 'New title')
+        self.assertEqual(Property.objects.get(pk=self.theirs.pk).title, 'Not yours')
+
+
+@override_settings(PERF_METRICS_ENABLED=True, PERF_SAMPLE_RATE=1.0, IMAGE_PIPELINE_ENABLED=False)
+class PerfMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner', password='pass', role='owner')
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        cls.prop = Property.objects.create(
+            owner=owner, title='Flat', location='Osu, Accra', price=900,
+            property_type='room', description='Flat.', contact_email='owner@example.com',
+        )
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(PERF_METRICS_DIR=tmp.name))
+        perf.reset()
+        self.addCleanup(perf.reset)
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            perf.normalize_sql("SELECT * FROM t WHERE a = 'x''y' AND b IN (1, 2,  3) LIMIT 21"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?',
+        )
+
+    def test_views_are_measured_and_exported_to_staff(self):
+        self.client.get(reverse('property_detail', args=[self.prop.pk]))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+        self.client.force_login(self.staff)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('rentals_request_duration_seconds_count{view="property_detail"} 1', body)
+        stats = perf.collect()['views']['property_detail']
+        self.assertGreater(stats['queries']['sum'], 0)
+        self.assertGreater(stats['template_time']['sum'], 0)
+        self.assertGreater(stats['size']['sum'], 0)
+
+    def test_token_and_report(self):
+        self.client.get(reverse('property_detail', args=[self.prop.pk]))
+        with override_settings(PERF_METRICS_TOKEN='s3cret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+
+        out = StringIO()
+        call_command('perf_report', '--reset', stdout=out)
+        self.assertIn('property_detail', out.getvalue())
+        self.assertIn('rentals_app_property', out.getvalue())
+        self.assertEqual(perf.collect()['views'], {})
+
+    async def test_views_are_measured_under_asgi(self):
+        await self.async_client.get(reverse('property_detail', args=[self.prop.pk]))
+        stats = perf.collect()['views']['property_detail']
+        self.assertGreater(stats['queries']['sum'], 0)
+        self.assertGreater(stats['template_time']['sum'], 0)
+
+    @override_settings(RATE_LIMIT_STORE='memory')
+    def test_asgi_middleware_chain_stays_async(self):
+        # One sync-only middleware anywhere would make Django wrap the whole
+        # chain, this outermost one included, in SyncToAsync
+        chain = ASGIHandler()._middleware_chain
+        self.assertNotIsInstance(chain, SyncToAsync)
+        self.assertTrue(iscoroutinefunction(chain))
+
+
+@override_settings(IMAGE_PIPELINE_ENABLED=False, VIEW_FLUSH_IN_BACKGROUND=False)
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        use_temporary_state_files(self)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.enterContext(override_settings(MEDIA_ROOT=self.dir / 'media'))
+
+    def test_seed_then_benchmark(self):
+        call_command(
+            'seed_data', '--owners', '3', '--properties', '40', '--messages', '30',
+            '--favorites', '25', '--tenants', '4', stdout=StringIO(),
+        )
+        self.assertEqual(Property.objects.count(), 40)
+        # The counters bulk_create skipped are rebuilt
+        self.assertEqual(
+            sum(PropertyStats.objects.values_list('favorite_count', flat=True)), Favorite.objects.count(),
+        )
+
+        output = self.dir / 'run.json'
+        call_command('run_benchmarks', '--repeat', '1', '--output', str(output), stdout=StringIO())
+        report = json.loads(output.read_text())
+        self.assertEqual(report['dataset']['Property'], 40)
+        for scenario in ['list_newest', 'list_near', 'property_detail', 'favorite_list', 'owner_inbox', 'admin_property']:
+            self.assertGreater(report['results'][scenario]['queries'], 0, scenario)
+
+    def test_compare_flags_only_real_regressions(self):
+        baseline = {'results': {'list': {'queries': 2, 'median_ms': 10.0, 'rps': 100}}}
+        current = {'results': {'list': {'queries': 3, 'median_ms': 11.0, 'rps': 70}, 'new': {'queries': 9}}}
+        self.assertEqual(
+            benchmarks.compare(baseline, current), [('list', 'queries', 2, 3), ('list', 'rps', 100, 70)],
+        )
+
+
+@override_settings(IMAGE_PIPELINE_ENABLED=False)
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        owner = User.objects.create_user('owner', password='pass', role='owner')
+        cls.prop = Property.objects.create(
+            owner=owner, title='Flat', location='Osu, Accra', price=900,
+            property_type='room', description='Flat.', contact_email='owner@example.com',
+        )
+        PropertyImage.objects.bulk_create([PropertyImage(property=cls.prop, image=f'img{n}.jpg') for n in range(25)])
+        Message.objects.bulk_create([
+            Message(property=cls.prop, sender_name='Ama', sender_email='ama@example.com', content='Hi')
+            for _ in range(5)
+        ])
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_login(self.admin)
+
+    def test_changelists_avoid_distinct_and_full_counts(self):
+        urls = [
+            reverse('admin:rentals_app_property_changelist'),
+            reverse('admin:rentals_app_property_changelist') + '?location=Osu%2C+Accra',
+            reverse('admin:rentals_app_property_changelist') + '?q=osu',
+            reverse('admin:rentals_app_message_changelist') + '?is_read__exact=0',
+            reverse('admin:rentals_app_favorite_changelist'),
+        ]
+        for url in urls:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertFalse([q['sql'] for q in ctx if 'DISTINCT' in q['sql']], url)
+        self.assertEqual(response.context['cl'].result_count, 0)
+        self.assertContains(self.client.get(urls[2]), 'Flat')
+
+    @override_settings(ADMIN_COUNT_LIMIT=3)
+    def test_filtered_count_is_capped(self):
+        response = self.client.get(reverse('admin:rentals_app_message_changelist') + '?is_read__exact=0')
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def test_estimates_come_from_statistics_refreshed_hourly(self):
+        from .admin import estimated_count
+
+        self.assertEqual(estimated_count(PropertyImage, 'default'), 25)
+        PropertyImage.objects.bulk_create([PropertyImage(property=self.prop, image=f'new{n}.jpg') for n in range(30)])
+        self.assertEqual(estimated_count(PropertyImage, 'default'), 25)
+        caches['default'].clear()  # an hour later
+        self.assertEqual(estimated_count(PropertyImage, 'default'), 55)
+
+    def test_image_inline_is_paginated(self):
+        url = reverse('admin:rentals_app_property_change', args=[self.prop.pk])
+        response = self.client.get(url)
+        self.assertContains(response, '1–10 of 25')
+        self.assertEqual(response.context['inline_admin_formsets'][0].formset.initial_form_count(), 10)
+        self.assertContains(self.client.get(url + '?images-page=3'), '21–25 of 25')
+
+
+class DeliveryTests(SimpleTestCase):
+    PHOTO = 'property_images/' + 'ab' * 16 + '.jpg'
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media, self.static = Path(tmp.name) / 'media', Path(tmp.name) / 'static'
+        (self.media / 'property_images').mkdir(parents=True)
+        (self.media / self.PHOTO).write_bytes(bytes(range(256)) * 4)
+        (self.media / 'property_images/old.jpg').write_bytes(b'old photo')
+        (self.static / 'css').mkdir(parents=True)
+        (self.static / 'css/site.0123456789ab.css').write_text('body { color: red; }' * 20)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media, STATIC_ROOT=self.static, FILE_SERVING='django'))
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_hashed_media_is_immutable_and_revalidates(self):
+        response, body = self.get('/media/' + self.PHOTO)
+        self.assertEqual(body, bytes(range(256)) * 4)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], '1024')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        not_modified = self.client.get('/media/' + self.PHOTO, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        since = self.client.get('/media/' + self.PHOTO, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+        old, _ = self.get('/media/property_images/old.jpg')
+        self.assertEqual(old['Cache-Control'], 'public, max-age=3600')
+        for url in ['/media/property_images/missing.jpg', '/media/../static/css/site.0123456789ab.css', '/media/property_images']:
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+    def test_range_requests(self):
+        url = '/media/' + self.PHOTO
+        response, body = self.get(url, HTTP_RANGE='bytes=10-13')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, bytes([10, 11, 12, 13]))
+        self.assertEqual(response['Content-Range'], 'bytes 10-13/1024')
+        self.assertEqual(response['Content-Length'], '4')
+
+        response, body = self.get(url, HTTP_RANGE='bytes=-2')
+        self.assertEqual((response['Content-Range'], body), ('bytes 1022-1023/1024', bytes([254, 255])))
+        response, body = self.get(url, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(len(body), 24)
+
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=2000-').status_code, 416)
+        # A stale If-Range or a multipart range gets the whole file
+        self.assertEqual(self.get(url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')[0].status_code, 200)
+        self.assertEqual(self.get(url, HTTP_RANGE='bytes=0-1,5-6')[0].status_code, 200)
+
+    def test_static_is_served_precompressed(self):
+        storage.CompressedManifestStaticFilesStorage(location=self.static).compress('css/site.0123456789ab.css')
+        self.assertTrue((self.static / 'css/site.0123456789ab.css.gz').exists())
+
+        url = '/static/css/site.0123456789ab.css'
+        response, body = self.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(body), (self.static / 'css/site.0123456789ab.css').read_bytes())
+
+        plain, body = self.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(plain['Vary'], 'Accept-Encoding')
+        self.assertNotEqual(plain['ETag'], response['ETag'])
+        self.assertEqual(self.client.get(url + '.gz').status_code, 404)
+
+    def test_offload_to_the_front_end(self):
+        with override_settings(FILE_SERVING='x-accel-redirect'):
+            response = self.client.get('/media/' + self.PHOTO)
+        self.assertEqual(response['X-Accel-Redirect'], f'/_files/media/{self.PHOTO}')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response.content, b'')
+        with override_settings(FILE_SERVING='x-sendfile'):
+            response = self.client.get('/media/' + self.PHOTO)
+        self.assertEqual(response['X-Sendfile'], str(self.media / self.PHOTO))
+
+    def test_wsgi_front_skips_django_and_falls_through(self):
+        passed = []
+
+        def django_app(environ, start_response):
+            passed.append(environ['PATH_INFO'])
+            start_response('404 Not Found', [])
+            return [b'']
+
+        app = delivery.FileServingApplication(django_app)
+        statuses = []
+        for path in ['/media/' + self.PHOTO, '/media/missing.jpg', '/']:
+            environ = RequestFactory().get(path).environ
+            environ['wsgi.file_wrapper'] = FileWrapper
+            result = app(environ, lambda status, headers: statuses.append(status))
+            b''.join(result)
+            getattr(result, 'close', lambda: None)()
+        self.assertEqual(statuses, ['200 OK', '404 Not Found', '404 Not Found'])
+        self.assertEqual(passed, ['/media/missing.jpg', '/'])
+
+
+@override_settings(IMAGE_PIPELINE_ENABLED=False)
+class CardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass', role='owner')
+        for title in ('Flat', 'Room'):
+            Property.objects.create(
+                owner=cls.owner, title=title, location='Osu, Accra', price=900,
+                property_type='room', description='Room.', contact_email='owner@example.com',
+            )
+
+    def setUp(self):
+        use_temporary_state_files(self)
+        listing_cache.clear()
+        self.addCleanup(listing_cache.clear)
+
+    def listings(self):
+        return list(Property.objects.for_listing().order_by('pk'))
+
+    def test_only_changed_cards_are_rerendered(self):
+        flat, room = self.listings()
+        listing_cache.get_cards([flat, room])
+        # A write this process heard nothing about, e.g. from another worker
+        Property.objects.filter(pk=flat.pk).update(title='Renamed', updated_at=timezone.now())
+        caches['listings'].set(f'listing:card:{room.pk}', (listing_cache.card_version(room), 'cached room'))
+
+        cards = dict(listing_cache.get_cards(self.listings()))
+        self.assertIn('Renamed', cards[flat.pk])
+        self.assertEqual(cards[room.pk], 'cached room')
+        # Pages cached as ids trust the signal invalidation
+        self.assertEqual(listing_cache.get_cards([room.pk], loader=None), [(room.pk, 'cached room')])
+
+    def test_dashboard_and_favourites_share_the_card(self):
+        flat = self.listings()[0]
+        card = dict(listing_cache.get_cards([flat]))[flat.pk]
+        self.client.get(reverse('save_favorite', args=[flat.pk]))
+        self.assertContains(self.client.get(reverse('favorite_list')), card, html=False)
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('owner_dashboard'))
+        self.assertContains(response, card, html=False)
+        self.assertContains(response, reverse('edit_property', args=[flat.pk]))
+
+
+@override_settings(IMAGE_PIPELINE_ENABLED=False)
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass', role='owner')
+        for title, price in [('Cheap', 500), ('Mid', 900), ('Dear', 3000)]:
+            Property.objects.create(
+                owner=cls.owner, title=title, location='Osu, Accra', price=price,
+                property_type='room', description='Room.', contact_email='owner@example.com',
+            )
+
+    def setUp(self):
+        use_temporary_state_files(self)
+        listing_cache.clear()
+        self.addCleanup(listing_cache.clear)
+
+    def cache(self, **params):
+        """Cache property_list for each query; returns their criteria."""
+        from .forms import PropertySearchForm
+
+        found = {}
+        for name, query in params.items():
+            self.client.get(reverse('property_list'), query)
+            form = PropertySearchForm(query)
+            self.assertTrue(form.is_valid(), form.errors)
+            found[name] = listing_cache.normalize(form.cleaned_data)
+        return found
+
+    def cached(self, criteria):
+        return {name: listing_cache.get_page(value) is not None for name, value in criteria.items()}
+
+    def edit(self, listing, **fields):
+        prop = Property.objects.get(title=listing)
+        for name, value in fields.items():
+            setattr(prop, name, value)
+        prop.save()
+
+    def test_title_edit_drops_only_pages_it_can_change(self):
+        criteria = self.cache(
+            showing={'max_price': '1000'},
+            other_band={'min_price': '2000'},
+            keyword={'q': 'osu', 'min_price': '800'},
+        )
+        self.assertEqual(self.cached(criteria), {'showing': True, 'other_band': True, 'keyword': True})
+        self.edit('Mid', title='Mid renamed')
+        self.assertEqual(self.cached(criteria), {'showing': False, 'other_band': True, 'keyword': False})
+
+    @override_settings(PROPERTY_LIST_PAGE_SIZE=1)
+    def test_price_change_drops_bands_entered_left_or_sorted_by_price(self):
+        criteria_queries = {
+            'showing': {'min_price': '2000'},
+            'entered': {'min_price': '3050'},
+            'left': {'min_price': '1000', 'max_price': '3050', 'sort': 'price'},
+            'by_price': {'min_price': '400', 'sort': 'price'},  # page one is Cheap
+            'elsewhere': {'max_price': '1000'},
+        }
+        criteria = self.cache(**criteria_queries)
+        self.assertEqual(listing_cache.get_page(criteria['by_price'])['ids'], [Property.objects.get(title='Cheap').pk])
+        self.edit('Dear', price=3100)
+        self.assertEqual(
+            self.cached(criteria),
+            {'showing': False, 'entered': False, 'left': False, 'by_price': False, 'elsewhere': True},
+        )
+        criteria = self.cache(**criteria_queries)
+        self.edit('Mid', price=2500)  # leaves "elsewhere", joins "showing" and "left"
+        self.assertEqual(
+            self.cached(criteria),
+            {'showing': False, 'entered': True, 'left': False, 'by_price': False, 'elsewhere': False},
+        )
+        response = self.client.get(reverse('property_list'), criteria_queries['left'])
+        self.assertEqual(response.context['cards'][0][0], Property.objects.get(title='Mid').pk)
+
+    def test_clear_reaches_other_processes(self):
+        criteria = self.cache(page={'max_price': '1000'})
+        self.assertEqual(self.cached(criteria), {'page': True})
+        # As if a management command cleared the cache in its own process
+        with mock.patch.object(type(caches['listings']), 'clear'):
+            listing_cache.clear()
+        self.assertEqual(self.cached(criteria), {'page': False})
+
+    def test_replica_reads_are_not_cached_right_after_a_write(self):
+        self.edit('Mid', title='Mid renamed')
+        # Routing itself is covered by ReplicaRoutingTests
+        with mock.patch.object(listing_cache, 'reading_replica', return_value=True):
+            criteria = self.cache(page={'max_price': '1000'})
+            self.assertEqual(self.cached(criteria), {'page': False})
+            with self.settings(REPLICA_STICKY_SECONDS=0):
+                self.cache(page={'max_price': '1000'})
+            self.assertEqual(self.cached(criteria), {'page': True})
+
+    def test_a_miss_filters_once_and_a_hit_not_at_all(self):
+        with mock.patch.object(views, 'get_search_backend', wraps=get_search_backend) as backend:
+            self.client.get(reverse('property_list'), {'q': 'osu'})
+            self.assertEqual(backend.call_count, 1)
+            response = self.client.get(reverse('property_list'), {'q': 'osu'})
+            self.assertEqual(backend.call_count, 1)
+        self.assertEqual(response.context['facets']['total'], 3)
+
+    def test_invalid_search_is_cached_as_the_unfiltered_list(self):
+        self.client.get(reverse('property_list'), {'max_price': 'lots'})
+        self.assertIsNotNone(listing_cache.get_page({}))
+        self.assertIsNotNone(listing_cache.get_facets({}))
+        with mock.patch.object(views, 'compute_facets') as compute:
+            response = self.client.get(reverse('property_list'), {'max_price': 'lots', 'q': 'nothing'})
+        compute.assert_not_called()
+        self.assertEqual(len(response.context['cards']), 3)
+        self.assertIn('max_price', response.context['form'].errors)
+
+    def test_registries_are_bounded_and_checked(self):
+        with mock.patch.object(listing_cache, 'REGISTRY_LIMIT', 4):  # two searches' pages and facets
+            criteria = self.cache(**{f'p{price}': {'max_price': str(price)} for price in (600, 700, 800)})
+            self.assertEqual(self.cached(criteria), {'p600': False, 'p700': True, 'p800': True})
+        self.assertEqual(len(caches['listings'].get('listing:bands:')), 4)
+        # A page whose registry entry was lost (eviction, a concurrent
+        # update) is a miss, never a page that can't be invalidated
+        caches['listings'].delete('listing:bands:')
+        self.assertEqual(self.cached(criteria), {'p600': False, 'p700': False, 'p800': False})
+
+
+# =====================================================
+# RENT ANALYTICS
+# =====================================================
+@override_settings(IMAGE_PIPELINE_ENABLED=False)
+class RentAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass', role='owner')
+        for i, price in enumerate([400, 650, 800, 1200, 2500]):
+            Property.objects.create(
+                owner=cls.owner, title=f'Room {i}', location='Osu,  Accra', price=price,
+                property_type='room', description='Room.', contact_email='owner@example.com',
+            )
+        Property.objects.create(
+            owner=cls.owner, title='House', location='Madina, Accra', price=5000,
+            property_type='house', description='House.', contact_email='owner@example.com',
+        )
+
+    def rollups(self):
+        return {
+            (r.location, r.property_type, r.month): (r.listings, r.total_rent, r.sketch)
+            for r in RentRollup.objects.all()
+        }
+
+    def test_sketch_quantiles_within_accuracy(self):
+        rents = [300 + 7 * i for i in range(1000)]
+        sketch = analytics.RentSketch()
+        for rent in rents:
+            sketch.add(rent)
+        for q in analytics.QUANTILES.values():
+            exact = rents[int(q * (len(rents) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - exact) / exact, analytics.RELATIVE_ACCURACY + 0.001)
+
+    def test_signals_keep_rollups_in_step_with_rebuild(self):
+        room = Property.objects.get(title='Room 0')
+        room.price = 900
+        room.save()
+        Property.objects.get(title='Room 1').save()  # no change
+        Property.objects.get(title='House').delete()
+        kept = self.rollups()
+        self.assertEqual(kept[('Osu, Accra', 'room', analytics.month_of(room.created_at))][0], 5)
+        self.assertFalse(RentRollup.objects.filter(property_type='house').exists())
+
+        analytics.rebuild()
+        self.assertEqual(self.rollups(), kept)
+
+    def test_price_change_within_a_bucket_updates_the_total(self):
+        room = Property.objects.get(title='Room 3')
+        key = ('Osu, Accra', 'room', analytics.month_of(room.created_at))
+        before = self.rollups()[key]
+        room.price = 1205  # same sketch bucket as 1200
+        room.save()
+        after = self.rollups()[key]
+        self.assertEqual(after[0], before[0])
+        self.assertEqual(after[1], before[1] + 5)
+        self.assertEqual(after[2], before[2])
+
+    @unittest.skipIf(analytics.numpy is None, "numpy is not installed")
+    def test_numpy_rebuild_matches_python(self):
+        analytics.rebuild(use_numpy=False)
+        python = self.rollups()
+        analytics.rebuild(use_numpy=True)
+        self.assertEqual(self.rollups(), python)
+
+    def test_summary_endpoint(self):
+        url = reverse('rent_analytics_json')
+        with self.assertNumQueries(1):
+            data = self.client.get(url, {'location': 'Osu, Accra', 'property_type': 'room'}).json()
+        self.assertEqual(data['overall']['listings'], 5)
+        self.assertEqual(data['overall']['mean'], 1110.0)
+        self.assertAlmostEqual(data['overall']['median'], 800, delta=8)
+        self.assertEqual(self.client.get(url, {'months': 0}).status_code, 400)
+
+        response = self.client.get(reverse('rent_analytics'))
+        self.assertEqual(response.context['summary']['overall']['listings'], 6)
+        self.assertEqual(response.context['locations'][0], ('Osu, Accra', 5))
+
+
+# =====================================================
+# SAVED-SEARCH ALERTS
+# =====================================================
+class IntervalTreeTests(SimpleTestCase):
+    def test_stab_matches_a_scan(self):
+        rng = random.Random(7)
+        intervals = {}
+        for key in range(300):
+            low = rng.choice([alerts.ANY_PRICE_LOW, alerts.Decimal(rng.randrange(0, 5000))])
+            high = rng.choice([alerts.ANY_PRICE_HIGH, low + rng.randrange(0, 3000) if low.is_finite() else alerts.Decimal(rng.randrange(0, 5000))])
+            intervals[key] = (low, high)
+        tree = alerts.IntervalTree((key, low, high) for key, (low, high) in list(intervals.items())[:200])
+        for key in range(200, 300):
+            tree.add(key, *intervals[key])
+        tree.add(300, alerts.Decimal(2500), alerts.Decimal(600))  # empty
+        tree.rebuild()
+        for key in range(0, 300, 3):
+            tree.discard(key)
+            del intervals[key]
+
+        for point in [alerts.Decimal(p) for p in (0, 1, 500, 1999, 2500, 4999, 9000)] + [alerts.Decimal('750.50')]:
+            expected = {key for key, (low, high) in intervals.items() if low <= point <= high}
+            self.assertEqual(tree.stab(point), expected, point)
+
+
+@override_settings(
+    IMAGE_PIPELINE_ENABLED=False,
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    RATE_LIMIT_STORE='memory',
+    SAVED_SEARCH_ALERT_DELAY_SECONDS=0,
+    SITE_URL='https://rentals.example.com',
+)
+class SavedSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', email='owner@example.com', password='pass', role='owner')
+
+    def setUp(self):
+        alerts.reset()
+        self.addCleanup(alerts.reset)
+
+    def list_property(self, **fields):
+        fields = {
+            'title': 'Room', 'location': 'East Legon, Accra', 'price': 800, 'property_type': 'room',
+            'description': 'Self-contained room.', 'contact_email': 'owner@example.com', **fields,
+        }
+        return Property.objects.create(owner=self.owner, **fields)
+
+    def save_search(self, email='ama@example.com', confirm=True, **query):
+        from urllib.parse import urlencode
+
+        response = self.client.post(reverse('save_search'), {'email': email, 'query': urlencode(query)})
+        if confirm and response.status_code == 200:
+            self.client.post(reverse('confirm_search', args=[response.context['search'].token]))
+        return response
+
+    def matched(self, search):
+        return set(search.matches.values_list('property__title', flat=True))
+
+    def test_new_and_updated_listings_are_matched_once(self):
+        self.assertContains(self.save_search(location='Legon ', property_type='room', max_price=1000), 'Room, legon, up to $1,000')
+        search = SavedSearch.objects.get()
+        self.assertEqual(set(search.criteria), {'location', 'max_price', 'property_type'})
+
+        self.list_property(title='Match')
+        self.list_property(title='Too dear', price=1500)
+        self.list_property(title='Elsewhere', location='Kumasi')
+        self.list_property(title='House', property_type='house')
+        cheaper = self.list_property(title='Cheaper later', price=1200)
+        self.assertEqual(self.matched(search), {'Match'})
+
+        cheaper.price = 950
+        cheaper.save()
+        cheaper.save()
+        self.assertEqual(self.matched(search), {'Match', 'Cheaper later'})
+        self.assertEqual(search.matches.count(), 2)
+
+    def test_index_agrees_with_checking_every_search(self):
+        rng = random.Random(3)
+        places = ['osu', 'legon', 'east legon', 'madina', 'kumasi', 'spintex']
+        for i in range(60):
+            criteria = {}
+            if rng.random() < 0.5:
+                criteria['property_type'] = rng.choice(['room', 'house'])
+            if rng.random() < 0.7:
+                criteria['location'] = rng.choice(places)
+            elif rng.random() < 0.5:
+                criteria['q'] = rng.choice(['furnished', 'self', 'garden pool'])
+            if rng.random() < 0.6:
+                criteria['min_price'] = str(rng.randrange(0, 2000, 100))
+            if rng.random() < 0.6:
+                criteria['max_price'] = str(rng.randrange(500, 5000, 100))
+            SavedSearch.objects.create(email=f'{i}@example.com', criteria=criteria, token=f'{i:032d}')
+        index = alerts.get_index()
+        compiled = {search.pk: alerts.compile_criteria(search.criteria) for search in SavedSearch.objects.all()}
+        found = 0
+        for i in range(40):
+            prop = Property(
+                title=rng.choice(['Furnished room', 'House with garden', 'Self-contained']),
+                location=f'{rng.choice(places).title()}, Accra', price=rng.randrange(200, 6000),
+                property_type=rng.choice(['room', 'house']), description='Quiet area, pool.', is_available=True,
+            )
+            expected = {pk for pk, search in compiled.items() if alerts.matches(search, prop)}
+            self.assertEqual(index.match(prop), expected, prop.location)
+            found += len(expected)
+        self.assertGreater(found, 40)
+
+    def test_near_search(self):
+        self.save_search(near='Osu', radius_km=2)
+        search = SavedSearch.objects.get()
+        self.assertEqual(search.criteria['radius_km'], '2')
+        self.list_property(title='Osu room', location='Osu, Accra')
+        self.list_property(title='Kumasi room', location='Adum, Kumasi')
+        self.assertEqual(self.matched(search), {'Osu room'})
+
+    @override_settings(RATE_LIMIT_ENABLED=False)
+    def test_rejects_empty_and_too_many_searches(self):
+        self.assertEqual(self.save_search().status_code, 400)
+        self.assertEqual(self.save_search(email='nope', location='osu').status_code, 400)
+        with self.settings(SAVED_SEARCHES_PER_EMAIL=2):
+            for place in ('osu', 'osu', 'madina', 'legon'):
+                response = self.save_search(location=place)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(SavedSearch.objects.count(), 2)
+
+    def test_alerts_are_batched_per_address(self):
+        self.save_search(location='legon')
+        self.save_search(property_type='house')
+        self.save_search(email='kofi@example.com', location='madina')
+        for title in ('One', 'Two'):
+            self.list_property(title=title)
+        self.list_property(title='Big house', property_type='house', location='Madina')
+        self.list_property(title='Taken', is_available=False)
+
+        self.assertEqual(notifications.enqueue_search_alerts(100), 4)
+        self.assertEqual(notifications.deliver_due(100), (5, 0))  # 3 confirmations, 2 alerts
+        ama = next(email for email in mail.outbox if email.to == ['ama@example.com'] and 'matching' in email.subject)
+        self.assertEqual(ama.subject, '3 new listings matching your saved searches')
+        self.assertIn('https://rentals.example.com/searches/', ama.body)
+        self.assertEqual(notifications.enqueue_search_alerts(100), 0)
+
+    def test_unconfirmed_searches_get_no_alerts(self):
+        self.assertContains(self.save_search(location='legon', confirm=False), 'sent a link')
+        search = SavedSearch.objects.get()
+        self.list_property(title='Before')
+        self.assertFalse(search.matches.exists())
+
+        email = OutboxEmail.objects.get(recipient='ama@example.com')
+        url = reverse('confirm_search', args=[search.token])
+        self.assertIn(url, email.body)
+        self.assertContains(self.client.get(url), 'Confirm')
+        self.list_property(title='Still before')
+        self.assertFalse(search.matches.exists())
+
+        self.assertContains(self.client.post(url), 'Done')
+        self.list_property(title='After')
+        self.assertEqual(self.matched(search), {'After'})
+        # Saving it again doesn't ask again
+        self.save_search(location='legon', confirm=False)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+    def test_alerts_skip_unconfirmed_searches(self):
+        self.save_search(location='legon')
+        search = SavedSearch.objects.get()
+        self.list_property()
+        SavedSearch.objects.update(confirmed_at=None)
+        self.assertEqual(notifications.enqueue_search_alerts(100), 1)
+        self.assertFalse(OutboxEmail.objects.filter(subject__contains='matching').exists())
+        self.assertEqual(search.matches.get().notified, True)
+
+    def test_unsubscribe(self):
+        self.save_search(location='legon')
+        search = SavedSearch.objects.get()
+        self.list_property()
+        url = reverse('unsubscribe_search', args=[search.token])
+        self.assertContains(self.client.get(url), 'Unsubscribe')
+        self.client.post(url)
+        self.assertFalse(SavedSearch.objects.exists())
+        self.assertFalse(SavedSearchMatch.objects.exists())
+        self.list_property()
+
+    def test_search_deleted_by_another_process(self):
+        self.save_search(location='legon')
+        self.list_property(title='First')
+        SavedSearch.objects.all().delete()  # this process's index still has it
+        self.list_property(title='Second')
+        self.assertFalse(SavedSearchMatch.objects.exists())
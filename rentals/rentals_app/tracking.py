@@ -0,0 +1,137 @@
+import atexit
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from . import counters
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------------
+# View tracking
+# -------------------------------
+# Every human GET of property_detail is a listing view.  The request itself
+# only appends (property_id, hour) to an in-process ring buffer: no database
+# write and no lock held across I/O, so SQLite's single writer never sits in
+# the request path.  A flusher thread drains the buffer every
+# VIEW_FLUSH_SECONDS (or sooner once VIEW_FLUSH_HITS are waiting), folds it
+# into hourly per-listing buckets with one batched upsert, and bumps the
+# dashboard totals in PropertyStats.  If the database falls behind, the ring
+# buffer drops its oldest hits instead of growing without bound.
+
+BOT_USER_AGENT_RE = re.compile(
+    r'bot|crawl|spider|slurp|scrap|fetch|preview|monitor|lighthouse|headless|'
+    r'curl|wget|python-|httpclient|okhttp|go-http|java/|libwww',
+    re.IGNORECASE,
+)
+
+_buffer = deque(maxlen=settings.VIEW_BUFFER_SIZE)
+_wake = threading.Event()
+_flush_lock = threading.Lock()
+_start_lock = threading.Lock()
+_flusher = None
+_last_flush = time.monotonic()
+
+
+def is_bot(request):
+    user_agent = request.headers.get('User-Agent', '')
+    if not user_agent or BOT_USER_AGENT_RE.search(user_agent):
+        return True
+    # Browsers prefetching or prerendering a link the user hasn't opened
+    purpose = request.headers.get('Sec-Purpose') or request.headers.get('Purpose') or ''
+    return 'prefetch' in purpose
+
+
+def track_view(request, property_id):
+    """
+    Count one view of ``property_id``.  Returns True when the caller has to
+    flush() itself, which only happens with VIEW_FLUSH_IN_BACKGROUND off.
+    """
+    if not settings.VIEW_TRACKING_ENABLED or is_bot(request):
+        return False
+    hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+    _buffer.append((property_id, hour))
+    due = len(_buffer) >= settings.VIEW_FLUSH_HITS
+    if settings.VIEW_FLUSH_IN_BACKGROUND:
+        _ensure_flusher()
+        if due:
+            _wake.set()
+        return False
+    return due or time.monotonic() - _last_flush >= settings.VIEW_FLUSH_SECONDS
+
+
+def flush():
+    """Write everything buffered so far; returns the number of views written."""
+    global _last_flush
+    from .models import Property
+
+    with _flush_lock:
+        _last_flush = time.monotonic()
+        hits = Counter()
+        while True:
+            try:
+                hits[_buffer.popleft()] += 1
+            except IndexError:
+                break
+        if not hits:
+            return 0
+
+        live = set(Property.objects.filter(pk__in={pk for pk, hour in hits}).values_list('pk', flat=True))
+        hits = {(pk, hour): views for (pk, hour), views in hits.items() if pk in live}
+        per_property = Counter()
+        for (pk, hour), views in hits.items():
+            per_property[pk] += views
+        with transaction.atomic():
+            _upsert_buckets(hits)
+            counters.add_views(per_property)
+        return sum(per_property.values())
+
+
+def _upsert_buckets(hits):
+    # bulk_create(update_conflicts=True) can only overwrite a column, and
+    # several processes flush into the same bucket, so add to it in SQL
+    from .models import PropertyViewBucket
+
+    table = connection.ops.quote_name(PropertyViewBucket._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (property_id, hour, views) VALUES (%s, %s, %s) '
+            f'ON CONFLICT (property_id, hour) DO UPDATE SET views = {table}.views + excluded.views',
+            [
+                (pk, connection.ops.adapt_datetimefield_value(hour), views)
+                for (pk, hour), views in hits.items()
+            ],
+        )
+
+
+def _run_flusher():
+    while True:
+        _wake.wait(settings.VIEW_FLUSH_SECONDS)
+        _wake.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception('Could not flush %d buffered views', len(_buffer))
+        finally:
+            connections.close_all()
+
+
+def _ensure_flusher():
+    # Started on first use rather than at import, so each forked worker gets its own
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _start_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_run_flusher, name='view-flusher', daemon=True)
+            _flusher.start()
+
+
+atexit.register(flush)
@@ -0,0 +1,154 @@
+import fcntl
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+from .images import store_original
+
+
+# -------------------------------
+# Resumable chunked uploads
+# -------------------------------
+# Instead of one giant multipart POST that Django buffers in full, the
+# client sends each photo as a series of small sequential chunks that are
+# appended straight to a file under UPLOAD_CHUNK_DIR.  A dropped connection
+# only loses the current chunk: the client asks for the received offset and
+# carries on from there.  Finished files are hashed, de-duplicated and
+# attached to the property in one bulk_create (see views.commit_uploads).
+
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.avif'}
+
+
+class UploadError(Exception):
+    pass
+
+
+def _root():
+    root = Path(settings.UPLOAD_CHUNK_DIR)
+    root.mkdir(parents=True, exist_ok=True)
+    return root
+
+
+class ChunkedUpload:
+    def __init__(self, upload_id, meta):
+        self.upload_id = upload_id
+        self.meta = meta
+
+    # -- paths -------------------------------------------------------------
+
+    @staticmethod
+    def _data_path(upload_id):
+        return _root() / f'{upload_id}.part'
+
+    @staticmethod
+    def _meta_path(upload_id):
+        return _root() / f'{upload_id}.json'
+
+    @property
+    def path(self):
+        return self._data_path(self.upload_id)
+
+    # -- lifecycle ---------------------------------------------------------
+
+    @classmethod
+    def start(cls, owner_id, property_id, filename, size):
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in ALLOWED_EXTENSIONS:
+            raise UploadError(f'Unsupported file type "{ext}".')
+        if not 0 < size <= settings.UPLOAD_MAX_BYTES:
+            raise UploadError(f'Files must be between 1 byte and {settings.UPLOAD_MAX_BYTES} bytes.')
+
+        upload_id = uuid.uuid4().hex
+        meta = {
+            'owner_id': owner_id,
+            'property_id': property_id,
+            'filename': filename,
+            'ext': ext,
+            'size': size,
+            'started': time.time(),
+        }
+        cls._meta_path(upload_id).write_text(json.dumps(meta))
+        cls._data_path(upload_id).touch()
+        return cls(upload_id, meta)
+
+    @classmethod
+    def load(cls, upload_id, owner_id, property_id):
+        try:
+            uuid.UUID(hex=upload_id)
+            meta = json.loads(cls._meta_path(upload_id).read_text())
+        except (ValueError, OSError):
+            raise UploadError('Unknown upload.')
+        if meta['owner_id'] != owner_id or meta['property_id'] != property_id:
+            raise UploadError('Unknown upload.')
+        return cls(upload_id, meta)
+
+    @property
+    def received(self):
+        return self.path.stat().st_size
+
+    @property
+    def complete(self):
+        return self.received == self.meta['size']
+
+    def append(self, offset, stream):
+        """Write the request body at ``offset``, which must be the end of what we have."""
+        with open(self.path, 'ab') as fh:
+            # A retried PUT can race the original: whoever gets the lock
+            # second sees the grown file and is told the new offset.
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            received = os.fstat(fh.fileno()).st_size
+            if offset != received:
+                raise UploadError(f'Expected offset {received}.')
+            remaining = self.meta['size'] - offset
+            try:
+                while True:
+                    chunk = stream.read(64 * 1024)
+                    if not chunk:
+                        break
+                    if len(chunk) > remaining:
+                        raise UploadError('Chunk runs past the declared file size.')
+                    fh.write(chunk)
+                    remaining -= len(chunk)
+            except BaseException:
+                # Drop the partial chunk so the client can resend it whole
+                fh.truncate(offset)
+                raise
+        return self.received
+
+    def finish(self):
+        """
+        Validate the assembled file and move it into media storage under its
+        content hash.  Returns the storage name; identical photos uploaded
+        twice share one stored file.
+        """
+        if not self.complete:
+            raise UploadError('Upload is not complete.')
+        try:
+            return store_original(self.path, self.meta['ext'])
+        except ValueError:
+            raise UploadError(f'"{self.meta["filename"]}" is not a valid image.')
+        finally:
+            self.discard()
+
+    def discard(self):
+        for path in (self.path, self._meta_path(self.upload_id)):
+            path.unlink(missing_ok=True)
+
+
+def purge_stale(max_age):
+    """Remove uploads that were started more than ``max_age`` seconds ago."""
+    cutoff = time.time() - max_age
+    removed = 0
+    for meta_path in _root().glob('*.json'):
+        try:
+            started = json.loads(meta_path.read_text())['started']
+        except (ValueError, KeyError, OSError):
+            started = 0
+        if started < cutoff:
+            ChunkedUpload(meta_path.stem, {}).discard()
+            removed += 1
+    return removed
@@ -1,5 +1,21 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Public read views: async under ASGI (see rentals/asgi.py), sync under WSGI
+public_views = async_views if settings.ASYNC_PUBLIC_VIEWS else views
+
+# Token-bucket limits per URL name, enforced by RateLimitMiddleware.  "rate"
+# is the refill rate ("5/m", "3/10m", ...), "burst" the bucket size; requests
+# are keyed by client IP unless "key" is "session".
+RATE_LIMITS = {
+    'property_detail': {'rate': '3/10m', 'burst': 5, 'methods': ['POST']},
+    'save_favorite': {'rate': '30/m', 'burst': 30},
+    'remove_favorite': {'rate': '30/m', 'burst': 30, 'methods': ['POST']},
+    'owner_login': {'rate': '10/m', 'burst': 10, 'methods': ['POST']},
+    'owner_register': {'rate': '5/h', 'burst': 5, 'methods': ['POST']},
+    'save_search': {'rate': '10/h', 'burst': 5, 'methods': ['POST']},
+}
 
 urlpatterns = [
     # Owner auth
@@ -13,12 +29,35 @@ urlpatterns = [
     path('property/<int:pk>/edit/', views.edit_property, name='edit_property'),
     path('property/<int:pk>/delete/', views.delete_property, name='delete_property'),
 
+    # Owner inbox
+    path('inbox/', views.owner_inbox, name='owner_inbox'),
+    path('inbox/mark-read/', views.mark_messages_read, name='mark_messages_read'),
+
+    # Chunked image uploads
+    path('property/<int:pk>/uploads/', views.start_upload, name='start_upload'),
+    path('property/<int:pk>/uploads/commit/', views.commit_uploads, name='commit_uploads'),
+    path('property/<int:pk>/uploads/<str:upload_id>/', views.upload_chunk, name='upload_chunk'),
+
     # Public
-    path('', views.property_list, name='property_list'),
-    path('property/<int:pk>/', views.property_detail, name='property_detail'),
+    path('', public_views.property_list, name='property_list'),
+    path('property/<int:pk>/', public_views.property_detail, name='property_detail'),
+    path('facets/', views.property_facets, name='property_facets'),
 
     # Favorites
-    path('favorite/<int:property_id>/', views.save_favorite, name='save_favorite'),
-    path('favorites/', views.favorite_list, name='favorite_list'),
+    path('favorite/<int:property_id>/', public_views.save_favorite, name='save_favorite'),
+    path('favorite/<int:property_id>/remove/', public_views.remove_favorite, name='remove_favorite'),
+    path('favorites/', public_views.favorite_list, name='favorite_list'),
+
+    # Saved-search alerts
+    path('searches/save/', views.save_search, name='save_search'),
+    path('searches/<str:token>/confirm/', views.confirm_search, name='confirm_search'),
+    path('searches/<str:token>/unsubscribe/', views.unsubscribe_search, name='unsubscribe_search'),
+
+    # Rent market analytics
+    path('analytics/rents/', views.rent_analytics, name='rent_analytics'),
+    path('analytics/rents.json', views.rent_analytics_json, name='rent_analytics_json'),
+
+    # Instrumentation
+    path('metrics/', views.metrics, name='metrics'),
 ]
 
@@ -1,17 +1,43 @@
+import re
+import secrets
+from functools import partial
+
 from django.shortcuts import render
 
 # Create your views here.
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
-from .models import Property,  PropertyImage, Message
+from django.conf import settings
+from django.db import router
+from django.db.models import Count, Q
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, QueryDict
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST, require_http_methods
+from .models import Property,  PropertyImage, Message, SavedSearch
 from .forms import (
     OwnerRegistrationForm,
     OwnerLoginForm,
     PropertyForm,
     ContactOwnerForm,
     PropertySearchForm,
+    RentAnalyticsForm,
+    SavedSearchForm,
 )
+from .pagination import keyset_paginate, ranked_paginate, DEFAULT_ORDERING, ORDERINGS
+from .search import get_search_backend
+from .geo import get_geo_index
+from .facets import compute_facets
+from . import alerts, analytics, counters, favorites, listing_cache, notifications, perf, tracking
+from . import images as image_pipeline
+from .uploads import ChunkedUpload, UploadError
+
+CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-\d+/\d+$")
+
 # -------------------------------
 # Owner Registration
 # -------------------------------
@@ -57,7 +83,19 @@ def owner_logout(request):
 # -------------------------------
 @login_required
 def owner_dashboard(request):
-    properties = Property.objects.filter(owner=request.user)
+    # Every number comes from the PropertyStats row joined in this one query
+    properties = (
+        Property.objects.filter(owner=request.user)
+        .defer("description")
+        .annotate(
+            view_count=Coalesce("stats__view_count", 0),
+            unread_messages=Coalesce("stats__unread_messages", 0),
+            favorite_count=Coalesce("stats__favorite_count", 0),
+        )
+        .order_by("-created_at")
+    )
+    for prop, (pk, card) in zip(properties, listing_cache.get_cards(properties)):
+        prop.card = card
     return render(request, "dashboard.html", {"properties": properties})
 
 
@@ -91,8 +129,8 @@ def edit_property(request, pk):
 
             # ✅ Handle multiple image upload
             images = request.FILES.getlist('images')
-            for image in images:
-                PropertyImage.objects.create(property=property, image=image)
+            if images:
+                attach_images(property, [PropertyImage(property=property, image=image) for image in images])
 
             return redirect("owner_dashboard")
     else:
@@ -103,6 +141,76 @@ def edit_property(request, pk):
 
 
 
+def attach_images(property, new_images):
+    # bulk_create skips post_save, so do what the PropertyImage signals would
+    created = PropertyImage.objects.bulk_create(new_images)
+    for image in created:
+        image_pipeline.schedule(image)
+    Property.objects.filter(pk=property.pk).touch()
+    listing_cache.invalidate_card(property.pk)
+    return created
+
+
+# -------------------------------
+# Chunked Image Uploads (Owners)
+# -------------------------------
+@login_required
+@require_POST
+def start_upload(request, pk):
+    property = get_object_or_404(Property, pk=pk, owner=request.user)
+    try:
+        upload = ChunkedUpload.start(
+            request.user.pk, property.pk, request.POST.get("filename", ""), int(request.POST.get("size", 0))
+        )
+    except (ValueError, UploadError) as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse(
+        {"upload_id": upload.upload_id, "chunk_size": settings.UPLOAD_CHUNK_SIZE, "received": 0},
+        status=201,
+    )
+
+
+@login_required
+@require_http_methods(["GET", "PUT"])
+def upload_chunk(request, pk, upload_id):
+    # Ownership is checked against the upload's own metadata, so chunk
+    # requests never touch the Property table.
+    try:
+        upload = ChunkedUpload.load(upload_id, request.user.pk, pk)
+        if request.method == "PUT":
+            match = CONTENT_RANGE_RE.match(request.headers.get("Content-Range", ""))
+            if not match:
+                return JsonResponse({"error": "Content-Range header required."}, status=400)
+            upload.append(int(match.group(1)), request)
+    except UploadError as exc:
+        return JsonResponse({"error": str(exc), "received": upload_offset(upload_id, request.user.pk, pk)}, status=409)
+    return JsonResponse({"received": upload.received, "complete": upload.complete})
+
+
+@login_required
+@require_POST
+def commit_uploads(request, pk):
+    property = get_object_or_404(Property, pk=pk, owner=request.user)
+    names, errors = [], {}
+    for upload_id in request.POST.getlist("upload_id"):
+        try:
+            names.append(ChunkedUpload.load(upload_id, request.user.pk, property.pk).finish())
+        except UploadError as exc:
+            errors[upload_id] = str(exc)
+
+    existing = set(property.images.filter(image__in=names).values_list("image", flat=True))
+    new_names = [name for name in dict.fromkeys(names) if name not in existing]
+    created = attach_images(property, [PropertyImage(property=property, image=name) for name in new_names])
+    return JsonResponse({"created": [image.pk for image in created], "duplicates": len(names) - len(created), "errors": errors})
+
+
+def upload_offset(upload_id, owner_id, property_id):
+    try:
+        return ChunkedUpload.load(upload_id, owner_id, property_id).received
+    except UploadError:
+        return None
+
+
 @login_required
 def delete_property(request, pk):
     property = get_object_or_404(Property, pk=pk, owner=request.user)
@@ -110,20 +218,93 @@ def delete_property(request, pk):
     return redirect("owner_dashboard")
 
 
+# -------------------------------
+# Owner Inbox
+# -------------------------------
+def inbox_messages(owner, params):
+    """The owner's messages narrowed by the sender, property and unread filters in ``params``."""
+    messages = Message.objects.filter(property__owner=owner)
+    if params.get("sender"):
+        messages = messages.filter(sender_email=params["sender"])
+    if params.get("property", "").isdigit():
+        messages = messages.filter(property_id=params["property"])
+    if params.get("unread"):
+        messages = messages.filter(is_read=False)
+    return messages
+
+
+@login_required
+def owner_inbox(request):
+    page = keyset_paginate(
+        inbox_messages(request.user, request.GET).select_related("property").defer("property__description"),
+        sort="sent",
+        cursor=request.GET.get("cursor"),
+        per_page=settings.INBOX_PAGE_SIZE,
+    )
+
+    # Group this page into threads by sender, newest thread first, with the
+    # totals for just those senders from one grouped query
+    threads = {}
+    for message in page:
+        threads.setdefault(message.sender_email, []).append(message)
+    totals = {
+        row["sender_email"]: row
+        for row in Message.objects.filter(property__owner=request.user, sender_email__in=threads)
+        .values("sender_email")
+        .annotate(total=Count("id"), unread=Count("id", filter=Q(is_read=False)))
+    }
+    return render(
+        request,
+        "inbox.html",
+        {
+            "threads": [
+                {"sender_email": sender, "messages": messages, **totals.get(sender, {})}
+                for sender, messages in threads.items()
+            ],
+            "next_cursor": page.next_cursor,
+        },
+    )
+
+
+@login_required
+@require_POST
+def mark_messages_read(request):
+    # One UPDATE for the whole selection, then the dashboard counters are
+    # recounted for the listings it touched (update() sends no signals)
+    messages = inbox_messages(request.user, request.POST).filter(is_read=False)
+    affected = list(messages.values_list("property_id", flat=True).distinct())
+    if affected:
+        messages.update(is_read=True)
+        counters.recount(affected)
+    return redirect(_next_url(request, "owner_inbox"))
+
+
 # -------------------------------
 # Public Views (Guests / Tenants)
 # -------------------------------
-def property_list(request):
-    properties = Property.objects.filter(is_available=True)
-    form = PropertySearchForm(request.GET)
+def filter_properties(form):
+    """
+    Apply PropertySearchForm.  Returns (queryset, sort, ranking); the ranking
+    is the relevance order for ranked_paginate(), else None.
+    """
+    properties = Property.objects.available().for_listing()
+    using = router.db_for_read(Property)  # the raw-SQL indexes follow the ORM
+    sort = DEFAULT_ORDERING
+    ranking = None
     if form.is_valid():
+        q = form.cleaned_data.get("q")
         location = form.cleaned_data.get("location")
         min_price = form.cleaned_data.get("min_price")
         max_price = form.cleaned_data.get("max_price")
         property_type = form.cleaned_data.get("property_type")
-
-        if location:
-            properties = properties.filter(location__icontains=location)
+        center = form.center()
+        backend = get_search_backend(using) if q or location else None
+
+        if backend:
+            properties = backend.filter(properties, q=q, location=location)
+        if center:
+            radius_km = form.cleaned_data.get("radius_km") or settings.GEO_DEFAULT_RADIUS_KM
+            properties = get_geo_index(using).within(properties, *center, float(radius_km))
         if min_price:
             properties = properties.filter(price__gte=min_price)
         if max_price:
@@ -131,11 +312,84 @@ def property_list(request):
         if property_type:
             properties = properties.filter(property_type=property_type)
 
-    return render(request, "property_list.html", {"properties": properties, "form": form})
+        sort = form.cleaned_data.get("sort") or ("relevance" if backend else "distance" if center else DEFAULT_ORDERING)
+        if sort == "relevance" and backend and backend.ranks:
+            ranking = partial(backend.ranked, q=q, location=location)
+        elif sort not in ORDERINGS or (sort == "distance" and not center):
+            sort = DEFAULT_ORDERING  # e.g. "relevance" without a keyword search
+    return properties, sort, ranking
+
+
+def search_properties(properties, sort, ranking, cursor=None):
+    """One page of filter_properties() output."""
+    if ranking is not None:
+        return ranked_paginate(properties, ranking, cursor=cursor, per_page=settings.PROPERTY_LIST_PAGE_SIZE)
+    return keyset_paginate(properties, sort=sort, cursor=cursor, per_page=settings.PROPERTY_LIST_PAGE_SIZE)
+
+
+def search_criteria(form, cursor=None):
+    # filter_properties() ignores a form that doesn't validate, so invalid
+    # input shares the cache entries of the unfiltered list
+    return listing_cache.normalize(form.cleaned_data if form.is_valid() else {}, cursor)
+
+
+def property_list(request):
+    form = PropertySearchForm(request.GET)
+    cursor = request.GET.get("cursor")
+    criteria = search_criteria(form, cursor)
+
+    properties = None
+    cached = listing_cache.get_page(criteria)
+    if cached is None:
+        properties, sort, ranking = filter_properties(form)
+        page = search_properties(properties, sort, ranking, cursor)
+        listing_cache.store_page(criteria, page)
+        ids, next_cursor = [prop.pk for prop in page], page.next_cursor
+        loaded = {prop.pk: prop for prop in page}
+
+        def load(missing):
+            return {pk: loaded[pk] for pk in missing}
+    else:
+        ids, next_cursor = cached["ids"], cached["next_cursor"]
+        load = Property.objects.for_listing().in_bulk
+
+    cards = listing_cache.get_cards(ids, load)
+    facets = search_facets(form, criteria, properties)
+    return render(
+        request,
+        "property_list.html",
+        {
+            "cards": cards,
+            "favorited": favorites.favorited_ids(request, ids),
+            "next_cursor": next_cursor,
+            "form": form,
+            "facets": facets,
+        },
+    )
+
+
+def search_facets(form, criteria, properties=None):
+    """Facet counts for the search; ``properties`` is its filter_properties() queryset, if already built."""
+    facets = listing_cache.get_facets(criteria)
+    if facets is None:
+        if properties is None:
+            properties = filter_properties(form)[0]
+        facets = compute_facets(properties)
+        listing_cache.store_facets(criteria, facets)
+    return facets
+
+
+def property_facets(request):
+    form = PropertySearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    return JsonResponse(search_facets(form, listing_cache.normalize(form.cleaned_data)))
 
 
 def property_detail(request, pk):
-    property = get_object_or_404(Property, pk=pk)
+    property = get_object_or_404(Property.objects.for_detail(), pk=pk)
+    if request.method == "GET" and tracking.track_view(request, property.pk):
+        tracking.flush()
     if request.method == "POST":
         form = ContactOwnerForm(request.POST)
         if form.is_valid():
@@ -150,19 +404,139 @@ def property_detail(request, pk):
 
 
 # -------------------------------
-# Session-Based Favorites (Guests)
+# Favorites (Guests and Tenants)
 # -------------------------------
+def _next_url(request, default):
+    next_url = request.POST.get("next") or request.GET.get("next")
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return next_url
+    return default
+
+
 def save_favorite(request, property_id):
-    favorites = request.session.get("favorites", [])
-    if property_id not in favorites:
-        favorites.append(property_id)
-        request.session["favorites"] = favorites
-    return redirect("property_list")
+    get_object_or_404(Property.objects.only("id"), pk=property_id)
+    favorites.add(request, property_id)
+    return redirect(_next_url(request, "property_list"))
+
+
+@require_POST
+def remove_favorite(request, property_id):
+    favorites.remove(request, property_id)
+    return redirect(_next_url(request, "favorite_list"))
 
 
 def favorite_list(request):
-    favorites = request.session.get("favorites", [])
-    properties = Property.objects.filter(id__in=favorites)
-    return render(request, "favorites.html", {"properties": properties})
+    page = favorites.page(request, request.GET.get("cursor"))
+    properties = [favorite.property for favorite in page]
+    for prop, (pk, card) in zip(properties, listing_cache.get_cards(properties)):
+        prop.card = card
+    return render(request, "favourites.html", {"properties": properties, "next_cursor": page.next_cursor})
 
 
+# -------------------------------
+# Saved-Search Alerts
+# -------------------------------
+def saved_search_criteria(form):
+    """What a SavedSearch keeps of a valid PropertySearchForm: its filters, with "near" resolved to a point."""
+    criteria = listing_cache.normalize(form.cleaned_data)
+    criteria.pop("sort", None)
+    center = form.center()
+    if center:
+        criteria["lat"], criteria["lng"] = center
+        criteria["radius_km"] = str(form.cleaned_data.get("radius_km") or settings.GEO_DEFAULT_RADIUS_KM)
+    return dict(sorted(criteria.items()))
+
+
+@require_POST
+def save_search(request):
+    form = SavedSearchForm(request.POST)
+    form_valid = form.is_valid()
+    query = form.cleaned_data["query"]  # optional, so cleaned even when the email isn't
+    search_form = PropertySearchForm(QueryDict(query))
+    context = {"back": f"{reverse('property_list')}?{query}"}
+    if not (form_valid and search_form.is_valid()):
+        context["error"] = "Enter a valid email address and search."
+        return render(request, "saved_search.html", context, status=400)
+
+    criteria = saved_search_criteria(search_form)
+    email = form.cleaned_data["email"].lower()
+    existing = list(SavedSearch.objects.filter(email=email))
+    search = next((search for search in existing if search.criteria == criteria), None)
+    if not criteria:
+        context["error"] = "Pick a type, price, place or keyword to be alerted about."
+    elif search is None and len(existing) >= settings.SAVED_SEARCHES_PER_EMAIL:
+        context["error"] = f"You already have {len(existing)} saved searches; unsubscribe from one first."
+    elif search is None:
+        search = SavedSearch.objects.create(email=email, criteria=criteria, token=secrets.token_hex(16))
+    if "error" in context:
+        return render(request, "saved_search.html", context, status=400)
+    # Nothing is sent to the address until its owner follows this link
+    if search.confirmed_at is None:
+        notifications.queue_search_confirmation(search)
+    return render(request, "saved_search.html", {**context, "search": search})
+
+
+@require_http_methods(["GET", "POST"])
+def confirm_search(request, token):
+    # GET only asks, so link scanners in mail filters don't confirm on the owner's behalf
+    search = get_object_or_404(SavedSearch, token=token)
+    if request.method == "POST" and search.confirmed_at is None:
+        search.confirmed_at = timezone.now()
+        search.save(update_fields=["confirmed_at"])
+    if search.confirmed_at is not None:
+        return render(request, "saved_search.html", {"search": search, "confirmed": True})
+    return render(request, "saved_search.html", {"search": search, "confirm": True})
+
+
+@require_http_methods(["GET", "POST"])
+def unsubscribe_search(request, token):
+    search = get_object_or_404(SavedSearch, token=token)
+    if request.method == "POST":
+        pk = search.pk
+        search.delete()
+        alerts.forget(pk, router.db_for_write(SavedSearch))
+        return render(request, "saved_search.html", {"search": search, "unsubscribed": True})
+    return render(request, "saved_search.html", {"search": search, "unsubscribe": True})
+
+
+# -------------------------------
+# Rent Analytics
+# -------------------------------
+def _rent_summary(form):
+    # Reads the rollups only, never Property (see analytics.py)
+    return analytics.summary(
+        " ".join(form.cleaned_data["location"].split()),
+        form.cleaned_data["property_type"],
+        form.cleaned_data["months"],
+    )
+
+
+def rent_analytics(request):
+    form = RentAnalyticsForm(request.GET)
+    return render(
+        request,
+        "rent_analytics.html",
+        {
+            "form": form,
+            "summary": _rent_summary(form) if form.is_valid() else None,
+            "locations": analytics.top_locations(),
+        },
+    )
+
+
+def rent_analytics_json(request):
+    form = RentAnalyticsForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    return JsonResponse(_rent_summary(form))
+
+
+# -------------------------------
+# Metrics (Staff and Scrapers)
+# -------------------------------
+def metrics(request):
+    token = settings.PERF_METRICS_TOKEN
+    bearer = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not (request.user.is_staff or (token and constant_time_compare(bearer, token))):
+        return HttpResponseForbidden()
+    return HttpResponse(perf.prometheus(perf.collect()), content_type="text/plain; version=0.0.4")